@@ -2,6 +2,7 @@
 
 import mmap
 import os
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -26,35 +27,120 @@ class TextScreen:
         row_in_group = line % 8
         return 0x400 + row_in_group * 0x80 + group * 0x28
 
+    # Screen byte -> displayed ASCII: hi-bit ASCII maps to lo-bit, and
+    # non-printables and $FF show as spaces
+    _CHARS = bytes(
+        (byte & 0x7F) if byte != 0xFF and 0x20 <= (byte & 0x7F) <= 0x7E else 0x20
+        for byte in range(256)
+    )
+
     @classmethod
     def dump(cls, memory) -> str:
         """Dump the 40-column text screen as a string."""
+        # Each row is translated as a whole rather than byte by byte
+        lines = [bytes(memory.dump_view(cls.line_address(row), cls.COLS))
+                 .translate(cls._CHARS).decode("ascii").rstrip()
+                 for row in range(cls.ROWS)]
+        return _trim_blank_lines(lines)
+
+
+def _trim_blank_lines(lines: list[str]) -> str:
+    """Join lines, dropping leading and trailing blank ones."""
+    # Trim leading blank lines
+    while lines and not lines[0]:
+        lines.pop(0)
+
+    # Trim trailing blank lines
+    while lines and not lines[-1]:
+        lines.pop()
+
+    return '\n'.join(lines)
+
+
+class HiresScreen:
+    """Apple II hi-res graphics decoding (280x192, 7 pixels per byte).
+
+    Within each byte, bit 0 is the leftmost pixel and bit 7 only selects
+    the color palette, so it is ignored here.
+    """
+
+    PAGE1 = 0x2000
+    PAGE2 = 0x4000
+    WIDTH = 280
+    HEIGHT = 192
+    COLS = 40  # Bytes per row
+
+    # Glyph cells when reading text drawn on the hi-res screen
+    CELL_HEIGHT = 8
+    ROWS = HEIGHT // CELL_HEIGHT
+
+    # Byte -> its 7 pixels, left to right, as 0/1 bytes
+    _PIXELS = [bytes((byte >> bit) & 1 for bit in range(7)) for byte in range(256)]
+
+    @staticmethod
+    def row_address(y: int, page: int = PAGE1) -> int:
+        """Get the base address of a pixel row (0-191)."""
+        return page + (y & 7) * 0x400 + ((y >> 3) & 7) * 0x80 + (y >> 6) * 0x28
+
+    @classmethod
+    def bitmap(cls, memory, page: int = PAGE1) -> list[bytes]:
+        """Decode a hi-res page to HEIGHT rows of WIDTH pixels (0 or 1)."""
+        pixels = cls._PIXELS
+        return [b"".join([pixels[byte] for byte in
+                          memory.dump_view(cls.row_address(y, page), cls.COLS)])
+                for y in range(cls.HEIGHT)]
+
+    @classmethod
+    def dump(cls, memory, page: int = PAGE1) -> str:
+        """Dump a hi-res page as text, `X` for pixels that are on."""
+        art = bytes.maketrans(b"\x00\x01", b"-X")
+        return "\n".join(row.translate(art).decode("ascii")
+                         for row in cls.bitmap(memory, page))
+
+    @classmethod
+    def read_text(cls, memory, font: dict[bytes, str], page: int = PAGE1,
+                  unknown: str = "?") -> str:
+        """Read text drawn on a hi-res page in 7x8 cells aligned to bytes.
+
+        font maps a glyph's 8 row bytes (see load_font) to its character;
+        cells matching no glyph read as `unknown`. Lines are trimmed as by
+        TextScreen.dump.
+        """
         lines = []
         for row in range(cls.ROWS):
-            base = cls.line_address(row)
-            chars = []
-            for col in range(cls.COLS):
-                byte = memory.read(base + col)
-                # Map hi-bit ASCII to lo-bit
-                char = byte & 0x7F
-                # Treat non-printables and $FF as space
-                if byte == 0xFF or char < 0x20 or char > 0x7E:
-                    chars.append(' ')
-                else:
-                    chars.append(chr(char))
-            # Strip trailing whitespace
-            line = ''.join(chars).rstrip()
-            lines.append(line)
-
-        # Trim leading blank lines
-        while lines and not lines[0]:
-            lines.pop(0)
+            rows = [memory.dump_view(cls.row_address(row * cls.CELL_HEIGHT + i, page),
+                                     cls.COLS)
+                    for i in range(cls.CELL_HEIGHT)]
+            chars = [font.get(bytes(r[col] & 0x7F for r in rows), unknown)
+                     for col in range(cls.COLS)]
+            lines.append("".join(chars).rstrip())
+        return _trim_blank_lines(lines)
 
-        # Trim trailing blank lines
-        while lines and not lines[-1]:
-            lines.pop()
+    @staticmethod
+    def load_font(path: str | Path) -> dict[bytes, str]:
+        """Load glyphs from a font text file like src/runes/base_font.txt.
 
-        return '\n'.join(lines)
+        Each glyph is a `0xNN 'c'` header line followed by 8 rows of `X`
+        (on) and `-` (off), leftmost pixel first. Returns a map from the
+        glyph's row bytes, as they appear on the hi-res screen, to its
+        character. Only the first 7 columns are visible in a cell.
+        """
+        font: dict[bytes, str] = {}
+        with open(path) as f:
+            lines = [line.rstrip("\n") for line in f]
+        for i, line in enumerate(lines):
+            if not line.startswith("0x"):
+                continue
+            code = int(line.split()[0], 16)
+            glyph = bytearray(HiresScreen.CELL_HEIGHT)
+            for row, text in enumerate(lines[i + 1:i + 1 + HiresScreen.CELL_HEIGHT]):
+                if not text or text.startswith("0x"):
+                    break
+                glyph[row] = sum(1 << bit for bit, pixel in enumerate(text[:7])
+                                 if pixel == "X")
+            # The first glyph drawn with a pattern wins, e.g. space over DEL
+            font.setdefault(bytes(glyph), chr(code) if 0x20 <= code < 0x7F else " ")
+        return font
 
 
 class Keyboard:
@@ -70,6 +156,7 @@ class Keyboard:
         """
         self._buffer = self._parse_input(input_strings)
         self._index = 0
+        self.empty_polls = 0  # Keyboard reads made with no key available
 
     @staticmethod
     def _parse_input(strings: list[str]) -> bytes:
@@ -122,6 +209,7 @@ class Keyboard:
         """
         if self._index < len(self._buffer):
             return self._buffer[self._index] | 0x80
+        self.empty_polls += 1
         return 0x00  # No hi-bit when no key available
 
     def clear_strobe(self) -> int:
@@ -139,6 +227,23 @@ class Keyboard:
         """Check if there's still input available."""
         return self._index < len(self._buffer)
 
+    @property
+    def consumed(self) -> int:
+        """Number of keys read and cleared so far."""
+        return self._index
+
+    def feed(self, input_strings: list[str]) -> None:
+        """Queue more input after what's already buffered."""
+        self._buffer += self._parse_input(input_strings)
+
+    def snapshot(self) -> tuple[bytes, int]:
+        """Capture the input buffer and read position."""
+        return self._buffer, self._index
+
+    def restore(self, state: tuple[bytes, int]) -> None:
+        """Restore the input buffer and read position from snapshot()."""
+        self._buffer, self._index = state
+
 
 class HardDrive:
     """Apple II ProDOS hard drive emulation (slot 2)."""
@@ -163,16 +268,51 @@ class HardDrive:
     CMD_READ = 1
     CMD_WRITE = 2
 
-    def __init__(self, image_path: str | Path):
-        """Open a .2mg disk image."""
+    # When written blocks are flushed to the image file: after every
+    # write, only on close, or at most every flush_interval seconds
+    FLUSH_POLICIES = ("write", "close", "periodic")
+
+    def __init__(self, image_path: str | Path, flush: str = "close",
+                 flush_interval: float = 1.0, overlay: bool = False):
+        """Open a .2mg disk image.
+
+        With overlay set the image is opened read-only and all writes go to
+        the copy-on-write overlay, so several simulators can share one image.
+        """
+        self._file = None
+        self._mmap = None
+        if flush not in self.FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy: {flush}")
+        self._flush = flush
+        self._flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+        # Copy-on-write overlay: when enabled, written blocks are kept
+        # here by block number instead of going to the image
+        self._overlay: Optional[dict[int, bytes]] = None
+
         self._path = Path(image_path)
-        self._file = open(self._path, 'r+b')
         self._size = os.path.getsize(self._path)
-        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        if overlay:
+            self._overlay = {}
+            self._file = open(self._path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._file = open(self._path, 'r+b')
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+    def flush(self) -> None:
+        """Flush written blocks to the image file."""
+        if self._mmap and self._dirty:
+            self._mmap.flush()
+            self._dirty = False
+        self._last_flush = time.monotonic()
 
     def close(self):
         """Close the disk image."""
         if self._mmap:
+            self.flush()
             self._mmap.close()
             self._mmap = None
         if self._file:
@@ -205,22 +345,48 @@ class HardDrive:
 
         return bytes(rom)
 
-    def read_block(self, block_num: int) -> bytes:
-        """Read a 512-byte block from the disk image."""
+    def _block_offset(self, block_num: int) -> int:
+        """Get the image file offset of a block."""
         offset = self.HEADER_SIZE + block_num * self.BLOCK_SIZE
         if offset + self.BLOCK_SIZE > self._size:
             raise IOError(f"Block {block_num} out of range")
+        return offset
+
+    def enable_overlay(self) -> None:
+        """Send all further writes to a copy-on-write overlay."""
+        if self._overlay is None:
+            self._overlay = {}
+
+    def snapshot(self) -> dict[int, bytes]:
+        """Capture the overlay blocks, enabling the overlay if needed."""
+        self.enable_overlay()
+        return dict(self._overlay)
+
+    def restore(self, overlay: dict[int, bytes]) -> None:
+        """Replace the overlay blocks from snapshot()."""
+        self._overlay = dict(overlay)
+
+    def read_block(self, block_num: int) -> bytes:
+        """Read a 512-byte block from the disk image."""
+        offset = self._block_offset(block_num)
+        if self._overlay and block_num in self._overlay:
+            return self._overlay[block_num]
         return self._mmap[offset:offset + self.BLOCK_SIZE]
 
     def write_block(self, block_num: int, data: bytes) -> None:
         """Write a 512-byte block to the disk image."""
         if len(data) != self.BLOCK_SIZE:
             raise ValueError(f"Block must be {self.BLOCK_SIZE} bytes")
-        offset = self.HEADER_SIZE + block_num * self.BLOCK_SIZE
-        if offset + self.BLOCK_SIZE > self._size:
-            raise IOError(f"Block {block_num} out of range")
+        offset = self._block_offset(block_num)
+        if self._overlay is not None:
+            self._overlay[block_num] = bytes(data)
+            return
         self._mmap[offset:offset + self.BLOCK_SIZE] = data
-        self._mmap.flush()
+        self._dirty = True
+        if self._flush == "write" or (
+                self._flush == "periodic" and
+                time.monotonic() - self._last_flush >= self._flush_interval):
+            self.flush()
 
     def handle_block_call(self, memory) -> tuple[int, bool]:
         """Handle a ProDOS block device call.
@@ -237,13 +403,17 @@ class HardDrive:
             raise IOError(f"Invalid unit number: ${unit:02X} (expected $20)")
 
         if cmd == self.CMD_READ:
-            data = self.read_block(block_num)
-            for i, byte in enumerate(data):
-                memory.write(buf_addr + i, byte)
+            offset = self._block_offset(block_num)
+            if self._overlay and block_num in self._overlay:
+                memory.write_bytes(buf_addr, self._overlay[block_num])
+            else:
+                # Copy straight from the mapped image into memory
+                with memoryview(self._mmap)[offset:offset + self.BLOCK_SIZE] as block:
+                    memory.write_bytes(buf_addr, block)
             return 0, False  # A=0, carry clear
 
         elif cmd == self.CMD_WRITE:
-            data = bytes(memory.read(buf_addr + i) for i in range(self.BLOCK_SIZE))
+            data = memory.read_bytes(buf_addr, self.BLOCK_SIZE)
             self.write_block(block_num, data)
             return 0, False  # A=0, carry clear
 
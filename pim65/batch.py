@@ -0,0 +1,175 @@
+"""Headless batch runs of many simulator configurations.
+
+A manifest is a JSON file holding a list of jobs, or an object with a
+`jobs` list and optional `defaults` merged into every job:
+
+    {
+        "defaults": {"config": "boot.json", "disk": "../build/runix.2mg",
+                     "max_instructions": 5000000},
+        "jobs": [
+            {"name": "ls", "keys": ["ls\\n"]},
+            {"name": "bcd", "config": "rtest/bcd.json"}
+        ]
+    }
+
+Jobs run in a pool of worker processes, each building a fresh Simulator
+per job, so interpreter startup and imports are paid once per worker.
+Relative paths are resolved from the manifest's directory. Disk images are
+always opened with an overlay, so jobs never write to them and can share
+one image. Results are written as one JSON object per line as jobs finish:
+
+    python -m pim65 batch regress.json -j 8 > results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .config import SimulatorConfig
+from .cpu import BrkAbortError, IdleLoopError, InvalidOpcodeError
+from .simulator import Simulator
+
+# Job settings and their defaults; config is required
+JOB_DEFAULTS: dict[str, Any] = {
+    "config": None,
+    "keys": [],
+    "disk": None,
+    "max_instructions": 1000,
+    "stop_on_input_wait": False,
+    "idle_iterations": 0,
+    "brk_abort": False,
+    "engine": "flat",
+    "cycles": False,
+    "screen": True,
+}
+
+
+def load_manifest(path: str | Path) -> list[dict[str, Any]]:
+    """Read a manifest into complete job dicts with absolute paths.
+
+    Each job gets a `name` (its position if not given) and every key of
+    JOB_DEFAULTS. Raises ValueError for malformed manifests.
+    """
+    path = Path(path)
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"jobs": data}
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list):
+        raise ValueError("Manifest must be a list of jobs or have a 'jobs' list")
+
+    defaults = data.get("defaults", {})
+    jobs = []
+    for index, entry in enumerate(data["jobs"]):
+        job = {"name": str(index), **JOB_DEFAULTS, **defaults, **entry}
+        unknown = set(job) - set(JOB_DEFAULTS) - {"name"}
+        if unknown:
+            raise ValueError(f"Job {job['name']}: unknown setting(s) "
+                             f"{', '.join(sorted(unknown))}")
+        if not job["config"]:
+            raise ValueError(f"Job {job['name']}: no config")
+        if isinstance(job["keys"], str):
+            job["keys"] = [job["keys"]]
+        for key in ("config", "disk"):
+            if job[key] and not Path(job[key]).is_absolute():
+                job[key] = str(path.parent / job[key])
+        jobs.append(job)
+    return jobs
+
+
+def run_job(job: dict[str, Any]) -> dict[str, Any]:
+    """Run one job to completion and describe the outcome.
+
+    Errors are reported in the result's `error` field rather than raised,
+    so one bad job doesn't stop the batch.
+    """
+    result: dict[str, Any] = {"name": job["name"], "success": False,
+                              "waiting_for_input": False, "instructions": 0,
+                              "cycles": None, "seconds": 0.0, "error": None}
+    start_time = time.perf_counter()
+    sim = None
+    try:
+        config = SimulatorConfig.from_file(job["config"])
+        sim = Simulator(config, engine=job["engine"], cycles=job["cycles"])
+        if job["keys"]:
+            sim.setup_keyboard(job["keys"])
+        if job["disk"]:
+            sim.setup_hard_drive(job["disk"], overlay=True)
+        sim.load()
+        result["success"] = sim.run(max_instructions=job["max_instructions"],
+                                    brk_abort=job["brk_abort"],
+                                    stop_on_input_wait=job["stop_on_input_wait"],
+                                    idle_iterations=job["idle_iterations"])
+        result["waiting_for_input"] = sim.waiting_for_input
+    except BrkAbortError as e:
+        result["error"] = f"BRK abort: {e}"
+    except (IdleLoopError, InvalidOpcodeError, RuntimeError, OSError, KeyError,
+            ValueError) as e:
+        result["error"] = str(e)
+    finally:
+        result["seconds"] = round(time.perf_counter() - start_time, 6)
+        if sim is not None:
+            result["instructions"] = sim.instruction_count
+            result["cycles"] = sim.cycles
+            if job["screen"]:
+                result["screen"] = sim.dump_screen()
+            sim.cleanup()
+    return result
+
+
+def run_batch(jobs: list[dict[str, Any]],
+              workers: Optional[int] = None) -> Iterator[dict[str, Any]]:
+    """Run jobs in a process pool, yielding results as they complete.
+
+    workers defaults to the number of CPUs.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="pim65 batch",
+        description="Run the jobs of a manifest in parallel, printing one JSON "
+                    "result per line as each finishes"
+    )
+    parser.add_argument("manifest", help="Path to JSON manifest of jobs")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        metavar="N",
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="Write results to PATH instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except FileNotFoundError:
+        print(f"Error: Manifest not found: {args.manifest}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Error: Invalid manifest: {e}", file=sys.stderr)
+        return 1
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    failed = 0
+    try:
+        for result in run_batch(jobs, args.jobs):
+            if not (result["success"] or result["waiting_for_input"]):
+                failed += 1
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if failed:
+        print(f"{failed} of {len(jobs)} jobs failed", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,76 @@
+"""Decimal-mode ADC and SBC result tables for the 6502 CPU core.
+
+With the D flag set, ADC and SBC adjust each nibble of the result to a BCD
+digit. Rather than redo that nibble arithmetic on every instruction, both
+are looked up in a table indexed by carry, A and the operand:
+
+    entry = table[(carry << 16) | (a << 8) | operand]
+
+The low byte of an entry is the new A. Its high byte holds the new C flag
+in bit 0 and V in bit 6, so `entry >> 8` can be merged straight into P.
+N and Z follow the result byte, as on the NMOS 6502. Each table is built
+on its first use, so programs that never set D don't pay for it.
+"""
+
+from array import array
+
+# Index of the carry-in bit
+CARRY_SHIFT = 16
+
+_tables: dict[str, array] = {}
+
+
+def adc_entry(a: int, value: int, carry: int) -> int:
+    """The table entry for ADC in decimal mode."""
+    # V comes from the binary sum, as on the NMOS 6502
+    binary = a + value + carry
+    overflow = (a ^ binary) & (value ^ binary) & 0x80
+
+    lo = (a & 0x0F) + (value & 0x0F) + carry
+    if lo > 9:
+        lo += 6
+    hi = (a >> 4) + (value >> 4) + (1 if lo > 15 else 0)
+    if hi > 9:
+        hi += 6
+
+    result = ((hi & 0x0F) << 4) | (lo & 0x0F)
+    return result | ((1 if hi > 15 else 0) << 8) | (overflow << 7)
+
+
+def sbc_entry(a: int, value: int, carry: int) -> int:
+    """The table entry for SBC in decimal mode."""
+    binary = a - value - (1 - carry)
+    overflow = (a ^ binary) & (~value ^ binary) & 0x80
+
+    lo = (a & 0x0F) - (value & 0x0F) - (1 - carry)
+    if lo < 0:
+        lo -= 6
+    hi = (a >> 4) - (value >> 4) - (1 if lo < 0 else 0)
+    if hi < 0:
+        hi -= 6
+
+    result = ((hi & 0x0F) << 4) | (lo & 0x0F)
+    return result | ((1 if hi >= 0 else 0) << 8) | (overflow << 7)
+
+
+def _build(entry) -> array:
+    return array("H", [entry(a, value, carry)
+                       for carry in (0, 1)
+                       for a in range(256)
+                       for value in range(256)])
+
+
+def adc_table() -> array:
+    """The decimal ADC table, built on first use."""
+    table = _tables.get("ADC")
+    if table is None:
+        table = _tables["ADC"] = _build(adc_entry)
+    return table
+
+
+def sbc_table() -> array:
+    """The decimal SBC table, built on first use."""
+    table = _tables.get("SBC")
+    if table is None:
+        table = _tables["SBC"] = _build(sbc_entry)
+    return table
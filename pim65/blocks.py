@@ -0,0 +1,220 @@
+"""Basic-block translation cache for the 6502 CPU core.
+
+A block is a straight-line run of instructions ending at a branch, JMP,
+JSR, RTS, RTI or BRK. It is compiled into one Python function built from
+the same instruction bodies as the flat handlers in dispatch.py, but with
+its operand bytes folded in as constants, and cached by start PC.
+
+The code bytes of every cached block are watched in Memory, so any write
+to them drops the block; Runix patches its own code at runtime. A write
+that lands in the block currently executing also ends that block early,
+so the instructions after it are decoded afresh.
+"""
+
+from typing import Callable, Optional
+
+from .dispatch import GLOBALS, MODE_LENGTHS, OPS, inline_memory, op_key
+
+# Instructions that end a block
+TERMINATORS = {
+    "BCC", "BCS", "BEQ", "BMI", "BNE", "BPL", "BVC", "BVS",
+    "JMP", "JSR", "RTS", "RTI", "BRK",
+}
+
+# Instructions that may write to memory (other than the JSR terminator)
+WRITERS = {"STA", "STX", "STY", "ASL", "LSR", "ROL", "ROR", "INC", "DEC"}
+PUSHERS = {"PHA", "PHP"}
+
+# Longest block translated, in instructions
+MAX_BLOCK = 64
+
+
+class Block:
+    """A translated run of instructions."""
+
+    def __init__(self, start: int, end: int, length: int,
+                 run: Callable[[], int]):
+        self.start = start    # Address of the first instruction
+        self.end = end        # Address after the last instruction byte
+        self.length = length  # Number of instructions
+        self.run = run        # Executes the block; returns instructions run
+
+
+def operand_lines(mode: str, pc: int, operand: int) -> list[str]:
+    """Lines computing `addr` for an instruction whose operand is known."""
+    if mode in ("zp", "abs"):
+        return [f"addr = 0x{operand:04X}"]
+    if mode == "zp,x":
+        return [f"addr = (0x{operand:02X} + cpu.x) & 0xFF"]
+    if mode == "zp,y":
+        return [f"addr = (0x{operand:02X} + cpu.y) & 0xFF"]
+    if mode == "abs,x":
+        return [f"addr = (0x{operand:04X} + cpu.x) & 0xFFFF"]
+    if mode == "abs,y":
+        return [f"addr = (0x{operand:04X} + cpu.y) & 0xFFFF"]
+    if mode == "(abs)":
+        # 6502 bug: the pointer's high byte never carries into the next page
+        hi = (operand & 0xFF00) | ((operand + 1) & 0xFF)
+        return [f"addr = read(0x{operand:04X}) | (read(0x{hi:04X}) << 8)"]
+    if mode == "(zp,x)":
+        return [
+            f"zp = (0x{operand:02X} + cpu.x) & 0xFF",
+            "z1 = (zp + 1) & 0xFF",
+            "addr = read(zp) | (read(z1) << 8)",
+        ]
+    if mode == "(zp),y":
+        hi = (operand + 1) & 0xFF
+        return [
+            f"addr = ((read(0x{operand:02X}) | (read(0x{hi:02X}) << 8))"
+            " + cpu.y) & 0xFFFF",
+        ]
+    if mode == "rel":
+        offset = operand - 0x100 if operand & 0x80 else operand
+        return [f"addr = 0x{(pc + 2 + offset) & 0xFFFF:04X}"]
+    return []
+
+
+class BlockCache:
+    """Translates and caches basic blocks for one CPU."""
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        self._blocks: dict[int, Block] = {}
+        # Start addresses of the cached blocks covering each code byte
+        self._covers: dict[int, set[int]] = {}
+        self._globals = {
+            "cpu": cpu,
+            "read": cpu.memory.read,
+            "write": cpu.memory.write,
+            "ram": cpu.memory._mem,
+            "rslow": cpu.memory._read_slow,
+            "wslow": cpu.memory._write_slow,
+            **GLOBALS,
+        }
+        self.memory.watch_callback = self.invalidate
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def get(self, pc: int) -> Optional[Block]:
+        """Get the block starting at pc, translating it if needed.
+
+        Returns None if no instruction at pc can be translated; the caller
+        should fall back to single-stepping.
+        """
+        block = self._blocks.get(pc)
+        if block is None:
+            block = self._translate(pc)
+            if block is not None:
+                self._add(block)
+        return block
+
+    def invalidate(self, addr: int) -> None:
+        """Drop every cached block whose code includes addr."""
+        starts = self._covers.get(addr)
+        if starts:
+            for start in list(starts):
+                self._remove(self._blocks[start])
+
+    def clear(self) -> None:
+        """Drop all cached blocks."""
+        for block in list(self._blocks.values()):
+            self._remove(block)
+
+    def _add(self, block: Block) -> None:
+        self._blocks[block.start] = block
+        for addr in range(block.start, block.end):
+            starts = self._covers.get(addr)
+            if starts is None:
+                starts = self._covers[addr] = set()
+                self.memory.set_watched(addr, True)
+            starts.add(block.start)
+
+    def _remove(self, block: Block) -> None:
+        del self._blocks[block.start]
+        for addr in range(block.start, block.end):
+            starts = self._covers[addr]
+            starts.discard(block.start)
+            if not starts:
+                del self._covers[addr]
+                self.memory.set_watched(addr, False)
+
+    def _decode(self, start: int) -> list[tuple[int, str, str, int]]:
+        """Decode the instructions of a block as (pc, name, mode, operand)."""
+        cpu = self.cpu
+        memory = self.memory
+        insts = []
+        pc = start
+        while len(insts) < MAX_BLOCK:
+            if insts and (pc == cpu.SUCCESS_ADDR or pc in cpu.pc_hooks
+                          or pc in cpu.pc_watches):
+                break
+            opcode = memory.read(pc)
+            if opcode not in cpu.OPCODE_NAMES:
+                break
+            name, mode = cpu.OPCODE_NAMES[opcode]
+            length = 1 + MODE_LENGTHS[mode]
+            if pc + length > 0x10000 or any(
+                    memory.is_hooked(pc + i) for i in range(length)):
+                break
+            operand = 0
+            for i in range(length - 1, 0, -1):
+                operand = (operand << 8) | memory.read(pc + i)
+            insts.append((pc, name, mode, operand))
+            pc += length
+            if name in TERMINATORS:
+                break
+
+        # A store into this block's own code ends it, so the patched
+        # instructions are decoded afresh
+        end = pc
+        for i, (_, name, mode, operand) in enumerate(insts):
+            if name in WRITERS and mode in ("zp", "abs") and start <= operand < end:
+                return insts[:i + 1]
+        return insts
+
+    def _translate(self, start: int) -> Optional[Block]:
+        """Translate the block starting at start."""
+        insts = self._decode(start)
+        if not insts:
+            return None
+        last_pc, _, last_mode, _ = insts[-1]
+        end = last_pc + 1 + MODE_LENGTHS[last_mode]
+
+        lines = [f"def block_{start:04X}():"]
+        for count, (pc, name, mode, operand) in enumerate(insts, 1):
+            next_pc = (pc + 1 + MODE_LENGTHS[mode]) & 0xFFFF
+            reads, body = OPS[op_key(name, mode)]
+            code = operand_lines(mode, pc, operand)
+            if reads:
+                code.append(f"v = 0x{operand:02X}" if mode == "#" else "v = read(addr)")
+            if name in TERMINATORS:
+                code.append(f"cpu.pc = 0x{next_pc:04X}")
+            code.extend(body)
+            if name in WRITERS and mode not in ("A", "zp", "abs"):
+                code.extend(self._exit_if_in_block("addr", start, end, next_pc, count))
+            elif name in PUSHERS and start < 0x200 and end > 0x100:
+                code.extend(self._exit_if_in_block(
+                    "0x100 + ((cpu.sp + 1) & 0xFF)", start, end, next_pc, count))
+            lines.extend(f"    {line}" for line in code)
+
+        if insts[-1][1] not in TERMINATORS:
+            lines.append(f"    cpu.pc = 0x{end & 0xFFFF:04X}")
+        lines.append(f"    return {len(insts)}")
+
+        source = "\n".join(inline_memory(lines)) + "\n"
+        namespace = self._globals
+        exec(compile(source, f"<pim65 block ${start:04X}>", "exec"), namespace)
+        run = namespace.pop(f"block_{start:04X}")
+        return Block(start, end, len(insts), run)
+
+    @staticmethod
+    def _exit_if_in_block(addr: str, start: int, end: int,
+                          next_pc: int, count: int) -> list[str]:
+        """Lines leaving the block early if a write landed inside it."""
+        return [
+            f"if 0x{start:04X} <= {addr} < 0x{end:04X}:",
+            f"    cpu.pc = 0x{next_pc:04X}",
+            f"    return {count}",
+        ]
@@ -0,0 +1,146 @@
+"""Call-graph profile for pim65, built from JSR/RTS and BRK/RTI.
+
+The CPU reports each instruction to a CallGraph, which keeps a shadow call
+stack and counts instructions per distinct stack. Per-subroutine inclusive
+and exclusive counts are derived from those stacks, which are also what
+the collapsed-stack (flame graph) export writes out.
+
+Frames are matched to returns by stack pointer rather than by pairing, so
+code that discards its return address (Runix's shockload pulls it and
+jumps on into the rune) or resets the stack does not leave the shadow
+stack out of step: a return pops every frame whose return address it has
+passed.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+from .symbols import Symbolizer
+
+JSR = 0x20
+BRK = 0x00
+RTS = 0x60
+RTI = 0x40
+JMP = 0x4C
+
+IRQ_VECTOR = 0xFFFE
+
+
+class CallGraph:
+    """Shadow call stack with instruction counts per call stack.
+
+    Subroutines are named by symbolize, or by address when it has no label.
+    A JSR to a JMP (e.g. a rune vector at $C00-$CBF) is named for the JMP's
+    destination, with the vector address after it in brackets.
+    """
+
+    ROOT = "[root]"
+
+    def __init__(self, cpu, symbolize: Optional[Symbolizer] = None):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        self.symbolize = symbolize
+        self.stacks: dict[tuple[str, ...], int] = {}  # Stack -> instructions
+        self.calls: dict[str, int] = {}               # Subroutine -> calls
+        self._frames: list[tuple[str, int]] = []      # (name, SP before the call)
+        self._path: tuple[str, ...] = (self.ROOT,)
+
+    @property
+    def total(self) -> int:
+        """Total instructions counted."""
+        return sum(self.stacks.values())
+
+    @property
+    def depth(self) -> int:
+        """Number of calls on the shadow stack."""
+        return len(self._frames)
+
+    def clear(self) -> None:
+        """Reset all counts and the shadow stack."""
+        self.stacks = {}
+        self.calls = {}
+        self._frames = []
+        self._path = (self.ROOT,)
+
+    def record(self, pc: int, opcode: int) -> None:
+        """Count the instruction at pc, before it executes."""
+        stacks = self.stacks
+        path = self._path
+        stacks[path] = stacks.get(path, 0) + 1
+        if opcode == JSR:
+            self._call(self.memory.read_word(pc + 1))
+        elif opcode == RTS:
+            self.unwind((self.cpu.sp + 2) & 0xFF)
+        elif opcode == BRK:
+            self._call(self.memory.read_word(IRQ_VECTOR))
+        elif opcode == RTI:
+            self.unwind((self.cpu.sp + 3) & 0xFF)
+
+    def unwind(self, sp: int) -> None:
+        """Pop every frame whose return address is above stack pointer sp."""
+        frames = self._frames
+        if frames and frames[-1][1] <= sp:
+            while frames and frames[-1][1] <= sp:
+                frames.pop()
+            self._path = (self.ROOT,) + tuple(name for name, _ in frames)
+
+    def _call(self, target: int) -> None:
+        name = self.name(target)
+        self._frames.append((name, self.cpu.sp))
+        self._path += (name,)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def name(self, target: int) -> str:
+        """Name the subroutine called at target."""
+        memory = self.memory
+        dest = target
+        if memory.read(target) == JMP:
+            dest = memory.read_word(target + 1)
+        name = (self.symbolize(dest) if self.symbolize else None) or f"${dest:04X}"
+        if dest != target:
+            name += f"[${target:04X}]"
+        return name
+
+    def totals(self) -> dict[str, tuple[int, int]]:
+        """Instruction counts per subroutine as (inclusive, exclusive).
+
+        Recursive calls are only counted once towards inclusive counts.
+        """
+        inclusive: dict[str, int] = {}
+        exclusive: dict[str, int] = {}
+        for path, count in self.stacks.items():
+            for name in set(path):
+                inclusive[name] = inclusive.get(name, 0) + count
+            exclusive[path[-1]] = exclusive.get(path[-1], 0) + count
+        return {name: (count, exclusive.get(name, 0))
+                for name, count in inclusive.items()}
+
+    def collapsed(self) -> list[str]:
+        """The stacks in collapsed format (`root;caller;callee count`)."""
+        return [f"{';'.join(path)} {count}"
+                for path, count in sorted(self.stacks.items())]
+
+    def write_collapsed(self, path: str | Path) -> None:
+        """Write collapsed stacks to path, e.g. for flamegraph.pl."""
+        with open(path, "w") as f:
+            for line in self.collapsed():
+                f.write(line + "\n")
+
+    def report(self, top: int = 20) -> str:
+        """Format the subroutines with the highest inclusive counts."""
+        total = self.total
+        if not total:
+            return "Call graph: no instructions counted"
+
+        totals = self.totals()
+        busiest = sorted(totals, key=lambda name: (-totals[name][0],
+                                                   -totals[name][1], name))
+        lines = [f"Call graph: {total} instructions", "",
+                 f"Top {top} subroutines:",
+                 "   Inclusive       %   Exclusive       %     Calls  Subroutine"]
+        for name in busiest[:top]:
+            inclusive, exclusive = totals[name]
+            lines.append(f"  {inclusive:10d}  {100 * inclusive / total:5.1f}%  "
+                         f"{exclusive:10d}  {100 * exclusive / total:5.1f}%  "
+                         f"{self.calls.get(name, 0):8d}  {name}")
+        return "\n".join(lines)
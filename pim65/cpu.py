@@ -1,17 +1,41 @@
 """6502 CPU emulation core."""
 
 from typing import Callable, Optional
+from .bcd import CARRY_SHIFT, adc_table, sbc_table
+from .blocks import BlockCache
+from .callgraph import CallGraph
+from .decode import DecodeCache
+from .dispatch import MODE_LENGTHS, handler_table
 from .memory import Memory
+from .profiler import Profiler
+from .symbols import Symbolizer
+from .trace import TraceBuffer
 
 
 class InvalidOpcodeError(Exception):
     """Raised when an invalid opcode is encountered."""
-    pass
+
+    def __init__(self, message: str, addr: Optional[int] = None):
+        super().__init__(message)
+        self.addr = addr  # Address of the invalid opcode
 
 
 class BrkAbortError(Exception):
     """Raised when BRK 00 is encountered with brk_abort enabled."""
-    pass
+
+    def __init__(self, message: str, addr: Optional[int] = None):
+        super().__init__(message)
+        self.addr = addr  # Address of the BRK
+
+
+class IdleLoopError(Exception):
+    """Raised when the CPU is stuck in a loop that can never exit."""
+
+    def __init__(self, message: str, start: int, end: int):
+        super().__init__(message)
+        self.start = start  # Lowest address executed in the loop
+        self.end = end      # Highest address executed in the loop
+        self.addr = start
 
 
 class CPU:
@@ -34,7 +58,23 @@ class CPU:
     IRQ_VECTOR = 0xFFFE
     SUCCESS_ADDR = 0xFFF9
 
-    def __init__(self, memory: Memory):
+    # With idle_iterations set, run() checks for idle loops every
+    # IDLE_CHECK_INTERVAL instructions, stepping up to IDLE_LOOP_MAX
+    # instructions to see whether they return to the same state
+    IDLE_CHECK_INTERVAL = 2000
+    IDLE_LOOP_MAX = 32
+
+    # Execution engines: the op_* method table, generated flat handlers,
+    # or flat handlers plus a predecoded instruction cache or cached
+    # basic-block translation in run()
+    ENGINES = ("reference", "flat", "decoded", "block")
+
+    def __init__(self, memory: Memory, engine: str = "flat", cycles: bool = False):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if cycles and engine != "flat":
+            raise ValueError("Cycle counting requires the flat engine")
+        self.engine = engine
         self.memory = memory
         self.a = 0      # Accumulator
         self.x = 0      # X register
@@ -46,8 +86,17 @@ class CPU:
         self.halted = False
         self.success = False
         self.instruction_count = 0
+        self.count_cycles = cycles
+        self.cycles = 0  # NMOS 6502 cycles, when count_cycles is set
         self.trace_enabled = False
-        self.trace_log: list[str] = []
+        self.trace_capacity = TraceBuffer.DEFAULT_CAPACITY
+        self._trace: Optional[TraceBuffer] = None  # Allocated on first use
+        self.trace_writer = None  # Optional extra sink with a record() method
+        self.profile: Optional[Profiler] = None  # Execution counts when set
+        self.call_graph: Optional[CallGraph] = None  # Shadow call stack when set
+        # Raise IdleLoopError once a loop repeats the exact machine state
+        # this many times (0 disables)
+        self.idle_iterations = 0
 
         # Options
         self.brk_abort = False  # Abort on BRK 00
@@ -56,8 +105,28 @@ class CPU:
         self.read_hooks: dict[int, Callable[[], int]] = {}
         self.write_hooks: dict[int, Callable[[int], None]] = {}
         self.pc_hooks: dict[int, Callable[[], None]] = {}
-
-        self._build_opcode_table()
+        self.pc_watches: dict[int, Callable[[], None]] = {}
+
+        # Memory access for the generated handlers; see dispatch.MEMORY_NAMES
+        self._read = memory.read
+        self._write = memory.write
+        self._ram = memory._mem
+        self._read_slow = memory._read_slow
+        self._write_slow = memory._write_slow
+
+        # Opcode handlers take the CPU they run on, so the tables are
+        # built once per process and shared by every instance
+        self.blocks: Optional[BlockCache] = None
+        self.decoded: Optional[DecodeCache] = None
+        self.opcodes: list[Optional[Callable[["CPU"], None]]]
+        if engine == "reference":
+            self.opcodes = self._reference_table()
+        else:
+            self.opcodes = handler_table(self.OPCODE_NAMES, cycles)
+            if engine == "decoded":
+                self.decoded = DecodeCache(self)
+            elif engine == "block":
+                self.blocks = BlockCache(self)
 
     def reset(self) -> None:
         """Reset the CPU to initial state."""
@@ -70,33 +139,77 @@ class CPU:
         self.halted = False
         self.success = False
         self.instruction_count = 0
-        self.trace_log = []
+        self.cycles = 0
+        if self._trace is not None:
+            self._trace.clear()
+
+    # Attributes captured by get_state()/set_state()
+    STATE_FIELDS = ("a", "x", "y", "sp", "pc", "status",
+                    "halted", "success", "instruction_count", "cycles")
+
+    def get_state(self) -> dict[str, int | bool]:
+        """Capture registers and execution status."""
+        return {name: getattr(self, name) for name in self.STATE_FIELDS}
+
+    def set_state(self, state: dict[str, int | bool]) -> None:
+        """Restore registers and execution status from get_state()."""
+        for name in self.STATE_FIELDS:
+            setattr(self, name, state[name])
+        # Memory is about to be replaced wholesale
+        if self.blocks is not None:
+            self.blocks.clear()
+        if self.decoded is not None:
+            self.decoded.clear()
 
     # --- Flag operations ---
 
+    # N and Z are evaluated lazily: instructions store their result in
+    # _nz, and the bits are only worked out when P is read. Z is set when
+    # the low byte of _nz is zero and N when bit 7 or 8 is set, so bit 8
+    # encodes N and Z both set (after PLP or BIT). _flags holds the other
+    # bits of P; its N and Z bits are stale.
+
+    @property
+    def status(self) -> int:
+        """The status register P."""
+        nz = self._nz
+        return ((self._flags & 0x7D) | (0x80 if nz & 0x180 else 0)
+                | (0 if nz & 0xFF else 0x02))
+
+    @status.setter
+    def status(self, value: int) -> None:
+        self._flags = value
+        self._nz = ((value & 0x80) << 1) | (0 if value & 0x02 else 1)
+
     def get_flag(self, flag: int) -> bool:
+        if flag == self.FLAG_Z:
+            return (self._nz & 0xFF) == 0
+        if flag == self.FLAG_N:
+            return (self._nz & 0x180) != 0
         return (self.status & flag) != 0
 
     def set_flag(self, flag: int, value: bool) -> None:
-        if value:
-            self.status |= flag
+        if flag & (self.FLAG_N | self.FLAG_Z):
+            status = self.status
+            self.status = status | flag if value else status & ~flag
+        elif value:
+            self._flags |= flag
         else:
-            self.status &= ~flag
+            self._flags &= ~flag
 
     def update_nz(self, value: int) -> None:
         """Update N and Z flags based on value."""
-        self.set_flag(self.FLAG_Z, (value & 0xFF) == 0)
-        self.set_flag(self.FLAG_N, (value & 0x80) != 0)
+        self._nz = value & 0xFF
 
     # --- Stack operations ---
 
     def push(self, value: int) -> None:
-        self.memory.write(self.STACK_BASE + self.sp, value & 0xFF)
+        self.memory.write_stack(self.sp, value)
         self.sp = (self.sp - 1) & 0xFF
 
     def pull(self) -> int:
         self.sp = (self.sp + 1) & 0xFF
-        return self.memory.read(self.STACK_BASE + self.sp)
+        return self.memory.read_stack(self.sp)
 
     def push_word(self, value: int) -> None:
         self.push((value >> 8) & 0xFF)
@@ -191,30 +304,7 @@ class CPU:
         carry = 1 if self.get_flag(self.FLAG_C) else 0
 
         if self.get_flag(self.FLAG_D):
-            # BCD mode
-            # Calculate binary result for overflow detection
-            binary_result = self.a + value + carry
-
-            # Overflow: same as binary mode (sign bit interpretation)
-            self.set_flag(self.FLAG_V,
-                          ((self.a ^ binary_result) & (value ^ binary_result) & 0x80) != 0)
-
-            # Add low nibbles
-            lo = (self.a & 0x0F) + (value & 0x0F) + carry
-            if lo > 9:
-                lo += 6
-
-            # Add high nibbles
-            hi = (self.a >> 4) + (value >> 4) + (1 if lo > 15 else 0)
-
-            if hi > 9:
-                hi += 6
-
-            self.set_flag(self.FLAG_C, hi > 15)
-            self.a = ((hi & 0x0F) << 4) | (lo & 0x0F)
-
-            # N and Z flags use the final BCD result
-            self.update_nz(self.a)
+            self._adc_decimal(value)
         else:
             # Binary mode
             result = self.a + value + carry
@@ -226,6 +316,15 @@ class CPU:
             self.a = result & 0xFF
             self.update_nz(self.a)
 
+    def _adc_decimal(self, value: int) -> None:
+        """Add with carry in BCD mode."""
+        flags = self._flags
+        entry = adc_table()[((flags & self.FLAG_C) << CARRY_SHIFT)
+                            | (self.a << 8) | value]
+        self.a = entry & 0xFF
+        self.update_nz(self.a)
+        self._flags = (flags & ~(self.FLAG_C | self.FLAG_V)) | (entry >> 8)
+
     def op_and(self, addr: int) -> None:
         """Logical AND."""
         self.a &= self.memory.read(addr)
@@ -265,7 +364,8 @@ class CPU:
             raise BrkAbortError(
                 f"BRK 00 at ${(self.pc - 1) & 0xFFFF:04X}: "
                 f"A=${self.a:02X} X=${self.x:02X} Y=${self.y:02X} "
-                f"SP=${self.sp:02X} PC=${self.pc:04X}"
+                f"SP=${self.sp:02X} PC=${self.pc:04X}",
+                addr=(self.pc - 1) & 0xFFFF
             )
         self.pc = (self.pc + 1) & 0xFFFF  # BRK skips next byte
         self.push_word(self.pc)
@@ -387,30 +487,7 @@ class CPU:
         carry = 1 if self.get_flag(self.FLAG_C) else 0
 
         if self.get_flag(self.FLAG_D):
-            # BCD mode
-            # Calculate binary result for overflow detection
-            binary_result = self.a - value - (1 - carry)
-
-            # Overflow: same as binary mode (sign bit interpretation)
-            self.set_flag(self.FLAG_V,
-                          ((self.a ^ binary_result) & (~value ^ binary_result) & 0x80) != 0)
-
-            # Subtract low nibbles
-            lo = (self.a & 0x0F) - (value & 0x0F) - (1 - carry)
-            if lo < 0:
-                lo -= 6
-
-            # Subtract high nibbles
-            hi = (self.a >> 4) - (value >> 4) - (1 if lo < 0 else 0)
-
-            if hi < 0:
-                hi -= 6
-
-            self.set_flag(self.FLAG_C, hi >= 0)
-            self.a = ((hi & 0x0F) << 4) | (lo & 0x0F)
-
-            # N and Z flags use the final BCD result
-            self.update_nz(self.a)
+            self._sbc_decimal(value)
         else:
             # Binary mode
             result = self.a - value - (1 - carry)
@@ -422,6 +499,15 @@ class CPU:
             self.a = result & 0xFF
             self.update_nz(self.a)
 
+    def _sbc_decimal(self, value: int) -> None:
+        """Subtract with carry (borrow) in BCD mode."""
+        flags = self._flags
+        entry = sbc_table()[((flags & self.FLAG_C) << CARRY_SHIFT)
+                            | (self.a << 8) | value]
+        self.a = entry & 0xFF
+        self.update_nz(self.a)
+        self._flags = (flags & ~(self.FLAG_C | self.FLAG_V)) | (entry >> 8)
+
     def op_sta(self, addr: int) -> None:
         """Store accumulator."""
         self.memory.write(addr, self.a)
@@ -436,225 +522,235 @@ class CPU:
 
     # --- Opcode table ---
 
-    def _build_opcode_table(self) -> None:
-        """Build the opcode dispatch table."""
+    # Reference handlers shared by all instances, built on first use
+    _reference_opcodes: Optional[list[Optional[Callable[["CPU"], None]]]] = None
+
+    @staticmethod
+    def _reference_table() -> list[Optional[Callable[["CPU"], None]]]:
+        """The reference opcode dispatch table, calling the op_* methods."""
+        if CPU._reference_opcodes is not None:
+            return CPU._reference_opcodes
+
         # Initialize all as invalid
-        self.opcodes: list[Optional[Callable[[], None]]] = [None] * 256
+        table: list[Optional[Callable[["CPU"], None]]] = [None] * 256
 
         # ADC
-        self.opcodes[0x69] = lambda: self.op_adc(self.addr_immediate())
-        self.opcodes[0x65] = lambda: self.op_adc(self.addr_zero_page())
-        self.opcodes[0x75] = lambda: self.op_adc(self.addr_zero_page_x())
-        self.opcodes[0x6D] = lambda: self.op_adc(self.addr_absolute())
-        self.opcodes[0x7D] = lambda: self.op_adc(self.addr_absolute_x())
-        self.opcodes[0x79] = lambda: self.op_adc(self.addr_absolute_y())
-        self.opcodes[0x61] = lambda: self.op_adc(self.addr_indexed_indirect())
-        self.opcodes[0x71] = lambda: self.op_adc(self.addr_indirect_indexed())
+        table[0x69] = lambda cpu: cpu.op_adc(cpu.addr_immediate())
+        table[0x65] = lambda cpu: cpu.op_adc(cpu.addr_zero_page())
+        table[0x75] = lambda cpu: cpu.op_adc(cpu.addr_zero_page_x())
+        table[0x6D] = lambda cpu: cpu.op_adc(cpu.addr_absolute())
+        table[0x7D] = lambda cpu: cpu.op_adc(cpu.addr_absolute_x())
+        table[0x79] = lambda cpu: cpu.op_adc(cpu.addr_absolute_y())
+        table[0x61] = lambda cpu: cpu.op_adc(cpu.addr_indexed_indirect())
+        table[0x71] = lambda cpu: cpu.op_adc(cpu.addr_indirect_indexed())
 
         # AND
-        self.opcodes[0x29] = lambda: self.op_and(self.addr_immediate())
-        self.opcodes[0x25] = lambda: self.op_and(self.addr_zero_page())
-        self.opcodes[0x35] = lambda: self.op_and(self.addr_zero_page_x())
-        self.opcodes[0x2D] = lambda: self.op_and(self.addr_absolute())
-        self.opcodes[0x3D] = lambda: self.op_and(self.addr_absolute_x())
-        self.opcodes[0x39] = lambda: self.op_and(self.addr_absolute_y())
-        self.opcodes[0x21] = lambda: self.op_and(self.addr_indexed_indirect())
-        self.opcodes[0x31] = lambda: self.op_and(self.addr_indirect_indexed())
+        table[0x29] = lambda cpu: cpu.op_and(cpu.addr_immediate())
+        table[0x25] = lambda cpu: cpu.op_and(cpu.addr_zero_page())
+        table[0x35] = lambda cpu: cpu.op_and(cpu.addr_zero_page_x())
+        table[0x2D] = lambda cpu: cpu.op_and(cpu.addr_absolute())
+        table[0x3D] = lambda cpu: cpu.op_and(cpu.addr_absolute_x())
+        table[0x39] = lambda cpu: cpu.op_and(cpu.addr_absolute_y())
+        table[0x21] = lambda cpu: cpu.op_and(cpu.addr_indexed_indirect())
+        table[0x31] = lambda cpu: cpu.op_and(cpu.addr_indirect_indexed())
 
         # ASL
-        self.opcodes[0x0A] = lambda: self.op_asl_acc()
-        self.opcodes[0x06] = lambda: self.op_asl_mem(self.addr_zero_page())
-        self.opcodes[0x16] = lambda: self.op_asl_mem(self.addr_zero_page_x())
-        self.opcodes[0x0E] = lambda: self.op_asl_mem(self.addr_absolute())
-        self.opcodes[0x1E] = lambda: self.op_asl_mem(self.addr_absolute_x())
+        table[0x0A] = lambda cpu: cpu.op_asl_acc()
+        table[0x06] = lambda cpu: cpu.op_asl_mem(cpu.addr_zero_page())
+        table[0x16] = lambda cpu: cpu.op_asl_mem(cpu.addr_zero_page_x())
+        table[0x0E] = lambda cpu: cpu.op_asl_mem(cpu.addr_absolute())
+        table[0x1E] = lambda cpu: cpu.op_asl_mem(cpu.addr_absolute_x())
 
         # Branches
-        self.opcodes[0x90] = lambda: self.op_branch(not self.get_flag(self.FLAG_C))  # BCC
-        self.opcodes[0xB0] = lambda: self.op_branch(self.get_flag(self.FLAG_C))      # BCS
-        self.opcodes[0xF0] = lambda: self.op_branch(self.get_flag(self.FLAG_Z))      # BEQ
-        self.opcodes[0x30] = lambda: self.op_branch(self.get_flag(self.FLAG_N))      # BMI
-        self.opcodes[0xD0] = lambda: self.op_branch(not self.get_flag(self.FLAG_Z))  # BNE
-        self.opcodes[0x10] = lambda: self.op_branch(not self.get_flag(self.FLAG_N))  # BPL
-        self.opcodes[0x50] = lambda: self.op_branch(not self.get_flag(self.FLAG_V))  # BVC
-        self.opcodes[0x70] = lambda: self.op_branch(self.get_flag(self.FLAG_V))      # BVS
+        table[0x90] = lambda cpu: cpu.op_branch(not cpu.get_flag(cpu.FLAG_C))  # BCC
+        table[0xB0] = lambda cpu: cpu.op_branch(cpu.get_flag(cpu.FLAG_C))      # BCS
+        table[0xF0] = lambda cpu: cpu.op_branch(cpu.get_flag(cpu.FLAG_Z))      # BEQ
+        table[0x30] = lambda cpu: cpu.op_branch(cpu.get_flag(cpu.FLAG_N))      # BMI
+        table[0xD0] = lambda cpu: cpu.op_branch(not cpu.get_flag(cpu.FLAG_Z))  # BNE
+        table[0x10] = lambda cpu: cpu.op_branch(not cpu.get_flag(cpu.FLAG_N))  # BPL
+        table[0x50] = lambda cpu: cpu.op_branch(not cpu.get_flag(cpu.FLAG_V))  # BVC
+        table[0x70] = lambda cpu: cpu.op_branch(cpu.get_flag(cpu.FLAG_V))      # BVS
 
         # BIT
-        self.opcodes[0x24] = lambda: self.op_bit(self.addr_zero_page())
-        self.opcodes[0x2C] = lambda: self.op_bit(self.addr_absolute())
+        table[0x24] = lambda cpu: cpu.op_bit(cpu.addr_zero_page())
+        table[0x2C] = lambda cpu: cpu.op_bit(cpu.addr_absolute())
 
         # BRK
-        self.opcodes[0x00] = lambda: self.op_brk()
+        table[0x00] = lambda cpu: cpu.op_brk()
 
         # Flag operations
-        self.opcodes[0x18] = lambda: self.set_flag(self.FLAG_C, False)  # CLC
-        self.opcodes[0xD8] = lambda: self.set_flag(self.FLAG_D, False)  # CLD
-        self.opcodes[0x58] = lambda: self.set_flag(self.FLAG_I, False)  # CLI
-        self.opcodes[0xB8] = lambda: self.set_flag(self.FLAG_V, False)  # CLV
-        self.opcodes[0x38] = lambda: self.set_flag(self.FLAG_C, True)   # SEC
-        self.opcodes[0xF8] = lambda: self.set_flag(self.FLAG_D, True)   # SED
-        self.opcodes[0x78] = lambda: self.set_flag(self.FLAG_I, True)   # SEI
+        table[0x18] = lambda cpu: cpu.set_flag(cpu.FLAG_C, False)  # CLC
+        table[0xD8] = lambda cpu: cpu.set_flag(cpu.FLAG_D, False)  # CLD
+        table[0x58] = lambda cpu: cpu.set_flag(cpu.FLAG_I, False)  # CLI
+        table[0xB8] = lambda cpu: cpu.set_flag(cpu.FLAG_V, False)  # CLV
+        table[0x38] = lambda cpu: cpu.set_flag(cpu.FLAG_C, True)   # SEC
+        table[0xF8] = lambda cpu: cpu.set_flag(cpu.FLAG_D, True)   # SED
+        table[0x78] = lambda cpu: cpu.set_flag(cpu.FLAG_I, True)   # SEI
 
         # CMP
-        self.opcodes[0xC9] = lambda: self.op_cmp(self.addr_immediate(), self.a)
-        self.opcodes[0xC5] = lambda: self.op_cmp(self.addr_zero_page(), self.a)
-        self.opcodes[0xD5] = lambda: self.op_cmp(self.addr_zero_page_x(), self.a)
-        self.opcodes[0xCD] = lambda: self.op_cmp(self.addr_absolute(), self.a)
-        self.opcodes[0xDD] = lambda: self.op_cmp(self.addr_absolute_x(), self.a)
-        self.opcodes[0xD9] = lambda: self.op_cmp(self.addr_absolute_y(), self.a)
-        self.opcodes[0xC1] = lambda: self.op_cmp(self.addr_indexed_indirect(), self.a)
-        self.opcodes[0xD1] = lambda: self.op_cmp(self.addr_indirect_indexed(), self.a)
+        table[0xC9] = lambda cpu: cpu.op_cmp(cpu.addr_immediate(), cpu.a)
+        table[0xC5] = lambda cpu: cpu.op_cmp(cpu.addr_zero_page(), cpu.a)
+        table[0xD5] = lambda cpu: cpu.op_cmp(cpu.addr_zero_page_x(), cpu.a)
+        table[0xCD] = lambda cpu: cpu.op_cmp(cpu.addr_absolute(), cpu.a)
+        table[0xDD] = lambda cpu: cpu.op_cmp(cpu.addr_absolute_x(), cpu.a)
+        table[0xD9] = lambda cpu: cpu.op_cmp(cpu.addr_absolute_y(), cpu.a)
+        table[0xC1] = lambda cpu: cpu.op_cmp(cpu.addr_indexed_indirect(), cpu.a)
+        table[0xD1] = lambda cpu: cpu.op_cmp(cpu.addr_indirect_indexed(), cpu.a)
 
         # CPX
-        self.opcodes[0xE0] = lambda: self.op_cmp(self.addr_immediate(), self.x)
-        self.opcodes[0xE4] = lambda: self.op_cmp(self.addr_zero_page(), self.x)
-        self.opcodes[0xEC] = lambda: self.op_cmp(self.addr_absolute(), self.x)
+        table[0xE0] = lambda cpu: cpu.op_cmp(cpu.addr_immediate(), cpu.x)
+        table[0xE4] = lambda cpu: cpu.op_cmp(cpu.addr_zero_page(), cpu.x)
+        table[0xEC] = lambda cpu: cpu.op_cmp(cpu.addr_absolute(), cpu.x)
 
         # CPY
-        self.opcodes[0xC0] = lambda: self.op_cmp(self.addr_immediate(), self.y)
-        self.opcodes[0xC4] = lambda: self.op_cmp(self.addr_zero_page(), self.y)
-        self.opcodes[0xCC] = lambda: self.op_cmp(self.addr_absolute(), self.y)
+        table[0xC0] = lambda cpu: cpu.op_cmp(cpu.addr_immediate(), cpu.y)
+        table[0xC4] = lambda cpu: cpu.op_cmp(cpu.addr_zero_page(), cpu.y)
+        table[0xCC] = lambda cpu: cpu.op_cmp(cpu.addr_absolute(), cpu.y)
 
         # DEC
-        self.opcodes[0xC6] = lambda: self.op_dec_mem(self.addr_zero_page())
-        self.opcodes[0xD6] = lambda: self.op_dec_mem(self.addr_zero_page_x())
-        self.opcodes[0xCE] = lambda: self.op_dec_mem(self.addr_absolute())
-        self.opcodes[0xDE] = lambda: self.op_dec_mem(self.addr_absolute_x())
+        table[0xC6] = lambda cpu: cpu.op_dec_mem(cpu.addr_zero_page())
+        table[0xD6] = lambda cpu: cpu.op_dec_mem(cpu.addr_zero_page_x())
+        table[0xCE] = lambda cpu: cpu.op_dec_mem(cpu.addr_absolute())
+        table[0xDE] = lambda cpu: cpu.op_dec_mem(cpu.addr_absolute_x())
 
         # DEX, DEY
-        self.opcodes[0xCA] = lambda: (setattr(self, 'x', (self.x - 1) & 0xFF), self.update_nz(self.x))
-        self.opcodes[0x88] = lambda: (setattr(self, 'y', (self.y - 1) & 0xFF), self.update_nz(self.y))
+        table[0xCA] = lambda cpu: (setattr(cpu, 'x', (cpu.x - 1) & 0xFF), cpu.update_nz(cpu.x))
+        table[0x88] = lambda cpu: (setattr(cpu, 'y', (cpu.y - 1) & 0xFF), cpu.update_nz(cpu.y))
 
         # EOR
-        self.opcodes[0x49] = lambda: self.op_eor(self.addr_immediate())
-        self.opcodes[0x45] = lambda: self.op_eor(self.addr_zero_page())
-        self.opcodes[0x55] = lambda: self.op_eor(self.addr_zero_page_x())
-        self.opcodes[0x4D] = lambda: self.op_eor(self.addr_absolute())
-        self.opcodes[0x5D] = lambda: self.op_eor(self.addr_absolute_x())
-        self.opcodes[0x59] = lambda: self.op_eor(self.addr_absolute_y())
-        self.opcodes[0x41] = lambda: self.op_eor(self.addr_indexed_indirect())
-        self.opcodes[0x51] = lambda: self.op_eor(self.addr_indirect_indexed())
+        table[0x49] = lambda cpu: cpu.op_eor(cpu.addr_immediate())
+        table[0x45] = lambda cpu: cpu.op_eor(cpu.addr_zero_page())
+        table[0x55] = lambda cpu: cpu.op_eor(cpu.addr_zero_page_x())
+        table[0x4D] = lambda cpu: cpu.op_eor(cpu.addr_absolute())
+        table[0x5D] = lambda cpu: cpu.op_eor(cpu.addr_absolute_x())
+        table[0x59] = lambda cpu: cpu.op_eor(cpu.addr_absolute_y())
+        table[0x41] = lambda cpu: cpu.op_eor(cpu.addr_indexed_indirect())
+        table[0x51] = lambda cpu: cpu.op_eor(cpu.addr_indirect_indexed())
 
         # INC
-        self.opcodes[0xE6] = lambda: self.op_inc_mem(self.addr_zero_page())
-        self.opcodes[0xF6] = lambda: self.op_inc_mem(self.addr_zero_page_x())
-        self.opcodes[0xEE] = lambda: self.op_inc_mem(self.addr_absolute())
-        self.opcodes[0xFE] = lambda: self.op_inc_mem(self.addr_absolute_x())
+        table[0xE6] = lambda cpu: cpu.op_inc_mem(cpu.addr_zero_page())
+        table[0xF6] = lambda cpu: cpu.op_inc_mem(cpu.addr_zero_page_x())
+        table[0xEE] = lambda cpu: cpu.op_inc_mem(cpu.addr_absolute())
+        table[0xFE] = lambda cpu: cpu.op_inc_mem(cpu.addr_absolute_x())
 
         # INX, INY
-        self.opcodes[0xE8] = lambda: (setattr(self, 'x', (self.x + 1) & 0xFF), self.update_nz(self.x))
-        self.opcodes[0xC8] = lambda: (setattr(self, 'y', (self.y + 1) & 0xFF), self.update_nz(self.y))
+        table[0xE8] = lambda cpu: (setattr(cpu, 'x', (cpu.x + 1) & 0xFF), cpu.update_nz(cpu.x))
+        table[0xC8] = lambda cpu: (setattr(cpu, 'y', (cpu.y + 1) & 0xFF), cpu.update_nz(cpu.y))
 
         # JMP
-        self.opcodes[0x4C] = lambda: self.op_jmp(self.addr_absolute())
-        self.opcodes[0x6C] = lambda: self.op_jmp(self.addr_indirect())
+        table[0x4C] = lambda cpu: cpu.op_jmp(cpu.addr_absolute())
+        table[0x6C] = lambda cpu: cpu.op_jmp(cpu.addr_indirect())
 
         # JSR
-        self.opcodes[0x20] = lambda: self.op_jsr(self.addr_absolute())
+        table[0x20] = lambda cpu: cpu.op_jsr(cpu.addr_absolute())
 
         # LDA
-        self.opcodes[0xA9] = lambda: self.op_lda(self.addr_immediate())
-        self.opcodes[0xA5] = lambda: self.op_lda(self.addr_zero_page())
-        self.opcodes[0xB5] = lambda: self.op_lda(self.addr_zero_page_x())
-        self.opcodes[0xAD] = lambda: self.op_lda(self.addr_absolute())
-        self.opcodes[0xBD] = lambda: self.op_lda(self.addr_absolute_x())
-        self.opcodes[0xB9] = lambda: self.op_lda(self.addr_absolute_y())
-        self.opcodes[0xA1] = lambda: self.op_lda(self.addr_indexed_indirect())
-        self.opcodes[0xB1] = lambda: self.op_lda(self.addr_indirect_indexed())
+        table[0xA9] = lambda cpu: cpu.op_lda(cpu.addr_immediate())
+        table[0xA5] = lambda cpu: cpu.op_lda(cpu.addr_zero_page())
+        table[0xB5] = lambda cpu: cpu.op_lda(cpu.addr_zero_page_x())
+        table[0xAD] = lambda cpu: cpu.op_lda(cpu.addr_absolute())
+        table[0xBD] = lambda cpu: cpu.op_lda(cpu.addr_absolute_x())
+        table[0xB9] = lambda cpu: cpu.op_lda(cpu.addr_absolute_y())
+        table[0xA1] = lambda cpu: cpu.op_lda(cpu.addr_indexed_indirect())
+        table[0xB1] = lambda cpu: cpu.op_lda(cpu.addr_indirect_indexed())
 
         # LDX
-        self.opcodes[0xA2] = lambda: self.op_ldx(self.addr_immediate())
-        self.opcodes[0xA6] = lambda: self.op_ldx(self.addr_zero_page())
-        self.opcodes[0xB6] = lambda: self.op_ldx(self.addr_zero_page_y())
-        self.opcodes[0xAE] = lambda: self.op_ldx(self.addr_absolute())
-        self.opcodes[0xBE] = lambda: self.op_ldx(self.addr_absolute_y())
+        table[0xA2] = lambda cpu: cpu.op_ldx(cpu.addr_immediate())
+        table[0xA6] = lambda cpu: cpu.op_ldx(cpu.addr_zero_page())
+        table[0xB6] = lambda cpu: cpu.op_ldx(cpu.addr_zero_page_y())
+        table[0xAE] = lambda cpu: cpu.op_ldx(cpu.addr_absolute())
+        table[0xBE] = lambda cpu: cpu.op_ldx(cpu.addr_absolute_y())
 
         # LDY
-        self.opcodes[0xA0] = lambda: self.op_ldy(self.addr_immediate())
-        self.opcodes[0xA4] = lambda: self.op_ldy(self.addr_zero_page())
-        self.opcodes[0xB4] = lambda: self.op_ldy(self.addr_zero_page_x())
-        self.opcodes[0xAC] = lambda: self.op_ldy(self.addr_absolute())
-        self.opcodes[0xBC] = lambda: self.op_ldy(self.addr_absolute_x())
+        table[0xA0] = lambda cpu: cpu.op_ldy(cpu.addr_immediate())
+        table[0xA4] = lambda cpu: cpu.op_ldy(cpu.addr_zero_page())
+        table[0xB4] = lambda cpu: cpu.op_ldy(cpu.addr_zero_page_x())
+        table[0xAC] = lambda cpu: cpu.op_ldy(cpu.addr_absolute())
+        table[0xBC] = lambda cpu: cpu.op_ldy(cpu.addr_absolute_x())
 
         # LSR
-        self.opcodes[0x4A] = lambda: self.op_lsr_acc()
-        self.opcodes[0x46] = lambda: self.op_lsr_mem(self.addr_zero_page())
-        self.opcodes[0x56] = lambda: self.op_lsr_mem(self.addr_zero_page_x())
-        self.opcodes[0x4E] = lambda: self.op_lsr_mem(self.addr_absolute())
-        self.opcodes[0x5E] = lambda: self.op_lsr_mem(self.addr_absolute_x())
+        table[0x4A] = lambda cpu: cpu.op_lsr_acc()
+        table[0x46] = lambda cpu: cpu.op_lsr_mem(cpu.addr_zero_page())
+        table[0x56] = lambda cpu: cpu.op_lsr_mem(cpu.addr_zero_page_x())
+        table[0x4E] = lambda cpu: cpu.op_lsr_mem(cpu.addr_absolute())
+        table[0x5E] = lambda cpu: cpu.op_lsr_mem(cpu.addr_absolute_x())
 
         # NOP
-        self.opcodes[0xEA] = lambda: None
+        table[0xEA] = lambda cpu: None
 
         # ORA
-        self.opcodes[0x09] = lambda: self.op_ora(self.addr_immediate())
-        self.opcodes[0x05] = lambda: self.op_ora(self.addr_zero_page())
-        self.opcodes[0x15] = lambda: self.op_ora(self.addr_zero_page_x())
-        self.opcodes[0x0D] = lambda: self.op_ora(self.addr_absolute())
-        self.opcodes[0x1D] = lambda: self.op_ora(self.addr_absolute_x())
-        self.opcodes[0x19] = lambda: self.op_ora(self.addr_absolute_y())
-        self.opcodes[0x01] = lambda: self.op_ora(self.addr_indexed_indirect())
-        self.opcodes[0x11] = lambda: self.op_ora(self.addr_indirect_indexed())
+        table[0x09] = lambda cpu: cpu.op_ora(cpu.addr_immediate())
+        table[0x05] = lambda cpu: cpu.op_ora(cpu.addr_zero_page())
+        table[0x15] = lambda cpu: cpu.op_ora(cpu.addr_zero_page_x())
+        table[0x0D] = lambda cpu: cpu.op_ora(cpu.addr_absolute())
+        table[0x1D] = lambda cpu: cpu.op_ora(cpu.addr_absolute_x())
+        table[0x19] = lambda cpu: cpu.op_ora(cpu.addr_absolute_y())
+        table[0x01] = lambda cpu: cpu.op_ora(cpu.addr_indexed_indirect())
+        table[0x11] = lambda cpu: cpu.op_ora(cpu.addr_indirect_indexed())
 
         # Stack operations
-        self.opcodes[0x48] = lambda: self.push(self.a)                                    # PHA
-        self.opcodes[0x08] = lambda: self.push(self.status | self.FLAG_B | self.FLAG_U)   # PHP
-        self.opcodes[0x68] = lambda: (setattr(self, 'a', self.pull()), self.update_nz(self.a))  # PLA
-        self.opcodes[0x28] = lambda: setattr(self, 'status', (self.pull() | self.FLAG_U) & ~self.FLAG_B)  # PLP
+        table[0x48] = lambda cpu: cpu.push(cpu.a)                                    # PHA
+        table[0x08] = lambda cpu: cpu.push(cpu.status | cpu.FLAG_B | cpu.FLAG_U)   # PHP
+        table[0x68] = lambda cpu: (setattr(cpu, 'a', cpu.pull()), cpu.update_nz(cpu.a))  # PLA
+        table[0x28] = lambda cpu: setattr(cpu, 'status', (cpu.pull() | cpu.FLAG_U) & ~cpu.FLAG_B)  # PLP
 
         # ROL
-        self.opcodes[0x2A] = lambda: self.op_rol_acc()
-        self.opcodes[0x26] = lambda: self.op_rol_mem(self.addr_zero_page())
-        self.opcodes[0x36] = lambda: self.op_rol_mem(self.addr_zero_page_x())
-        self.opcodes[0x2E] = lambda: self.op_rol_mem(self.addr_absolute())
-        self.opcodes[0x3E] = lambda: self.op_rol_mem(self.addr_absolute_x())
+        table[0x2A] = lambda cpu: cpu.op_rol_acc()
+        table[0x26] = lambda cpu: cpu.op_rol_mem(cpu.addr_zero_page())
+        table[0x36] = lambda cpu: cpu.op_rol_mem(cpu.addr_zero_page_x())
+        table[0x2E] = lambda cpu: cpu.op_rol_mem(cpu.addr_absolute())
+        table[0x3E] = lambda cpu: cpu.op_rol_mem(cpu.addr_absolute_x())
 
         # ROR
-        self.opcodes[0x6A] = lambda: self.op_ror_acc()
-        self.opcodes[0x66] = lambda: self.op_ror_mem(self.addr_zero_page())
-        self.opcodes[0x76] = lambda: self.op_ror_mem(self.addr_zero_page_x())
-        self.opcodes[0x6E] = lambda: self.op_ror_mem(self.addr_absolute())
-        self.opcodes[0x7E] = lambda: self.op_ror_mem(self.addr_absolute_x())
+        table[0x6A] = lambda cpu: cpu.op_ror_acc()
+        table[0x66] = lambda cpu: cpu.op_ror_mem(cpu.addr_zero_page())
+        table[0x76] = lambda cpu: cpu.op_ror_mem(cpu.addr_zero_page_x())
+        table[0x6E] = lambda cpu: cpu.op_ror_mem(cpu.addr_absolute())
+        table[0x7E] = lambda cpu: cpu.op_ror_mem(cpu.addr_absolute_x())
 
         # RTI, RTS
-        self.opcodes[0x40] = lambda: self.op_rti()
-        self.opcodes[0x60] = lambda: self.op_rts()
+        table[0x40] = lambda cpu: cpu.op_rti()
+        table[0x60] = lambda cpu: cpu.op_rts()
 
         # SBC
-        self.opcodes[0xE9] = lambda: self.op_sbc(self.addr_immediate())
-        self.opcodes[0xE5] = lambda: self.op_sbc(self.addr_zero_page())
-        self.opcodes[0xF5] = lambda: self.op_sbc(self.addr_zero_page_x())
-        self.opcodes[0xED] = lambda: self.op_sbc(self.addr_absolute())
-        self.opcodes[0xFD] = lambda: self.op_sbc(self.addr_absolute_x())
-        self.opcodes[0xF9] = lambda: self.op_sbc(self.addr_absolute_y())
-        self.opcodes[0xE1] = lambda: self.op_sbc(self.addr_indexed_indirect())
-        self.opcodes[0xF1] = lambda: self.op_sbc(self.addr_indirect_indexed())
+        table[0xE9] = lambda cpu: cpu.op_sbc(cpu.addr_immediate())
+        table[0xE5] = lambda cpu: cpu.op_sbc(cpu.addr_zero_page())
+        table[0xF5] = lambda cpu: cpu.op_sbc(cpu.addr_zero_page_x())
+        table[0xED] = lambda cpu: cpu.op_sbc(cpu.addr_absolute())
+        table[0xFD] = lambda cpu: cpu.op_sbc(cpu.addr_absolute_x())
+        table[0xF9] = lambda cpu: cpu.op_sbc(cpu.addr_absolute_y())
+        table[0xE1] = lambda cpu: cpu.op_sbc(cpu.addr_indexed_indirect())
+        table[0xF1] = lambda cpu: cpu.op_sbc(cpu.addr_indirect_indexed())
 
         # STA
-        self.opcodes[0x85] = lambda: self.op_sta(self.addr_zero_page())
-        self.opcodes[0x95] = lambda: self.op_sta(self.addr_zero_page_x())
-        self.opcodes[0x8D] = lambda: self.op_sta(self.addr_absolute())
-        self.opcodes[0x9D] = lambda: self.op_sta(self.addr_absolute_x())
-        self.opcodes[0x99] = lambda: self.op_sta(self.addr_absolute_y())
-        self.opcodes[0x81] = lambda: self.op_sta(self.addr_indexed_indirect())
-        self.opcodes[0x91] = lambda: self.op_sta(self.addr_indirect_indexed())
+        table[0x85] = lambda cpu: cpu.op_sta(cpu.addr_zero_page())
+        table[0x95] = lambda cpu: cpu.op_sta(cpu.addr_zero_page_x())
+        table[0x8D] = lambda cpu: cpu.op_sta(cpu.addr_absolute())
+        table[0x9D] = lambda cpu: cpu.op_sta(cpu.addr_absolute_x())
+        table[0x99] = lambda cpu: cpu.op_sta(cpu.addr_absolute_y())
+        table[0x81] = lambda cpu: cpu.op_sta(cpu.addr_indexed_indirect())
+        table[0x91] = lambda cpu: cpu.op_sta(cpu.addr_indirect_indexed())
 
         # STX
-        self.opcodes[0x86] = lambda: self.op_stx(self.addr_zero_page())
-        self.opcodes[0x96] = lambda: self.op_stx(self.addr_zero_page_y())
-        self.opcodes[0x8E] = lambda: self.op_stx(self.addr_absolute())
+        table[0x86] = lambda cpu: cpu.op_stx(cpu.addr_zero_page())
+        table[0x96] = lambda cpu: cpu.op_stx(cpu.addr_zero_page_y())
+        table[0x8E] = lambda cpu: cpu.op_stx(cpu.addr_absolute())
 
         # STY
-        self.opcodes[0x84] = lambda: self.op_sty(self.addr_zero_page())
-        self.opcodes[0x94] = lambda: self.op_sty(self.addr_zero_page_x())
-        self.opcodes[0x8C] = lambda: self.op_sty(self.addr_absolute())
+        table[0x84] = lambda cpu: cpu.op_sty(cpu.addr_zero_page())
+        table[0x94] = lambda cpu: cpu.op_sty(cpu.addr_zero_page_x())
+        table[0x8C] = lambda cpu: cpu.op_sty(cpu.addr_absolute())
 
         # Transfers
-        self.opcodes[0xAA] = lambda: (setattr(self, 'x', self.a), self.update_nz(self.x))      # TAX
-        self.opcodes[0xA8] = lambda: (setattr(self, 'y', self.a), self.update_nz(self.y))      # TAY
-        self.opcodes[0xBA] = lambda: (setattr(self, 'x', self.sp), self.update_nz(self.x))     # TSX
-        self.opcodes[0x8A] = lambda: (setattr(self, 'a', self.x), self.update_nz(self.a))      # TXA
-        self.opcodes[0x9A] = lambda: setattr(self, 'sp', self.x)                               # TXS
-        self.opcodes[0x98] = lambda: (setattr(self, 'a', self.y), self.update_nz(self.a))      # TYA
+        table[0xAA] = lambda cpu: (setattr(cpu, 'x', cpu.a), cpu.update_nz(cpu.x))      # TAX
+        table[0xA8] = lambda cpu: (setattr(cpu, 'y', cpu.a), cpu.update_nz(cpu.y))      # TAY
+        table[0xBA] = lambda cpu: (setattr(cpu, 'x', cpu.sp), cpu.update_nz(cpu.x))     # TSX
+        table[0x8A] = lambda cpu: (setattr(cpu, 'a', cpu.x), cpu.update_nz(cpu.a))      # TXA
+        table[0x9A] = lambda cpu: setattr(cpu, 'sp', cpu.x)                               # TXS
+        table[0x98] = lambda cpu: (setattr(cpu, 'a', cpu.y), cpu.update_nz(cpu.a))      # TYA
+
+        CPU._reference_opcodes = table
+        return table
 
     # --- Disassembly for tracing ---
 
@@ -724,49 +820,54 @@ class CPU:
     def disassemble(self, addr: int) -> tuple[str, int]:
         """Disassemble instruction at addr. Returns (text, length)."""
         opcode = self.memory.read(addr)
-        if opcode not in self.OPCODE_NAMES:
+        operand = 0
+        if opcode in self.OPCODE_NAMES:
+            length = MODE_LENGTHS[self.OPCODE_NAMES[opcode][1]]
+            for i in range(length, 0, -1):
+                operand = (operand << 8) | self.memory.read(addr + i)
+        return self.format_instruction(addr, opcode, operand)
+
+    @classmethod
+    def format_instruction(cls, addr: int, opcode: int,
+                           operand: int) -> tuple[str, int]:
+        """Disassemble an instruction from its opcode and operand value.
+
+        operand is the little-endian value of the operand bytes; bytes
+        beyond the instruction's length are ignored. Returns (text, length).
+        """
+        if opcode not in cls.OPCODE_NAMES:
             return f"???  (${opcode:02X})", 1
 
-        name, mode = self.OPCODE_NAMES[opcode]
+        name, mode = cls.OPCODE_NAMES[opcode]
+        val = operand & 0xFF
+        word = operand & 0xFFFF
 
         if mode == "":
             return name, 1
         elif mode == "A":
             return f"{name} A", 1
         elif mode == "#":
-            val = self.memory.read(addr + 1)
             return f"{name} #${val:02X}", 2
         elif mode == "zp":
-            val = self.memory.read(addr + 1)
             return f"{name} ${val:02X}", 2
         elif mode == "zp,x":
-            val = self.memory.read(addr + 1)
             return f"{name} ${val:02X},X", 2
         elif mode == "zp,y":
-            val = self.memory.read(addr + 1)
             return f"{name} ${val:02X},Y", 2
         elif mode == "abs":
-            val = self.memory.read_word(addr + 1)
-            return f"{name} ${val:04X}", 3
+            return f"{name} ${word:04X}", 3
         elif mode == "abs,x":
-            val = self.memory.read_word(addr + 1)
-            return f"{name} ${val:04X},X", 3
+            return f"{name} ${word:04X},X", 3
         elif mode == "abs,y":
-            val = self.memory.read_word(addr + 1)
-            return f"{name} ${val:04X},Y", 3
+            return f"{name} ${word:04X},Y", 3
         elif mode == "(abs)":
-            val = self.memory.read_word(addr + 1)
-            return f"{name} (${val:04X})", 3
+            return f"{name} (${word:04X})", 3
         elif mode == "(zp,x)":
-            val = self.memory.read(addr + 1)
             return f"{name} (${val:02X},X)", 2
         elif mode == "(zp),y":
-            val = self.memory.read(addr + 1)
             return f"{name} (${val:02X}),Y", 2
         elif mode == "rel":
-            offset = self.memory.read(addr + 1)
-            if offset & 0x80:
-                offset -= 0x100
+            offset = val - 0x100 if val & 0x80 else val
             target = (addr + 2 + offset) & 0xFFFF
             return f"{name} ${target:04X}", 2
         else:
@@ -774,20 +875,74 @@ class CPU:
 
     def format_state(self) -> str:
         """Format current CPU state for tracing."""
+        return self.format_registers(self.a, self.x, self.y, self.sp, self.status)
+
+    @classmethod
+    def format_registers(cls, a: int, x: int, y: int, sp: int, p: int) -> str:
+        """Format register values for tracing."""
         flags = ""
-        flags += "N" if self.get_flag(self.FLAG_N) else "n"
-        flags += "V" if self.get_flag(self.FLAG_V) else "v"
+        flags += "N" if p & cls.FLAG_N else "n"
+        flags += "V" if p & cls.FLAG_V else "v"
         flags += "-"
-        flags += "B" if self.get_flag(self.FLAG_B) else "b"
-        flags += "D" if self.get_flag(self.FLAG_D) else "d"
-        flags += "I" if self.get_flag(self.FLAG_I) else "i"
-        flags += "Z" if self.get_flag(self.FLAG_Z) else "z"
-        flags += "C" if self.get_flag(self.FLAG_C) else "c"
-        return f"A=${self.a:02X} X=${self.x:02X} Y=${self.y:02X} SP=${self.sp:02X} [{flags}]"
+        flags += "B" if p & cls.FLAG_B else "b"
+        flags += "D" if p & cls.FLAG_D else "d"
+        flags += "I" if p & cls.FLAG_I else "i"
+        flags += "Z" if p & cls.FLAG_Z else "z"
+        flags += "C" if p & cls.FLAG_C else "c"
+        return f"A=${a:02X} X=${x:02X} Y=${y:02X} SP=${sp:02X} [{flags}]"
+
+    @property
+    def trace_buffer(self) -> TraceBuffer:
+        """The trace ring buffer, holding up to trace_capacity entries."""
+        if self._trace is None or self._trace.capacity != self.trace_capacity:
+            self._trace = TraceBuffer(self.trace_capacity)
+        return self._trace
+
+    def trace_lines(self, last: Optional[int] = None,
+                    symbolize: Optional[Symbolizer] = None) -> list[str]:
+        """Format the traced instructions, oldest first.
+
+        Only the last `last` entries are formatted if given. symbolize, if
+        given, maps a PC to a label appended to its line.
+        """
+        if self._trace is None:
+            return []
+        return [self.format_trace_entry(entry, symbolize)
+                for entry in self._trace.entries(last)]
+
+    @classmethod
+    def format_trace_entry(cls, entry: tuple[int, ...],
+                           symbolize: Optional[Symbolizer] = None) -> str:
+        """Format a raw (pc, opcode, operand, a, x, y, sp, p) trace entry."""
+        pc, opcode, operand, a, x, y, sp, p = entry
+        disasm, _ = cls.format_instruction(pc, opcode, operand)
+        state = cls.format_registers(a, x, y, sp, p)
+        line = f"${pc:04X}: {disasm:20s}  {state}"
+        label = symbolize(pc) if symbolize else None
+        return f"{line}  <{label}>" if label else line
+
+    @property
+    def trace_log(self) -> list[str]:
+        """All kept trace entries, formatted."""
+        return self.trace_lines()
 
     def add_pc_hook(self, addr: int, hook: Callable[[], None]) -> None:
         """Add a hook that's called when PC reaches a specific address."""
         self.pc_hooks[addr] = hook
+        if self.blocks is not None:
+            # Cached blocks may run straight through the hooked address
+            self.blocks.clear()
+
+    def add_pc_watch(self, addr: int, callback: Callable[[], None]) -> None:
+        """Call callback when PC reaches addr, then run the instruction there.
+
+        Unlike a PC hook, the instruction at addr still executes, and is
+        traced, profiled and counted like any other.
+        """
+        self.pc_watches[addr] = callback
+        if self.blocks is not None:
+            # Cached blocks may run straight through the watched address
+            self.blocks.clear()
 
     # --- Execution ---
 
@@ -806,8 +961,14 @@ class CPU:
         if self.pc in self.pc_hooks:
             self.pc_hooks[self.pc]()
             self.instruction_count += 1
+            if self.call_graph is not None:
+                self.call_graph.unwind(self.sp)
             return True
 
+        # Check for PC watches, which run before the instruction
+        if self.pc in self.pc_watches:
+            self.pc_watches[self.pc]()
+
         # Fetch opcode
         pc_before = self.pc
         opcode = self.memory.read(self.pc)
@@ -816,17 +977,27 @@ class CPU:
         # Check for invalid opcode
         if self.opcodes[opcode] is None:
             raise InvalidOpcodeError(
-                f"Invalid opcode ${opcode:02X} at ${pc_before:04X}"
+                f"Invalid opcode ${opcode:02X} at ${pc_before:04X}",
+                addr=pc_before
             )
 
         # Trace before execution if enabled
         if self.trace_enabled:
-            disasm, _ = self.disassemble(pc_before)
-            state = self.format_state()
-            self.trace_log.append(f"${pc_before:04X}: {disasm:20s}  {state}")
+            ram = self.memory._mem
+            entry = (pc_before, opcode,
+                     ram[self.pc] | (ram[(self.pc + 1) & 0xFFFF] << 8),
+                     self.a, self.x, self.y, self.sp, self.status)
+            self.trace_buffer.record(*entry)
+            if self.trace_writer is not None:
+                self.trace_writer.record(*entry)
+        if self.profile is not None:
+            self.profile.pc_counts[pc_before] += 1
+            self.profile.opcode_counts[opcode] += 1
+        if self.call_graph is not None:
+            self.call_graph.record(pc_before, opcode)
 
         # Execute
-        self.opcodes[opcode]()
+        self.opcodes[opcode](self)
         self.instruction_count += 1
 
         return True
@@ -836,9 +1007,7 @@ class CPU:
 
         Returns True if terminated successfully at $FFF9.
         """
-        while self.instruction_count < max_instructions:
-            if not self.step():
-                break
+        self.run_until(max_instructions)
 
         if not self.halted and self.instruction_count >= max_instructions:
             raise RuntimeError(
@@ -846,3 +1015,225 @@ class CPU:
             )
 
         return self.success
+
+    def run_until(self, max_instructions: int) -> None:
+        """Run until halted or instruction_count reaches max_instructions.
+
+        Unlike run(), reaching the count is not an error, so a long run can
+        be made in slices.
+        """
+        if not self.idle_iterations:
+            self._run_slice(max_instructions)
+            return
+        while not self.halted and self.instruction_count < max_instructions:
+            self._run_slice(min(max_instructions,
+                                self.instruction_count + self.IDLE_CHECK_INTERVAL))
+            self._check_idle(max_instructions)
+
+    def _run_slice(self, max_instructions: int) -> None:
+        """Run with the loop suited to the tracing, profiling and engine."""
+        if self.trace_enabled:
+            while self.instruction_count < max_instructions:
+                if not self.step():
+                    break
+        elif self.profile is not None or self.call_graph is not None:
+            self._run_instrumented(max_instructions)
+        elif self.blocks is not None:
+            self._run_blocks(max_instructions)
+        elif self.decoded is not None:
+            self._run_decoded(max_instructions)
+        else:
+            self._run_fast(max_instructions)
+
+    def _check_idle(self, max_instructions: int) -> None:
+        """Step a few instructions, checking for a loop that can't exit.
+
+        Raises IdleLoopError if they keep returning to exactly the registers
+        and memory they started from. With nothing changed, such a loop can
+        only exit on input from a hook, so idle_iterations repeats are
+        taken as proof it never will.
+        """
+        if self.halted:
+            return
+        start = (self.pc, self.a, self.x, self.y, self.sp, self.status)
+        memory = self.memory.snapshot()
+        pcs = set()
+        iterations = 0
+        length = 0  # Instructions per iteration, once known
+        steps = 0
+        while self.instruction_count < max_instructions:
+            pcs.add(self.pc)
+            if not self.step():
+                return
+            steps += 1
+            if ((self.pc, self.a, self.x, self.y, self.sp, self.status) == start
+                    and self.memory.snapshot() == memory):
+                iterations += 1
+                length = length or steps
+                if iterations >= self.idle_iterations:
+                    low, high = min(pcs), max(pcs)
+                    raise IdleLoopError(
+                        f"Idle loop at ${low:04X}-${high:04X} "
+                        f"({iterations} identical iterations)",
+                        start=low, end=high
+                    )
+            elif steps >= (length * (iterations + 1) if length else self.IDLE_LOOP_MAX):
+                return
+
+    def _run_fast(self, max_instructions: int) -> None:
+        """Untraced equivalent of calling step() until it returns False."""
+        if self.halted:
+            return
+        read = self.memory.read
+        opcodes = self.opcodes
+        pc_hooks = self.pc_hooks
+        pc_watches = self.pc_watches
+        count = self.instruction_count
+        try:
+            while count < max_instructions:
+                pc = self.pc
+                if pc == self.SUCCESS_ADDR:
+                    self.halted = True
+                    self.success = True
+                    return
+                if pc in pc_hooks:
+                    pc_hooks[pc]()
+                    count += 1
+                    continue
+                if pc in pc_watches:
+                    pc_watches[pc]()
+                opcode = read(pc)
+                self.pc = (pc + 1) & 0xFFFF
+                handler = opcodes[opcode]
+                if handler is None:
+                    raise InvalidOpcodeError(
+                        f"Invalid opcode ${opcode:02X} at ${pc:04X}",
+                        addr=pc
+                    )
+                handler(self)
+                count += 1
+        finally:
+            self.instruction_count = count
+
+    def _run_instrumented(self, max_instructions: int) -> None:
+        """_run_fast, also reporting instructions to the profile and call graph."""
+        if self.halted:
+            return
+        read = self.memory.read
+        opcodes = self.opcodes
+        pc_hooks = self.pc_hooks
+        pc_watches = self.pc_watches
+        profile = self.profile
+        pc_counts = profile.pc_counts if profile is not None else None
+        opcode_counts = profile.opcode_counts if profile is not None else None
+        graph = self.call_graph
+        record_call = graph.record if graph is not None else None
+        count = self.instruction_count
+        try:
+            while count < max_instructions:
+                pc = self.pc
+                if pc == self.SUCCESS_ADDR:
+                    self.halted = True
+                    self.success = True
+                    return
+                if pc in pc_hooks:
+                    pc_hooks[pc]()
+                    count += 1
+                    if graph is not None:
+                        graph.unwind(self.sp)
+                    continue
+                if pc in pc_watches:
+                    pc_watches[pc]()
+                opcode = read(pc)
+                self.pc = (pc + 1) & 0xFFFF
+                handler = opcodes[opcode]
+                if handler is None:
+                    raise InvalidOpcodeError(
+                        f"Invalid opcode ${opcode:02X} at ${pc:04X}",
+                        addr=pc
+                    )
+                if pc_counts is not None:
+                    pc_counts[pc] += 1
+                    opcode_counts[opcode] += 1
+                if record_call is not None:
+                    record_call(pc, opcode)
+                handler(self)
+                count += 1
+        finally:
+            self.instruction_count = count
+
+    def _run_decoded(self, max_instructions: int) -> None:
+        """Untraced run using the predecoded instruction cache."""
+        if self.halted:
+            return
+        entries = self.decoded.entries
+        decode = self.decoded.decode
+        pc_hooks = self.pc_hooks
+        pc_watches = self.pc_watches
+        count = self.instruction_count
+        try:
+            while count < max_instructions:
+                pc = self.pc
+                if pc == self.SUCCESS_ADDR:
+                    self.halted = True
+                    self.success = True
+                    return
+                if pc in pc_hooks:
+                    pc_hooks[pc]()
+                    count += 1
+                    continue
+                if pc in pc_watches:
+                    entry = None
+                else:
+                    entry = entries[pc] or decode(pc)
+                if entry is None:
+                    # Invalid, uncacheable or watched: one step
+                    self.instruction_count = count
+                    self.step()
+                    count = self.instruction_count
+                    continue
+                handler, operand, self.pc = entry
+                handler(self, operand)
+                count += 1
+        finally:
+            self.instruction_count = count
+
+    def _run_blocks(self, max_instructions: int) -> None:
+        """Untraced run using the basic-block translation cache."""
+        if self.halted:
+            return
+        blocks = self.blocks
+        pc_hooks = self.pc_hooks
+        pc_watches = self.pc_watches
+        count = self.instruction_count
+        try:
+            while count < max_instructions:
+                pc = self.pc
+                if pc == self.SUCCESS_ADDR:
+                    self.halted = True
+                    self.success = True
+                    return
+                if pc in pc_hooks:
+                    pc_hooks[pc]()
+                    count += 1
+                    continue
+                block = None if pc in pc_watches else blocks.get(pc)
+                if block is None or count + block.length > max_instructions:
+                    # Untranslatable, watched, or would overrun the limit:
+                    # one step
+                    self.instruction_count = count
+                    self.step()
+                    count = self.instruction_count
+                    continue
+                # Any other exception (from a memory hook, or a
+                # KeyboardInterrupt) may stop the block anywhere, with
+                # cpu.pc still at its start, so the count stays there too
+                try:
+                    count += block.run()
+                except BrkAbortError:
+                    # BRK only ever ends a block: count the instructions
+                    # before it
+                    count += block.length - 1
+                    raise
+        finally:
+            self.instruction_count = count
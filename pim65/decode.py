@@ -0,0 +1,175 @@
+"""Predecoded instruction cache for the 6502 CPU core.
+
+The flat engine fetches and decodes every instruction it runs: a read()
+call for the opcode, then reads of each operand byte inside its handler.
+This cache does that once per address instead. Each entry holds the
+instruction's handler, its operand (with relative branch targets already
+resolved) and the address of the next instruction, so a loop that runs
+again only looks up its entries.
+
+The handlers are generated from the same instruction bodies as the flat
+handlers in dispatch.py, but take the operand as an argument, and are
+shared by every CPU like those.
+
+The bytes of every cached instruction are watched in Memory, so a write
+to any of them drops the entry and the instruction is decoded afresh when
+next reached; Runix patches its own operands, and its relocator rewrites
+those of freshly loaded runes.
+"""
+
+from typing import Callable, Optional
+
+from .dispatch import (GLOBALS, MODE_LENGTHS, OPS, inline_memory,
+                       memory_preamble, op_key)
+
+# Addressing modes: lines that compute `addr` from a predecoded `operand`
+MODES = {
+    "": [],
+    "A": [],
+    "#": [],
+    "zp": ["addr = operand"],
+    "zp,x": ["addr = (operand + cpu.x) & 0xFF"],
+    "zp,y": ["addr = (operand + cpu.y) & 0xFF"],
+    "abs": ["addr = operand"],
+    "abs,x": ["addr = (operand + cpu.x) & 0xFFFF"],
+    "abs,y": ["addr = (operand + cpu.y) & 0xFFFF"],
+    "(abs)": [
+        # 6502 bug: the pointer's high byte never carries into the next page
+        "p1 = (operand & 0xFF00) | ((operand + 1) & 0xFF)",
+        "addr = read(operand) | (read(p1) << 8)",
+    ],
+    "(zp,x)": [
+        "zp = (operand + cpu.x) & 0xFF",
+        "z1 = (zp + 1) & 0xFF",
+        "addr = read(zp) | (read(z1) << 8)",
+    ],
+    "(zp),y": [
+        "z1 = (operand + 1) & 0xFF",
+        "addr = ((read(operand) | (read(z1) << 8)) + cpu.y) & 0xFFFF",
+    ],
+    # The operand of a decoded branch is its target
+    "rel": ["addr = operand"],
+}
+
+
+def handler_source(opcode: int, name: str, mode: str) -> list[str]:
+    """Generate the source lines of a predecoded handler for one opcode.
+
+    cpu.pc already holds the address of the next instruction when it runs.
+    """
+    reads, body = OPS[op_key(name, mode)]
+    lines = list(MODES[mode])
+    if reads:
+        lines.append("v = operand" if mode == "#" else "v = read(addr)")
+    lines.extend(body)
+    lines = inline_memory(lines)
+    return [f"def op_{opcode:02X}(cpu, operand):",
+            *(f"    {line}" for line in memory_preamble(lines) + lines)]
+
+
+def table_source(opcode_names: dict[int, tuple[str, str]]) -> str:
+    """Generate the source of all handlers and the `TABLE` listing them."""
+    lines = []
+    for opcode in sorted(opcode_names):
+        name, mode = opcode_names[opcode]
+        lines.extend(handler_source(opcode, name, mode))
+    table = ", ".join(
+        f"op_{opcode:02X}" if opcode in opcode_names else "None"
+        for opcode in range(256)
+    )
+    lines.append(f"TABLE = [{table}]")
+    return "\n".join(lines) + "\n"
+
+
+_table: list[Optional[Callable[..., None]]] = []
+
+
+def handler_table(opcode_names: dict[int, tuple[str, str]]
+                  ) -> list[Optional[Callable[..., None]]]:
+    """The shared 256-entry predecoded handler table, compiled on first use."""
+    if not _table:
+        namespace = dict(GLOBALS)
+        source = table_source(opcode_names)
+        exec(compile(source, "<pim65.decode>", "exec"), namespace)
+        _table.extend(namespace["TABLE"])
+    return _table
+
+
+# A cached instruction: (handler, operand, address of the next instruction)
+Entry = tuple[Callable[..., None], int, int]
+
+
+class DecodeCache:
+    """Predecoded instructions by address for one CPU."""
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        self.handlers = handler_table(cpu.OPCODE_NAMES)
+        self.entries: list[Optional[Entry]] = [None] * 0x10000
+        self._count = 0
+        # Number of cached instructions covering each byte
+        self._covers = bytearray(0x10000)
+        self.memory.watch_callback = self.invalidate
+
+    def __len__(self) -> int:
+        return self._count
+
+    def decode(self, pc: int) -> Optional[Entry]:
+        """Decode and cache the instruction at pc.
+
+        Returns None for invalid opcodes and for instructions that can't be
+        cached because they touch hooked addresses or wrap past $FFFF; the
+        caller should single-step those.
+        """
+        memory = self.memory
+        opcode = memory.read(pc)
+        handler = self.handlers[opcode]
+        if handler is None:
+            return None
+        mode = self.cpu.OPCODE_NAMES[opcode][1]
+        length = 1 + MODE_LENGTHS[mode]
+        if pc + length > 0x10000 or any(
+                memory.is_hooked(pc + i) for i in range(length)):
+            return None
+        operand = 0
+        for i in range(length - 1, 0, -1):
+            operand = (operand << 8) | memory.read(pc + i)
+        next_pc = (pc + length) & 0xFFFF
+        if mode == "rel":
+            offset = operand - 0x100 if operand & 0x80 else operand
+            operand = (next_pc + offset) & 0xFFFF
+        entry = self.entries[pc] = (handler, operand, next_pc)
+        self._count += 1
+        for addr in range(pc, pc + length):
+            if not self._covers[addr]:
+                memory.set_watched(addr, True)
+            self._covers[addr] += 1
+        return entry
+
+    def invalidate(self, addr: int) -> None:
+        """Drop every cached instruction that includes addr."""
+        if not self._covers[addr]:
+            return
+        for start in range(max(addr - 2, 0), addr + 1):
+            entry = self.entries[start]
+            if entry is not None and start + self._length(start, entry) > addr:
+                self._remove(start, entry)
+
+    def clear(self) -> None:
+        """Drop all cached instructions."""
+        for start, entry in enumerate(self.entries):
+            if entry is not None:
+                self._remove(start, entry)
+
+    @staticmethod
+    def _length(start: int, entry: Entry) -> int:
+        return (entry[2] - start) & 0xFFFF
+
+    def _remove(self, start: int, entry: Entry) -> None:
+        self.entries[start] = None
+        self._count -= 1
+        for addr in range(start, start + self._length(start, entry)):
+            self._covers[addr] -= 1
+            if not self._covers[addr]:
+                self.memory.set_watched(addr, False)
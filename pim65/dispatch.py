@@ -0,0 +1,496 @@
+"""Generated flat opcode handlers for the 6502 CPU core.
+
+The reference opcode table in CPU calls an addressing-mode method and then an
+op_* method for every instruction, plus get_flag/set_flag/update_nz for the
+flags. Here each opcode is instead generated as one flat function with the
+operand fetch, flag updates and register writeback inlined, and the whole set
+is compiled once per process from Python source. Handlers take the CPU as
+their argument, so one table is shared by every CPU instance.
+"""
+
+import re
+from typing import Callable, Optional
+
+from .bcd import CARRY_SHIFT, adc_table, sbc_table
+
+# Globals of generated code, besides the memory names it loads from the CPU
+GLOBALS = {
+    "CARRY_SHIFT": CARRY_SHIFT,
+    "adc_table": adc_table,
+    "sbc_table": sbc_table,
+}
+
+# Operand bytes following the opcode, by addressing mode
+MODE_LENGTHS = {
+    "": 0, "A": 0, "#": 1, "zp": 1, "zp,x": 1, "zp,y": 1,
+    "abs": 2, "abs,x": 2, "abs,y": 2, "(abs)": 2,
+    "(zp,x)": 1, "(zp),y": 1, "rel": 1,
+}
+
+# Addressing modes: lines that compute `addr` from the operand at `pc`
+MODES = {
+    "": [],
+    "A": [],
+    "#": ["addr = pc"],
+    "zp": ["addr = read(pc)"],
+    "zp,x": ["addr = (read(pc) + cpu.x) & 0xFF"],
+    "zp,y": ["addr = (read(pc) + cpu.y) & 0xFF"],
+    "abs": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "addr = read(pc) | (read(p1) << 8)",
+    ],
+    "abs,x": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "addr = ((read(pc) | (read(p1) << 8)) + cpu.x) & 0xFFFF",
+    ],
+    "abs,y": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "addr = ((read(pc) | (read(p1) << 8)) + cpu.y) & 0xFFFF",
+    ],
+    "(abs)": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "ptr = read(pc) | (read(p1) << 8)",
+        # 6502 bug: the pointer's high byte never carries into the next page
+        "p2 = (ptr & 0xFF00) | ((ptr + 1) & 0xFF)",
+        "addr = read(ptr) | (read(p2) << 8)",
+    ],
+    "(zp,x)": [
+        "zp = (read(pc) + cpu.x) & 0xFF",
+        "z1 = (zp + 1) & 0xFF",
+        "addr = read(zp) | (read(z1) << 8)",
+    ],
+    "(zp),y": [
+        "zp = read(pc)",
+        "z1 = (zp + 1) & 0xFF",
+        "addr = ((read(zp) | (read(z1) << 8)) + cpu.y) & 0xFFFF",
+    ],
+    "rel": [
+        "off = read(pc)",
+        "addr = (pc + 1 + off - ((off & 0x80) << 1)) & 0xFFFF",
+    ],
+}
+
+# Read-modify-write instructions: fixed cost, no page-crossing penalty
+RMW = {"ASL", "LSR", "ROL", "ROR", "INC", "DEC"}
+
+# Indexed modes that cost a cycle more when the index crosses a page,
+# as lines computing `base` and `addr`; see penalty_lines()
+INDEXED_MODES = {
+    "abs,x": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "base = read(pc) | (read(p1) << 8)",
+        "addr = (base + cpu.x) & 0xFFFF",
+    ],
+    "abs,y": [
+        "p1 = (pc + 1) & 0xFFFF",
+        "base = read(pc) | (read(p1) << 8)",
+        "addr = (base + cpu.y) & 0xFFFF",
+    ],
+    "(zp),y": [
+        "zp = read(pc)",
+        "z1 = (zp + 1) & 0xFF",
+        "base = read(zp) | (read(z1) << 8)",
+        "addr = (base + cpu.y) & 0xFFFF",
+    ],
+}
+
+# Base cycles by addressing mode for (reads or writes, read-modify-write)
+_MODE_CYCLES = {
+    "#": (2, 2), "zp": (3, 5), "zp,x": (4, 6), "zp,y": (4, 6),
+    "abs": (4, 6), "abs,x": (4, 7), "abs,y": (4, 7),
+    "(zp,x)": (6, 6), "(zp),y": (5, 5), "rel": (2, 2),
+}
+
+# Instructions whose cost does not follow from their addressing mode
+_OP_CYCLES = {
+    ("JMP", "abs"): 3, ("JMP", "(abs)"): 5, ("JSR", "abs"): 6,
+    ("BRK", ""): 7, ("RTI", ""): 6, ("RTS", ""): 6,
+    ("PHA", ""): 3, ("PHP", ""): 3, ("PLA", ""): 4, ("PLP", ""): 4,
+    ("STA", "abs,x"): 5, ("STA", "abs,y"): 5, ("STA", "(zp),y"): 6,
+}
+
+
+def base_cycles(name: str, mode: str) -> int:
+    """NMOS 6502 cycles for an instruction, before any penalties."""
+    if (name, mode) in _OP_CYCLES:
+        return _OP_CYCLES[(name, mode)]
+    if mode in ("", "A"):
+        return 2
+    read_write, rmw = _MODE_CYCLES[mode]
+    return rmw if name in RMW else read_write
+
+
+def penalty_lines(name: str, mode: str) -> list[str]:
+    """Lines adding the page-crossing cycle an instruction may pay.
+
+    Only reads pay it; stores and read-modify-write instructions always
+    take the extra cycle, which base_cycles() already includes.
+    """
+    if mode in INDEXED_MODES and OPS[op_key(name, mode)][0] and name not in RMW:
+        return ["if (base ^ addr) & 0xFF00:", "    cpu.cycles += 1"]
+    return []
+
+
+# Flags other than N and Z live in cpu._flags, and N and Z are left as
+# the last result in cpu._nz; see CPU.status. These masks clear the bits
+# of _flags an instruction is about to set.
+_KEEP_NOT_C = "0xFE"
+_KEEP_NOT_VC = "0xBE"
+_KEEP_NOT_V = "0xBF"
+
+
+def _load(reg: str) -> list[str]:
+    return [
+        f"cpu.{reg} = v",
+        "cpu._nz = v",
+    ]
+
+
+def _logic(op: str) -> list[str]:
+    return [
+        f"a = cpu.a {op} v",
+        "cpu.a = a",
+        "cpu._nz = a",
+    ]
+
+
+def _compare(reg: str) -> list[str]:
+    return [
+        f"r = cpu.{reg} + (v ^ 0xFF) + 1",
+        "cpu._nz = r & 0xFF",
+        f"cpu._flags = (cpu._flags & {_KEEP_NOT_C}) | (r >> 8)",
+    ]
+
+
+def _step_reg(reg: str, delta: str) -> list[str]:
+    return [
+        f"r = (cpu.{reg} {delta}) & 0xFF",
+        f"cpu.{reg} = r",
+        "cpu._nz = r",
+    ]
+
+
+def _step_mem(delta: str) -> list[str]:
+    return [
+        f"r = (v {delta}) & 0xFF",
+        "write(addr, r)",
+        "cpu._nz = r",
+    ]
+
+
+def _transfer(src: str, dst: str) -> list[str]:
+    return [
+        f"v = cpu.{src}",
+        f"cpu.{dst} = v",
+        "cpu._nz = v",
+    ]
+
+
+# Branch conditions as (flag set, flag clear)
+_FLAG_TESTS = {
+    0x01: ("cpu._flags & 0x01", "not cpu._flags & 0x01"),
+    0x02: ("not cpu._nz & 0xFF", "cpu._nz & 0xFF"),
+    0x40: ("cpu._flags & 0x40", "not cpu._flags & 0x40"),
+    0x80: ("cpu._nz & 0x180", "not cpu._nz & 0x180"),
+}
+
+
+def _branch(flag: int, taken_if_set: bool) -> list[str]:
+    test = _FLAG_TESTS[flag][0 if taken_if_set else 1]
+    return [f"if {test}:", "    cpu.pc = addr"]
+
+
+def _push(value: str) -> list[str]:
+    return [
+        "sp = cpu.sp",
+        "s = 0x100 + sp",
+        f"write(s, {value})",
+        "cpu.sp = (sp - 1) & 0xFF",
+    ]
+
+
+def _shift(shift: str, carry: str, target: str) -> list[str]:
+    """Shift or rotate `v`, writing the result to `target`."""
+    lines = [f"r = {shift}"]
+    if target == "a":
+        lines.append("cpu.a = r")
+    else:
+        lines.append("write(addr, r)")
+    lines.append("cpu._nz = r")
+    lines.append(f"cpu._flags = (s & {_KEEP_NOT_C}) | {carry}")
+    return ["s = cpu._flags"] + lines
+
+
+def _decimal(table: str) -> list[str]:
+    """Lines for ADC or SBC in decimal mode, looked up in a bcd table."""
+    return [
+        f"    r = {table}()[((s & 0x01) << CARRY_SHIFT) | (a << 8) | v]",
+        "    cpu.a = cpu._nz = r & 0xFF",
+        f"    cpu._flags = (s & {_KEEP_NOT_VC}) | (r >> 8)",
+    ]
+
+
+_ASL = ("(v << 1) & 0xFF", "(v >> 7)")
+_LSR = ("v >> 1", "(v & 0x01)")
+_ROL = ("((v << 1) & 0xFF) | (s & 0x01)", "(v >> 7)")
+_ROR = ("(v >> 1) | ((s & 0x01) << 7)", "(v & 0x01)")
+
+# Instruction bodies as (reads operand into `v`, lines).
+OPS: dict[str, tuple[bool, list[str]]] = {
+    "ADC": (True, [
+        "s = cpu._flags",
+        "a = cpu.a",
+        "if s & 0x08:",
+        *_decimal("adc_table"),
+        "else:",
+        "    r = a + v + (s & 0x01)",
+        "    cpu.a = cpu._nz = r & 0xFF",
+        f"    cpu._flags = ((s & {_KEEP_NOT_VC}) | (r >> 8)"
+        " | (((a ^ r) & (v ^ r) & 0x80) >> 1))",
+    ]),
+    "SBC": (True, [
+        "s = cpu._flags",
+        "a = cpu.a",
+        "if s & 0x08:",
+        *_decimal("sbc_table"),
+        "else:",
+        "    v ^= 0xFF",
+        "    r = a + v + (s & 0x01)",
+        "    cpu.a = cpu._nz = r & 0xFF",
+        f"    cpu._flags = ((s & {_KEEP_NOT_VC}) | (r >> 8)"
+        " | (((a ^ r) & (v ^ r) & 0x80) >> 1))",
+    ]),
+    "AND": (True, _logic("&")),
+    "ORA": (True, _logic("|")),
+    "EOR": (True, _logic("^")),
+    "ASL_A": (False, ["v = cpu.a"] + _shift(*_ASL, "a")),
+    "ASL": (True, _shift(*_ASL, "mem")),
+    "LSR_A": (False, ["v = cpu.a"] + _shift(*_LSR, "a")),
+    "LSR": (True, _shift(*_LSR, "mem")),
+    "ROL_A": (False, ["v = cpu.a"] + _shift(*_ROL, "a")),
+    "ROL": (True, _shift(*_ROL, "mem")),
+    "ROR_A": (False, ["v = cpu.a"] + _shift(*_ROR, "a")),
+    "ROR": (True, _shift(*_ROR, "mem")),
+    "BCC": (False, _branch(0x01, False)),
+    "BCS": (False, _branch(0x01, True)),
+    "BNE": (False, _branch(0x02, False)),
+    "BEQ": (False, _branch(0x02, True)),
+    "BVC": (False, _branch(0x40, False)),
+    "BVS": (False, _branch(0x40, True)),
+    "BPL": (False, _branch(0x80, False)),
+    "BMI": (False, _branch(0x80, True)),
+    "BIT": (True, [
+        f"cpu._flags = (cpu._flags & {_KEEP_NOT_V}) | (v & 0x40)",
+        # Bit 8 carries N from the operand even when Z is set
+        "cpu._nz = ((v & 0x80) << 1) | (cpu.a & v)",
+    ]),
+    "BRK": (False, ["cpu.op_brk()"]),
+    "CLC": (False, ["cpu._flags &= 0xFE"]),
+    "CLD": (False, ["cpu._flags &= 0xF7"]),
+    "CLI": (False, ["cpu._flags &= 0xFB"]),
+    "CLV": (False, ["cpu._flags &= 0xBF"]),
+    "SEC": (False, ["cpu._flags |= 0x01"]),
+    "SED": (False, ["cpu._flags |= 0x08"]),
+    "SEI": (False, ["cpu._flags |= 0x04"]),
+    "CMP": (True, _compare("a")),
+    "CPX": (True, _compare("x")),
+    "CPY": (True, _compare("y")),
+    "DEC": (True, _step_mem("- 1")),
+    "INC": (True, _step_mem("+ 1")),
+    "DEX": (False, _step_reg("x", "- 1")),
+    "DEY": (False, _step_reg("y", "- 1")),
+    "INX": (False, _step_reg("x", "+ 1")),
+    "INY": (False, _step_reg("y", "+ 1")),
+    "JMP": (False, ["cpu.pc = addr"]),
+    "JSR": (False, [
+        "ret = (cpu.pc - 1) & 0xFFFF",
+        "sp = cpu.sp",
+        "s = 0x100 + sp",
+        "write(s, ret >> 8)",
+        "s = 0x100 + ((sp - 1) & 0xFF)",
+        "write(s, ret & 0xFF)",
+        "cpu.sp = (sp - 2) & 0xFF",
+        "cpu.pc = addr",
+    ]),
+    "LDA": (True, _load("a")),
+    "LDX": (True, _load("x")),
+    "LDY": (True, _load("y")),
+    "NOP": (False, ["pass"]),
+    "PHA": (False, _push("cpu.a")),
+    "PHP": (False, _push("cpu.status | 0x30")),
+    "PLA": (False, [
+        "sp = (cpu.sp + 1) & 0xFF",
+        "cpu.sp = sp",
+        "s = 0x100 + sp",
+        "v = read(s)",
+        "cpu.a = v",
+        "cpu._nz = v",
+    ]),
+    "PLP": (False, [
+        "sp = (cpu.sp + 1) & 0xFF",
+        "cpu.sp = sp",
+        "s = 0x100 + sp",
+        "cpu.status = (read(s) | 0x20) & 0xEF",
+    ]),
+    "RTI": (False, [
+        "sp = cpu.sp",
+        "s = 0x100 + ((sp + 1) & 0xFF)",
+        "cpu.status = (read(s) | 0x20) & 0xEF",
+        "s = 0x100 + ((sp + 2) & 0xFF)",
+        "lo = read(s)",
+        "s = 0x100 + ((sp + 3) & 0xFF)",
+        "hi = read(s)",
+        "cpu.sp = (sp + 3) & 0xFF",
+        "cpu.pc = lo | (hi << 8)",
+    ]),
+    "RTS": (False, [
+        "sp = cpu.sp",
+        "s = 0x100 + ((sp + 1) & 0xFF)",
+        "lo = read(s)",
+        "s = 0x100 + ((sp + 2) & 0xFF)",
+        "hi = read(s)",
+        "cpu.sp = (sp + 2) & 0xFF",
+        "cpu.pc = ((lo | (hi << 8)) + 1) & 0xFFFF",
+    ]),
+    "STA": (False, ["write(addr, cpu.a)"]),
+    "STX": (False, ["write(addr, cpu.x)"]),
+    "STY": (False, ["write(addr, cpu.y)"]),
+    "TAX": (False, _transfer("a", "x")),
+    "TAY": (False, _transfer("a", "y")),
+    "TSX": (False, _transfer("sp", "x")),
+    "TXA": (False, _transfer("x", "a")),
+    "TXS": (False, ["cpu.sp = cpu.x"]),
+    "TYA": (False, _transfer("y", "a")),
+}
+
+
+_READ = re.compile(r"\bread\((\w+)\)")
+_WRITE = re.compile(r"^(\s*)write\((\w+), (.+)\)$")
+
+
+def _page(addr: str) -> str:
+    """Expression for the page number of an address name or constant."""
+    if addr.startswith("0x"):
+        return f"0x{int(addr, 16) >> 8:02X}"
+    return f"{addr} >> 8"
+
+
+def inline_memory(lines: list[str]) -> list[str]:
+    """Inline Memory's page-table fast path into generated code.
+
+    Each read(addr) or write(addr, value) whose address is a plain name
+    or constant accesses `ram` directly unless the address's page is
+    flagged for the slow path in `rslow`/`wslow`.
+    """
+    out = []
+    for line in lines:
+        match = _WRITE.match(line)
+        if match:
+            indent, addr, value = match.groups()
+            out.extend([
+                f"{indent}if wslow[{_page(addr)}]:",
+                f"{indent}    write({addr}, {value})",
+                f"{indent}else:",
+                f"{indent}    ram[{addr}] = {value}",
+            ])
+            continue
+        out.append(_READ.sub(
+            lambda m: f"(read({m[1]}) if rslow[{_page(m[1])}] else ram[{m[1]}])",
+            line))
+    return out
+
+
+def op_key(name: str, mode: str) -> str:
+    """Key into OPS for an instruction name and addressing mode."""
+    return f"{name}_A" if mode == "A" else name
+
+
+# Names generated code uses for memory access, and the CPU attributes
+# handlers load them from
+MEMORY_NAMES = {
+    "read": "_read",
+    "write": "_write",
+    "ram": "_ram",
+    "rslow": "_read_slow",
+    "wslow": "_write_slow",
+}
+_NAME = re.compile(r"\b(" + "|".join(MEMORY_NAMES) + r")\b")
+
+
+def memory_preamble(lines: list[str]) -> list[str]:
+    """Lines loading the memory names that lines use from `cpu`."""
+    used = {name for line in lines for name in _NAME.findall(line)}
+    return [f"{name} = cpu.{attr}" for name, attr in MEMORY_NAMES.items()
+            if name in used]
+
+
+def handler_source(opcode: int, name: str, mode: str,
+                   cycles: bool = False) -> list[str]:
+    """Generate the source lines of a flat handler for one opcode.
+
+    With cycles set, the handler also adds its cost to cpu.cycles,
+    including page-crossing and branch-taken penalties.
+    """
+    reads, body = OPS[op_key(name, mode)]
+    length = MODE_LENGTHS[mode]
+
+    lines = []
+    if cycles:
+        lines.append(f"cpu.cycles += {base_cycles(name, mode)}")
+        penalty = penalty_lines(name, mode)
+        if penalty:
+            mode_lines = INDEXED_MODES[mode] + penalty
+        else:
+            mode_lines = MODES[mode]
+        if mode == "rel":
+            # Taken branches cost one more cycle, two if they cross a page
+            body = [body[0],
+                    "    cpu.cycles += 2 if (addr ^ cpu.pc) & 0xFF00 else 1",
+                    *body[1:]]
+    else:
+        mode_lines = MODES[mode]
+    if length:
+        lines.append("pc = cpu.pc")
+        lines.extend(mode_lines)
+        lines.append(f"cpu.pc = (pc + {length}) & 0xFFFF")
+    if reads:
+        lines.append("v = read(addr)")
+    lines.extend(body)
+    lines = inline_memory(lines)
+    return [f"def op_{opcode:02X}(cpu):",
+            *(f"    {line}" for line in memory_preamble(lines) + lines)]
+
+
+def table_source(opcode_names: dict[int, tuple[str, str]],
+                 cycles: bool = False) -> str:
+    """Generate the source of all handlers and the `TABLE` listing them."""
+    lines = []
+    for opcode in sorted(opcode_names):
+        name, mode = opcode_names[opcode]
+        lines.extend(handler_source(opcode, name, mode, cycles))
+    table = ", ".join(
+        f"op_{opcode:02X}" if opcode in opcode_names else "None"
+        for opcode in range(256)
+    )
+    lines.append(f"TABLE = [{table}]")
+    return "\n".join(lines) + "\n"
+
+
+# Compiled tables, with and without cycle counting
+_tables: dict[bool, list[Optional[Callable]]] = {}
+
+
+def handler_table(opcode_names: dict[int, tuple[str, str]],
+                  cycles: bool = False) -> list[Optional[Callable[..., None]]]:
+    """The shared 256-entry flat handler table, compiled on first use.
+
+    Each handler is called with the CPU to run it on. With cycles set, the
+    handlers also count cycles in cpu.cycles.
+    """
+    table = _tables.get(cycles)
+    if table is None:
+        namespace = dict(GLOBALS)
+        source = table_source(opcode_names, cycles)
+        exec(compile(source, "<pim65.dispatch>", "exec"), namespace)
+        table = _tables[cycles] = namespace["TABLE"]
+    return table
@@ -2,19 +2,31 @@
 """Command-line interface for pim65 6502 simulator."""
 
 import argparse
+import asyncio
 import sys
+import time
 from pathlib import Path
 
+from . import batch
+from .apple2 import HardDrive
 from .config import SimulatorConfig
-from .cpu import BrkAbortError, InvalidOpcodeError
+from .cpu import CPU, BrkAbortError, IdleLoopError, InvalidOpcodeError
 from .simulator import Simulator
+from .trace import TraceBuffer
 
 
 def main(argv: list[str] | None = None) -> int:
     """Main entry point for the simulator CLI."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["batch"]:
+        return batch.main(argv[1:])
+
     parser = argparse.ArgumentParser(
         prog="pim65",
-        description="A results-accurate 6502 simulator with Apple II support"
+        description="A results-accurate 6502 simulator with Apple II support",
+        epilog="Use 'pim65 batch MANIFEST' to run many configurations in "
+               "parallel (see pim65 batch -h)."
     )
     parser.add_argument(
         "config",
@@ -25,12 +37,92 @@ def main(argv: list[str] | None = None) -> int:
         action="store_true",
         help="Print instruction trace"
     )
+    parser.add_argument(
+        "--trace-size",
+        type=int,
+        default=TraceBuffer.DEFAULT_CAPACITY,
+        metavar="N",
+        help=f"Number of most recent instructions kept in the trace "
+             f"(default: {TraceBuffer.DEFAULT_CAPACITY})"
+    )
+    parser.add_argument(
+        "--trace-file",
+        metavar="PATH",
+        help="Stream a binary instruction trace to PATH "
+             "(decode with python -m pim65.tracefile)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Count instructions per address and opcode; print the busiest "
+             "on exit"
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        metavar="N",
+        help="Number of addresses and opcodes in the --profile report "
+             "(default: 20)"
+    )
+    parser.add_argument(
+        "--call-graph",
+        metavar="PATH",
+        help="Track JSR/RTS call stacks; write them to PATH in collapsed "
+             "format for flame graphs and print the busiest subroutines"
+    )
+    parser.add_argument(
+        "--symbols",
+        action="append",
+        metavar="PATH",
+        help="ca65 listing, ld65 label file, or directory of listings (e.g. "
+             "build/) used to label profiles, traces and errors. Can specify "
+             "multiple."
+    )
     parser.add_argument(
         "-n", "--max-instructions",
         type=int,
-        default=1000,
         metavar="N",
-        help="Maximum instructions to execute (default: 1000)"
+        help="Maximum instructions to execute (default: 1000, or no limit "
+             "with --interactive)"
+    )
+    parser.add_argument(
+        "-i", "--interactive",
+        action="store_true",
+        help="Run live in the terminal: show the text screen as it changes "
+             "and type at the keyboard (Ctrl-C to quit)"
+    )
+    parser.add_argument(
+        "--stop-on-input-wait",
+        action="store_true",
+        help="Stop cleanly once the program waits for keyboard input after "
+             "all --keys are used, instead of running to the instruction limit"
+    )
+    parser.add_argument(
+        "--idle-loop",
+        action="store_true",
+        help="Stop with an error once a loop keeps repeating the same "
+             "registers and memory"
+    )
+    parser.add_argument(
+        "--idle-iterations",
+        type=int,
+        default=3,
+        metavar="K",
+        help="Repeats of the same state that count as an --idle-loop "
+             "(default: 3)"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=CPU.ENGINES,
+        default="flat",
+        help="CPU execution engine; block is fastest for long runs "
+             "(default: flat)"
+    )
+    parser.add_argument(
+        "--cycles",
+        action="store_true",
+        help="Count 6502 cycles (reported with -v; needs the flat engine)"
     )
     parser.add_argument(
         "-v", "--verbose",
@@ -58,8 +150,30 @@ def main(argv: list[str] | None = None) -> int:
         metavar="IMAGE",
         help="Path to .2mg disk image for hard drive emulation (slot 2)"
     )
+    parser.add_argument(
+        "--disk-flush",
+        choices=HardDrive.FLUSH_POLICIES,
+        default="close",
+        help="When to flush written blocks to the disk image (default: close)"
+    )
+    parser.add_argument(
+        "--disk-overlay",
+        action="store_true",
+        help="Keep disk writes in memory; the disk image is not modified"
+    )
 
     args = parser.parse_args(argv)
+    if args.cycles and args.engine != "flat":
+        parser.error("--cycles requires --engine flat")
+    if args.idle_iterations < 1:
+        parser.error("--idle-iterations must be at least 1")
+    if not args.idle_loop:
+        args.idle_iterations = 0
+    if args.interactive and not sys.stdin.isatty():
+        print("Error: --interactive needs a terminal", file=sys.stderr)
+        return 1
+    if args.max_instructions is None and not args.interactive:
+        args.max_instructions = 1000
 
     # Load configuration
     try:
@@ -72,7 +186,7 @@ def main(argv: list[str] | None = None) -> int:
         return 1
 
     # Create simulator
-    sim = Simulator(config)
+    sim = Simulator(config, engine=args.engine, cycles=args.cycles)
 
     # Set up Apple II hardware
     if args.keys:
@@ -80,7 +194,8 @@ def main(argv: list[str] | None = None) -> int:
 
     if args.disk:
         try:
-            sim.setup_hard_drive(args.disk)
+            sim.setup_hard_drive(args.disk, flush=args.disk_flush,
+                                 overlay=args.disk_overlay)
         except FileNotFoundError:
             print(f"Error: Disk image not found: {args.disk}", file=sys.stderr)
             return 1
@@ -88,6 +203,27 @@ def main(argv: list[str] | None = None) -> int:
             print(f"Error: Cannot open disk image: {e}", file=sys.stderr)
             return 1
 
+    for path in args.symbols or []:
+        try:
+            sim.load_symbols(path)
+        except OSError as e:
+            print(f"Error: Cannot read symbols: {e}", file=sys.stderr)
+            sim.cleanup()
+            return 1
+
+    if args.profile:
+        sim.enable_profile()
+    if args.call_graph:
+        sim.enable_call_graph()
+
+    if args.trace_file:
+        try:
+            sim.open_trace_file(args.trace_file)
+        except OSError as e:
+            print(f"Error: Cannot open trace file: {e}", file=sys.stderr)
+            sim.cleanup()
+            return 1
+
     # Load binaries
     try:
         sim.load()
@@ -97,44 +233,41 @@ def main(argv: list[str] | None = None) -> int:
         return 1
 
     # Run simulation
+    start_time = time.perf_counter()
     try:
-        success = sim.run(
-            max_instructions=args.max_instructions,
-            trace=args.trace,
-            brk_abort=args.brk_abort
-        )
-    except BrkAbortError as e:
-        print(f"BRK abort: {e}", file=sys.stderr)
-        if args.trace:
-            print("\nTrace (last 20 instructions):", file=sys.stderr)
-            for line in sim.get_trace()[-20:]:
-                print(f"  {line}", file=sys.stderr)
-        if args.screen:
-            screen = sim.dump_screen()
-            if screen:
-                print("\nScreen:", file=sys.stderr)
-                print(screen, file=sys.stderr)
+        if args.interactive:
+            success = run_interactive(sim, args)
+        else:
+            success = sim.run(
+                max_instructions=args.max_instructions,
+                trace=args.trace,
+                brk_abort=args.brk_abort,
+                trace_size=args.trace_size,
+                stop_on_input_wait=args.stop_on_input_wait,
+                idle_iterations=args.idle_iterations
+            )
+    except KeyboardInterrupt:
         sim.cleanup()
-        return 1
-    except InvalidOpcodeError as e:
-        print(f"Error: {e}", file=sys.stderr)
+        return 130
+    except (BrkAbortError, IdleLoopError, InvalidOpcodeError, RuntimeError) as e:
+        if isinstance(e, BrkAbortError):
+            print(f"BRK abort: {e}", file=sys.stderr)
+        elif isinstance(e, IdleLoopError):
+            print(f"Stopped: {e}", file=sys.stderr)
+        else:
+            print(f"Error: {e}", file=sys.stderr)
+        addr = getattr(e, "addr", None)
+        where = sim.symbolize(sim.cpu.pc if addr is None else addr)
+        if where:
+            print(f"  in {where}", file=sys.stderr)
         if args.trace:
             print("\nTrace (last 20 instructions):", file=sys.stderr)
-            for line in sim.get_trace()[-20:]:
-                print(f"  {line}", file=sys.stderr)
-        if args.screen:
-            screen = sim.dump_screen()
-            if screen:
-                print("\nScreen:", file=sys.stderr)
-                print(screen, file=sys.stderr)
-        sim.cleanup()
-        return 1
-    except RuntimeError as e:
-        print(f"Error: {e}", file=sys.stderr)
-        if args.trace:
-            print("\nTrace (last 20 instructions):", file=sys.stderr)
-            for line in sim.get_trace()[-20:]:
+            for line in sim.get_trace(20):
                 print(f"  {line}", file=sys.stderr)
+        if args.profile:
+            print(f"\n{sim.profile_report(args.profile_top)}", file=sys.stderr)
+        if args.call_graph:
+            print(f"\n{sim.call_graph_report()}", file=sys.stderr)
         if args.screen:
             screen = sim.dump_screen()
             if screen:
@@ -143,15 +276,38 @@ def main(argv: list[str] | None = None) -> int:
         sim.cleanup()
         return 1
 
+    elapsed = time.perf_counter() - start_time
+
     # Print trace if requested
     if args.trace:
         print("Trace:")
+        dropped = sim.cpu.trace_buffer.dropped
+        if dropped:
+            print(f"  ({dropped} earlier instructions not kept)")
         for line in sim.get_trace():
             print(f"  {line}")
         print()
 
+    if args.profile:
+        print(sim.profile_report(args.profile_top))
+        print()
+
+    if args.call_graph:
+        try:
+            sim.cpu.call_graph.write_collapsed(args.call_graph)
+        except OSError as e:
+            print(f"Error: Cannot write call graph: {e}", file=sys.stderr)
+            sim.cleanup()
+            return 1
+        print(sim.call_graph_report())
+        print()
+
     if args.verbose or args.trace:
         print(f"Instructions executed: {sim.instruction_count}")
+        if sim.cycles is not None:
+            emulated = sim.cycles / Simulator.CLOCK_HZ
+            print(f"Cycles executed: {sim.cycles} ({emulated:.3f}s at 1.023 MHz, "
+                  f"{sim.cycles / elapsed:,.0f} cycles/s)")
 
     # Dump screen if requested - always to stderr for consistency
     if args.screen:
@@ -166,10 +322,24 @@ def main(argv: list[str] | None = None) -> int:
         if args.verbose:
             print("Simulation completed successfully")
         return 0
+    elif sim.waiting_for_input:
+        print(f"Simulation stopped waiting for keyboard input at "
+              f"PC=${sim.cpu.pc:04X}", file=sys.stderr)
+        return 0
     else:
         print("Simulation halted without reaching success address", file=sys.stderr)
         return 1
 
 
+def run_interactive(sim: Simulator, args: argparse.Namespace) -> bool:
+    """Run the simulator live in the terminal (--interactive)."""
+    # Imported here since the terminal front end needs POSIX termios
+    from .terminal import Terminal
+
+    sim.configure_run(args.trace, args.brk_abort, args.trace_size,
+                      args.idle_iterations)
+    return asyncio.run(Terminal(sim).run(args.max_instructions))
+
+
 if __name__ == "__main__":
     sys.exit(main())
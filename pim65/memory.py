@@ -1,53 +1,238 @@
 """Memory management for the 6502 simulator."""
 
-from typing import Callable, Optional
+from typing import Callable, Iterable, Optional
+
+
+class DirtyPages:
+    """The pages written since they were last cleared, for one consumer.
+
+    Created by Memory.track_dirty(). Each consumer (screen renderer, delta
+    saver, ...) has its own set, so clearing one doesn't hide writes from
+    another.
+    """
+
+    def __init__(self, memory: "Memory"):
+        self._memory = memory
+        self.bitmap = bytearray(Memory.PAGES)  # Nonzero for dirty pages
+
+    def __contains__(self, page: int) -> bool:
+        return bool(self.bitmap[page])
+
+    def pages(self) -> list[int]:
+        """The dirty pages, in order."""
+        return [page for page, dirty in enumerate(self.bitmap) if dirty]
+
+    def clear(self, pages: Optional[Iterable[int]] = None) -> None:
+        """Mark pages (default: all) clean, so their next write is seen."""
+        pages = range(Memory.PAGES) if pages is None else pages
+        for page in pages:
+            if self.bitmap[page]:
+                self.bitmap[page] = 0
+                self._memory._update_write_page(page)
+
+    def mark_all(self) -> None:
+        """Mark every page dirty."""
+        self.bitmap[:] = b"\x01" * Memory.PAGES
+        for page in range(Memory.PAGES):
+            self._memory._update_write_page(page)
+
+    def close(self) -> None:
+        """Stop tracking; writes to clean pages go back to the fast path."""
+        self._memory._untrack(self)
 
 
 class Memory:
     """64KB memory space for 6502 simulation."""
 
     SIZE = 0x10000  # 64KB
+    PAGES = 0x100   # 256-byte pages
 
     def __init__(self):
         """Initialize memory to all $FF."""
-        self._mem = bytearray([0xFF] * self.SIZE)
+        self._mem = bytearray(b"\xFF" * self.SIZE)
         self._read_hooks: dict[int, Callable[[], int]] = {}
         self._write_hooks: dict[int, Callable[[int], None]] = {}
 
+        # Watched addresses report writes to watch_callback (e.g. so
+        # translated code can be invalidated when it is overwritten)
+        self._watched = bytearray(self.SIZE)
+        self._watch_counts = [0] * self.PAGES
+        self.watch_callback: Optional[Callable[[int], None]] = None
+
+        # Dirty page sets handed out by track_dirty()
+        self._trackers: list[DirtyPages] = []
+
+        # Page table: nonzero for pages whose reads/writes must take the
+        # slow path (hooks, watched bytes, clean pages of a DirtyPages);
+        # all others go straight to _mem
+        self._read_slow = bytearray(self.PAGES)
+        self._write_slow = bytearray(self.PAGES)
+
     def add_read_hook(self, addr: int, hook: Callable[[], int]) -> None:
         """Add a hook for reads from a specific address."""
+        addr = addr & 0xFFFF
         self._read_hooks[addr] = hook
+        self._read_slow[addr >> 8] = 1
 
     def add_write_hook(self, addr: int, hook: Callable[[int], None]) -> None:
         """Add a hook for writes to a specific address."""
+        addr = addr & 0xFFFF
         self._write_hooks[addr] = hook
+        self._write_slow[addr >> 8] = 1
+
+    def is_hooked(self, addr: int) -> bool:
+        """Check if reads or writes at addr are handled by a hook."""
+        addr = addr & 0xFFFF
+        return addr in self._read_hooks or addr in self._write_hooks
+
+    def set_watched(self, addr: int, watched: bool) -> None:
+        """Start or stop reporting writes at addr to watch_callback."""
+        addr = addr & 0xFFFF
+        flag = 1 if watched else 0
+        if self._watched[addr] == flag:
+            return
+        self._watched[addr] = flag
+        page = addr >> 8
+        self._watch_counts[page] += 1 if watched else -1
+        self._update_write_page(page)
+
+    def track_dirty(self) -> DirtyPages:
+        """Start tracking which pages are written; see DirtyPages.
+
+        Every page starts dirty. A clean page's writes take the slow path
+        until one marks it dirty, after which they are fast again, so
+        tracking costs one slow write per page cleared and nothing at all
+        when no DirtyPages is open.
+        """
+        tracker = DirtyPages(self)
+        self._trackers.append(tracker)
+        tracker.mark_all()
+        return tracker
+
+    def _untrack(self, tracker: DirtyPages) -> None:
+        if tracker in self._trackers:
+            self._trackers.remove(tracker)
+            for page in range(self.PAGES):
+                self._update_write_page(page)
+
+    def _update_write_page(self, page: int) -> None:
+        """Recompute whether writes to a page need the slow path."""
+        base = page << 8
+        hooked = any(base <= addr < base + 0x100 for addr in self._write_hooks)
+        clean = any(not tracker.bitmap[page] for tracker in self._trackers)
+        self._write_slow[page] = 1 if hooked or clean or self._watch_counts[page] else 0
+
+    def _mark_dirty(self, page: int) -> None:
+        """Mark page dirty for every tracker that had it clean."""
+        marked = False
+        for tracker in self._trackers:
+            if not tracker.bitmap[page]:
+                tracker.bitmap[page] = 1
+                marked = True
+        if marked:
+            self._update_write_page(page)
 
     def read(self, addr: int) -> int:
         """Read a byte from memory."""
         addr = addr & 0xFFFF
-        if addr in self._read_hooks:
-            return self._read_hooks[addr]()
+        if self._read_slow[addr >> 8]:
+            hook = self._read_hooks.get(addr)
+            if hook is not None:
+                return hook()
         return self._mem[addr]
 
     def write(self, addr: int, value: int) -> None:
         """Write a byte to memory."""
         addr = addr & 0xFFFF
-        if addr in self._write_hooks:
-            self._write_hooks[addr](value & 0xFF)
+        if self._write_slow[addr >> 8]:
+            self._write_slow_path(addr, value & 0xFF)
         else:
             self._mem[addr] = value & 0xFF
 
+    def _write_slow_path(self, addr: int, value: int) -> None:
+        """Write to a page with write hooks, watched bytes or dirty tracking."""
+        hook = self._write_hooks.get(addr)
+        if hook is not None:
+            hook(value)
+        else:
+            self._mem[addr] = value
+            if self._trackers:
+                self._mark_dirty(addr >> 8)
+            if self._watched[addr]:
+                self.watch_callback(addr)
+
     def read_word(self, addr: int) -> int:
         """Read a 16-bit word (little-endian) from memory."""
-        lo = self.read(addr)
-        hi = self.read((addr + 1) & 0xFFFF)
-        return lo | (hi << 8)
+        addr = addr & 0xFFFF
+        hi_addr = (addr + 1) & 0xFFFF
+        if self._read_slow[addr >> 8] or self._read_slow[hi_addr >> 8]:
+            return self.read(addr) | (self.read(hi_addr) << 8)
+        return self._mem[addr] | (self._mem[hi_addr] << 8)
 
     def read_word_zp(self, addr: int) -> int:
         """Read a 16-bit word from zero page, wrapping at $FF."""
-        lo = self.read(addr & 0xFF)
-        hi = self.read((addr + 1) & 0xFF)
-        return lo | (hi << 8)
+        lo_addr = addr & 0xFF
+        hi_addr = (addr + 1) & 0xFF
+        if self._read_slow[0]:
+            return self.read(lo_addr) | (self.read(hi_addr) << 8)
+        return self._mem[lo_addr] | (self._mem[hi_addr] << 8)
+
+    def read_stack(self, sp: int) -> int:
+        """Read a byte from the stack page ($0100-$01FF)."""
+        addr = 0x100 | (sp & 0xFF)
+        if self._read_slow[1]:
+            return self.read(addr)
+        return self._mem[addr]
+
+    def write_stack(self, sp: int, value: int) -> None:
+        """Write a byte to the stack page ($0100-$01FF)."""
+        addr = 0x100 | (sp & 0xFF)
+        if self._write_slow[1]:
+            self._write_slow_path(addr, value & 0xFF)
+        else:
+            self._mem[addr] = value & 0xFF
+
+    def read_bytes(self, addr: int, length: int) -> bytes:
+        """Read a run of bytes, wrapping at $FFFF.
+
+        Copies one slice unless the range touches a page with read hooks.
+        """
+        addr = addr & 0xFFFF
+        if addr + length > self.SIZE:
+            head = self.SIZE - addr
+            return self.read_bytes(addr, head) + self.read_bytes(0, length - head)
+        if length and any(self._read_slow[addr >> 8:((addr + length - 1) >> 8) + 1]):
+            return bytes(self.read(addr + i) for i in range(length))
+        return bytes(self._mem[addr:addr + length])
+
+    def write_bytes(self, addr: int, data: bytes) -> None:
+        """Write a run of bytes, wrapping at $FFFF.
+
+        Assigns one slice unless the range touches a page with write hooks
+        or watched bytes; bytes on those pages go through write().
+        """
+        addr = addr & 0xFFFF
+        length = len(data)
+        if addr + length > self.SIZE:
+            head = self.SIZE - addr
+            self.write_bytes(addr, data[:head])
+            self.write_bytes(0, data[head:])
+            return
+        end = addr + length
+        if not length or not any(self._write_slow[addr >> 8:((end - 1) >> 8) + 1]):
+            self._mem[addr:end] = data
+            return
+        # Page by page, so only the slow pages pay for per-byte writes
+        while addr < end:
+            chunk = min(end, (addr & 0xFF00) + 0x100) - addr
+            part = data[:chunk]
+            if self._write_slow[addr >> 8]:
+                for i, byte in enumerate(part):
+                    self._write_slow_path(addr + i, byte & 0xFF)
+            else:
+                self._mem[addr:addr + chunk] = part
+            addr += chunk
+            data = data[chunk:]
 
     def write_word(self, addr: int, value: int) -> None:
         """Write a 16-bit word (little-endian) to memory."""
@@ -55,9 +240,27 @@ class Memory:
         self.write((addr + 1) & 0xFFFF, (value >> 8) & 0xFF)
 
     def load_binary(self, data: bytes, start_addr: int) -> None:
-        """Load binary data into memory at specified address."""
-        for i, byte in enumerate(data):
-            self.write(start_addr + i, byte)
+        """Load binary data into memory at specified address.
+
+        Data past $FFFF wraps around to $0000.
+        """
+        self.write_bytes(start_addr, data)
+
+    def snapshot(self) -> bytes:
+        """Copy the full 64KB contents."""
+        return bytes(self._mem)
+
+    def restore(self, data: bytes) -> None:
+        """Replace the full 64KB contents from snapshot().
+
+        Hooks and watch callbacks are not invoked; every page is marked
+        dirty.
+        """
+        if len(data) != self.SIZE:
+            raise ValueError(f"Snapshot must be {self.SIZE} bytes")
+        self._mem[:] = data
+        for tracker in self._trackers:
+            tracker.mark_all()
 
     def set_reset_vector(self, addr: int) -> None:
         """Set the reset vector at $FFFC-$FFFD."""
@@ -65,4 +268,11 @@ class Memory:
 
     def dump(self, start: int, length: int) -> bytes:
         """Dump a region of memory."""
-        return bytes(self._mem[start:start + length])
+        return bytes(self.dump_view(start, length))
+
+    def dump_view(self, start: int, length: int) -> memoryview:
+        """Get a read-only view of a region of memory, without copying.
+
+        The view tracks later writes. Hooks are bypassed, as with dump().
+        """
+        return memoryview(self._mem)[start:start + length].toreadonly()
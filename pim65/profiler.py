@@ -0,0 +1,70 @@
+"""Instruction-level execution profile for pim65."""
+
+from array import array
+from typing import Optional
+
+from .symbols import Symbolizer
+
+
+class Profiler:
+    """Counts executed instructions per PC and per opcode.
+
+    The CPU updates the counters directly while profiling is enabled;
+    see CPU.profile.
+    """
+
+    def __init__(self):
+        self.pc_counts = array('Q', bytes(8 * 0x10000))
+        self.opcode_counts = array('Q', bytes(8 * 0x100))
+
+    @property
+    def total(self) -> int:
+        """Total instructions counted."""
+        return sum(self.opcode_counts)
+
+    def clear(self) -> None:
+        """Reset all counters."""
+        self.pc_counts = array('Q', bytes(8 * 0x10000))
+        self.opcode_counts = array('Q', bytes(8 * 0x100))
+
+    def hot_addresses(self, top: int = 20) -> list[tuple[int, int]]:
+        """The most executed addresses as (pc, count), busiest first."""
+        counts = self.pc_counts
+        hot = sorted((pc for pc in range(0x10000) if counts[pc]),
+                     key=lambda pc: (-counts[pc], pc))
+        return [(pc, counts[pc]) for pc in hot[:top]]
+
+    def hot_opcodes(self, top: int = 20) -> list[tuple[int, int]]:
+        """The most executed opcodes as (opcode, count), busiest first."""
+        counts = self.opcode_counts
+        hot = sorted((op for op in range(0x100) if counts[op]),
+                     key=lambda op: (-counts[op], op))
+        return [(op, counts[op]) for op in hot[:top]]
+
+    def report(self, cpu, top: int = 20,
+               symbolize: Optional[Symbolizer] = None) -> str:
+        """Format the top addresses and opcodes.
+
+        Instructions are disassembled from cpu's current memory. symbolize,
+        if given, maps an address to a label (or None) for the label column.
+        """
+        total = self.total
+        if not total:
+            return "Profile: no instructions counted"
+
+        lines = [f"Profile: {total} instructions", "",
+                 f"Top {top} addresses:",
+                 "       Count       %  Address  Label                     Instruction"]
+        for pc, count in self.hot_addresses(top):
+            label = (symbolize(pc) if symbolize else None) or ""
+            disasm, _ = cpu.disassemble(pc)
+            lines.append(f"  {count:10d}  {100 * count / total:5.1f}%  ${pc:04X}    "
+                         f"{label:24s}  {disasm}")
+
+        lines += ["", f"Top {top} opcodes:",
+                  "       Count       %  Opcode"]
+        for opcode, count in self.hot_opcodes(top):
+            name, mode = cpu.OPCODE_NAMES.get(opcode, ("???", ""))
+            lines.append(f"  {count:10d}  {100 * count / total:5.1f}%  "
+                         f"${opcode:02X} {name} {mode}".rstrip())
+        return "\n".join(lines)
@@ -1,26 +1,63 @@
 """Main simulator class for pim65."""
 
+import asyncio
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
-from .apple2 import HardDrive, Keyboard, TextScreen
+from .apple2 import HardDrive, HiresScreen, Keyboard, TextScreen
+from .callgraph import CallGraph
 from .config import SimulatorConfig
-from .cpu import CPU, InvalidOpcodeError
+from .cpu import CPU, IdleLoopError, InvalidOpcodeError
 from .memory import Memory
+from .profiler import Profiler
+from .symbols import RuneTracker, SymbolTable
+from .tracefile import TraceWriter
+
+
+@dataclass
+class Snapshot:
+    """Full machine state captured by Simulator.snapshot()."""
+    cpu: dict[str, int | bool]
+    memory: bytes
+    keyboard: Optional[tuple[bytes, int]]
+    disk: Optional[dict[int, bytes]]
 
 
 class Simulator:
     """6502 simulator coordinating memory and CPU."""
 
-    def __init__(self, config: SimulatorConfig):
+    # Apple II CPU clock, for converting cycles to emulated time
+    CLOCK_HZ = 1_023_000
+
+    # When stopping on input waits, the run is checked every
+    # INPUT_WAIT_SLICE instructions; a slice with at least one empty
+    # keyboard poll per INPUT_POLL_SPAN instructions is a wait for input
+    INPUT_WAIT_SLICE = 10_000
+    INPUT_POLL_SPAN = 16
+
+    def __init__(self, config: SimulatorConfig, engine: str = "flat",
+                 cycles: bool = False):
         self.config = config
         self.memory = Memory()
-        self.cpu = CPU(self.memory)
+        self.cpu = CPU(self.memory, engine=engine, cycles=cycles)
 
         # Apple II hardware (set up via setup_* methods)
         self._keyboard: Optional[Keyboard] = None
         self._hard_drive: Optional[HardDrive] = None
 
+        # Labels for reports, traces and errors (see load_symbols)
+        self.symbols = SymbolTable()
+        self.runes: Optional[RuneTracker] = None
+
+        # Set when run() stopped because the program waits for a key
+        self.waiting_for_input = False
+
+        # Events awaited by run_async() callers, by name; each is set and
+        # dropped when it happens, so every wait is for the next occurrence
+        self._events: dict[str, asyncio.Event] = {}
+        self._running = False
+
     def load(self) -> None:
         """Load all binaries into memory and set up reset vector."""
         # Load each binary file
@@ -46,9 +83,15 @@ class Simulator:
         self.memory.add_read_hook(Keyboard.KBD_STROBE, self._keyboard.clear_strobe)
         self.memory.add_write_hook(Keyboard.KBD_STROBE, lambda _: self._keyboard.clear_strobe())
 
-    def setup_hard_drive(self, image_path: str) -> None:
-        """Set up hard drive emulation with a .2mg disk image."""
-        self._hard_drive = HardDrive(image_path)
+    def setup_hard_drive(self, image_path: str, flush: str = "close",
+                         overlay: bool = False) -> None:
+        """Set up hard drive emulation with a .2mg disk image.
+
+        flush is the image flush policy; see HardDrive.FLUSH_POLICIES.
+        With overlay set, disk writes are kept in memory and the image
+        file is never modified.
+        """
+        self._hard_drive = HardDrive(image_path, flush=flush, overlay=overlay)
 
         # Load ROM bytes into slot 2 ROM space
         rom_bytes = self._hard_drive.get_rom_bytes()
@@ -75,7 +118,10 @@ class Simulator:
         self,
         max_instructions: int = 1000,
         trace: bool = False,
-        brk_abort: bool = False
+        brk_abort: bool = False,
+        trace_size: Optional[int] = None,
+        stop_on_input_wait: bool = False,
+        idle_iterations: int = 0
     ) -> bool:
         """Run the simulation.
 
@@ -83,17 +129,275 @@ class Simulator:
             max_instructions: Maximum instructions to execute
             trace: Whether to enable instruction tracing
             brk_abort: Whether to abort on BRK 00
+            trace_size: Number of most recent trace entries to keep
+            stop_on_input_wait: Stop, setting waiting_for_input, once the
+                program spins polling the keyboard with no input left
+            idle_iterations: Raise IdleLoopError once a loop repeats the
+                same machine state this many times (0 disables)
 
         Returns:
             True if simulation ended successfully (reached $FFF9)
         """
-        self.cpu.trace_enabled = trace
-        self.cpu.brk_abort = brk_abort
+        self.configure_run(trace, brk_abort, trace_size, idle_iterations)
+        self.waiting_for_input = False
+        if stop_on_input_wait:
+            return self._run_until_input_wait(max_instructions)
         return self.cpu.run(max_instructions)
 
-    def get_trace(self) -> list[str]:
-        """Get the instruction trace log."""
-        return self.cpu.trace_log
+    def configure_run(
+        self,
+        trace: bool = False,
+        brk_abort: bool = False,
+        trace_size: Optional[int] = None,
+        idle_iterations: int = 0
+    ) -> None:
+        """Apply run()'s tracing and stop settings without running.
+
+        run() calls this itself; run_async() uses whatever was set last.
+        """
+        self.cpu.trace_enabled = trace or self.cpu.trace_writer is not None
+        if trace_size is not None:
+            self.cpu.trace_capacity = trace_size
+        self.cpu.brk_abort = brk_abort
+        self.cpu.idle_iterations = idle_iterations
+
+    def _run_until_input_wait(self, max_instructions: int) -> bool:
+        """run() in slices, stopping early when the keyboard is polled dry."""
+        if self._keyboard is None:
+            self.setup_keyboard([])
+        cpu = self.cpu
+        while not cpu.halted and cpu.instruction_count < max_instructions:
+            start = cpu.instruction_count
+            self._keyboard.empty_polls = 0
+            idle = self._run_polling(min(max_instructions,
+                                         start + self.INPUT_WAIT_SLICE))
+            if idle or self._polled_dry(cpu.instruction_count - start):
+                self.waiting_for_input = True
+                return False
+        # Raises if the instruction limit was reached
+        return cpu.run(max_instructions)
+
+    def _run_polling(self, end: int) -> bool:
+        """cpu.run_until(end) while keys may still be queued.
+
+        A loop polling an empty keyboard repeats the same state, so idle
+        loop detection would stop it. Here that means the program is
+        waiting for input, and True is returned instead of raising.
+        """
+        keyboard = self._keyboard
+        try:
+            self.cpu.run_until(end)
+        except IdleLoopError:
+            if keyboard.has_input or not keyboard.empty_polls:
+                raise
+            return True
+        return False
+
+    def _polled_dry(self, executed: int) -> bool:
+        """Whether the last `executed` instructions were spent polling an
+        empty keyboard.
+
+        Keyboard.empty_polls must have been zeroed before they ran.
+        """
+        keyboard = self._keyboard
+        return (not self.cpu.halted and not keyboard.has_input and
+                keyboard.empty_polls > 0 and
+                keyboard.empty_polls * self.INPUT_POLL_SPAN >= executed)
+
+    async def run_async(
+        self,
+        slice: int = 10_000,
+        max_instructions: Optional[int] = None,
+        stop_on_input_wait: bool = False
+    ) -> bool:
+        """Run cooperatively, yielding to the event loop between slices.
+
+        Executes at most `slice` instructions at a time. When the program
+        waits for keyboard input, it sleeps until send_keys() queues some,
+        or with stop_on_input_wait returns like run(). Tracing and other
+        settings are those of the last configure_run() or run().
+        Meanwhile other tasks can await wait_screen_change(),
+        wait_key_consumed() and wait_stopped().
+
+        Args:
+            slice: Instructions executed between yields
+            max_instructions: Instruction limit, or None for no limit
+            stop_on_input_wait: Return instead of waiting for send_keys()
+
+        Returns:
+            True if simulation ended successfully (reached $FFF9)
+        """
+        if self._keyboard is None:
+            self.setup_keyboard([])
+        cpu = self.cpu
+        keyboard = self._keyboard
+        screen = self.memory.dump(TextScreen.SCREEN_BASE, TextScreen.SCREEN_SIZE)
+        consumed = keyboard.consumed
+        self.waiting_for_input = False
+        self._running = True
+        try:
+            while not cpu.halted:
+                start = cpu.instruction_count
+                end = start + slice
+                if max_instructions is not None:
+                    if start >= max_instructions:
+                        # Raises for the instruction limit
+                        return cpu.run(max_instructions)
+                    end = min(end, max_instructions)
+                keyboard.empty_polls = 0
+                idle = self._run_polling(end)
+
+                if keyboard.consumed != consumed:
+                    consumed = keyboard.consumed
+                    self._notify("key")
+                page = self.memory.dump(TextScreen.SCREEN_BASE, TextScreen.SCREEN_SIZE)
+                if page != screen:
+                    screen = page
+                    self._notify("screen")
+
+                if idle or self._polled_dry(cpu.instruction_count - start):
+                    self.waiting_for_input = True
+                    if stop_on_input_wait:
+                        return False
+                    await self._wait("input")
+                    self.waiting_for_input = False
+                else:
+                    await asyncio.sleep(0)
+            return cpu.success
+        finally:
+            self._running = False
+            self._notify("stop")
+
+    def send_keys(self, input_strings: list[str]) -> None:
+        """Queue keyboard input, waking a run_async() waiting for it."""
+        if self._keyboard is None:
+            self.setup_keyboard(input_strings)
+        else:
+            self._keyboard.feed(input_strings)
+        self._notify("input")
+
+    async def wait_screen_change(self) -> str:
+        """Wait until run_async() changes the text screen; returns the dump."""
+        await self._wait("screen")
+        return self.dump_screen()
+
+    async def wait_key_consumed(self) -> None:
+        """Wait until run_async() has let the program read another key."""
+        await self._wait("key")
+
+    async def wait_stopped(self) -> None:
+        """Wait until run_async() returns or raises, e.g. on halting.
+
+        Returns at once if run_async() isn't running.
+        """
+        if self._running:
+            await self._wait("stop")
+
+    def _notify(self, name: str) -> None:
+        event = self._events.pop(name, None)
+        if event is not None:
+            event.set()
+
+    async def _wait(self, name: str) -> None:
+        event = self._events.get(name)
+        if event is None:
+            event = self._events[name] = asyncio.Event()
+        await event.wait()
+
+    def snapshot(self) -> Snapshot:
+        """Capture CPU, memory, keyboard and disk state.
+
+        The hard drive switches to a copy-on-write overlay, so disk writes
+        made after the snapshot never reach the image and are undone by
+        restore().
+        """
+        return Snapshot(
+            cpu=self.cpu.get_state(),
+            memory=self.memory.snapshot(),
+            keyboard=self._keyboard.snapshot() if self._keyboard else None,
+            disk=self._hard_drive.snapshot() if self._hard_drive else None,
+        )
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Restore state from snapshot().
+
+        The snapshot may come from another Simulator, as long as this one
+        has the same hardware set up. Device state missing on either side
+        is left alone, so e.g. keyboard input set up before restoring a
+        snapshot taken without a keyboard is kept.
+        """
+        self.cpu.set_state(snapshot.cpu)
+        self.memory.restore(snapshot.memory)
+        if self._keyboard and snapshot.keyboard is not None:
+            self._keyboard.restore(snapshot.keyboard)
+        if self._hard_drive and snapshot.disk is not None:
+            self._hard_drive.restore(snapshot.disk)
+
+    def open_trace_file(self, path: str | Path) -> None:
+        """Stream a binary record of every executed instruction to path.
+
+        Decode the file with python -m pim65.tracefile. It is closed by
+        cleanup().
+        """
+        self.close_trace_file()
+        self.cpu.trace_writer = TraceWriter(path)
+
+    def close_trace_file(self) -> None:
+        """Finish writing the trace file, if any."""
+        if self.cpu.trace_writer is not None:
+            self.cpu.trace_writer.close()
+            self.cpu.trace_writer = None
+
+    def enable_profile(self) -> Profiler:
+        """Start counting executed instructions per PC and opcode."""
+        if self.cpu.profile is None:
+            self.cpu.profile = Profiler()
+        return self.cpu.profile
+
+    def profile_report(self, top: int = 20) -> str:
+        """Format the hottest addresses and opcodes counted so far."""
+        if self.cpu.profile is None:
+            return "Profile: not enabled"
+        return self.cpu.profile.report(self.cpu, top, self._symbolizer())
+
+    def enable_call_graph(self) -> CallGraph:
+        """Start tracking calls and instruction counts per call stack."""
+        if self.cpu.call_graph is None:
+            self.cpu.call_graph = CallGraph(self.cpu, self.symbolize)
+        return self.cpu.call_graph
+
+    def call_graph_report(self, top: int = 20) -> str:
+        """Format the subroutines with the most instructions counted so far."""
+        if self.cpu.call_graph is None:
+            return "Call graph: not enabled"
+        return self.cpu.call_graph.report(top)
+
+    def load_symbols(self, path: str | Path) -> int:
+        """Load labels from a ca65 listing, ld65 label file or directory.
+
+        A directory (e.g. build/) loads every listing under it. Once the
+        kernel's symbols are loaded, rune symbols follow the runes to
+        wherever the kernel relocates them (see RuneTracker). Returns the
+        number of modules loaded.
+        """
+        count = self.symbols.load(path)
+        if self.runes is None:
+            self.runes = RuneTracker.attach(self.symbols, self.cpu)
+        else:
+            self.runes.unplace_runes()
+        return count
+
+    def symbolize(self, addr: int) -> Optional[str]:
+        """Attribute an address as `module:label+offset`, if known."""
+        return self.symbols.symbolize(addr)
+
+    def _symbolizer(self):
+        """symbolize, or None when no symbols are loaded."""
+        return self.symbolize if self.symbols.modules else None
+
+    def get_trace(self, last: Optional[int] = None) -> list[str]:
+        """Get the instruction trace, optionally only the last entries."""
+        return self.cpu.trace_lines(last, self._symbolizer())
 
     def dump_memory(self, start: int, length: int) -> bytes:
         """Dump a region of memory."""
@@ -103,13 +407,32 @@ class Simulator:
         """Dump the 40-column text screen."""
         return TextScreen.dump(self.memory)
 
+    def dump_hires(self, page: int = HiresScreen.PAGE1) -> str:
+        """Dump a hi-res graphics page as rows of `X` and `-`."""
+        return HiresScreen.dump(self.memory, page)
+
+    def read_hires_text(self, font: dict[bytes, str],
+                        page: int = HiresScreen.PAGE1) -> str:
+        """Read text drawn on a hi-res page; see HiresScreen.load_font()."""
+        return HiresScreen.read_text(self.memory, font, page)
+
     @property
     def instruction_count(self) -> int:
         """Get the number of instructions executed."""
         return self.cpu.instruction_count
 
+    @property
+    def cycles(self) -> Optional[int]:
+        """Get the number of CPU cycles executed, or None if not counted.
+
+        Hard drive block calls are serviced by the simulator and cost no
+        cycles.
+        """
+        return self.cpu.cycles if self.cpu.count_cycles else None
+
     def cleanup(self) -> None:
         """Clean up resources."""
+        self.close_trace_file()
         if self._hard_drive:
             self._hard_drive.close()
             self._hard_drive = None
@@ -0,0 +1,245 @@
+"""Symbol tables from ca65 listings and ld65 label files.
+
+Addresses are attributed to the nearest preceding label of the module whose
+code covers them, as `module:label+offset` (e.g. `03-bcd:_bcd_mul+0x1A`).
+Labels inside a .proc or .scope are qualified with ca65's `::` syntax.
+"""
+
+import bisect
+import re
+from pathlib import Path
+from typing import Callable, Optional
+
+# Maps an address to a label, or None if it has none
+Symbolizer = Callable[[int], Optional[str]]
+
+# Columns of a ca65 listing line: PC, relocation flag, source text
+_LST_PC = slice(0, 6)
+_LST_RELOC = 6
+_LST_BYTES = slice(11, 23)
+_LST_SOURCE = 24
+
+_LABEL = re.compile(r"^\s*([A-Za-z_]\w*):")
+_SCOPE = re.compile(r"^\s*\.(?:proc|scope)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+_ENDSCOPE = re.compile(r"^\s*\.end(?:proc|scope)\b", re.IGNORECASE)
+
+# ld65 -Ln (VICE) label line: al 002000 .name
+_VICE_LABEL = re.compile(r"^al\s+([0-9A-Fa-f]+)\s+\.(\S+)")
+
+# How far past its last label a label-file module is assumed to extend
+LABEL_FILE_SPAN = 0x100
+
+
+class Module:
+    """Labels of one assembled module, by address."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0x10000  # First address of the module's code, as assembled
+        self.end = 0          # Address after the module's code, as assembled
+        self.delta = 0        # Added to assembled addresses once relocated
+        self.placed = True    # False while the module's load address is unknown
+        self._addrs: list[int] = []
+        self._labels: list[str] = []
+
+    def add(self, addr: int, label: str) -> None:
+        """Add a label; the first label added at an address is the one shown."""
+        i = bisect.bisect_right(self._addrs, addr)
+        self._addrs.insert(i, addr)
+        self._labels.insert(i, label)
+        self.cover(addr, addr + 1)
+
+    def cover(self, start: int, end: int) -> None:
+        """Extend the module's address range to include start..end."""
+        self.start = min(self.start, start)
+        self.end = max(self.end, end)
+
+    def relocate(self, delta: int) -> None:
+        """Place the module `delta` bytes from where it was assembled."""
+        self.delta = delta
+        self.placed = True
+
+    def __contains__(self, addr: int) -> bool:
+        return self.placed and self.start <= addr - self.delta < self.end
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def lookup(self, addr: int) -> Optional[tuple[str, int]]:
+        """The nearest label at or before addr, as (label, offset)."""
+        addr -= self.delta
+        i = bisect.bisect_right(self._addrs, addr)
+        if i == 0:
+            return None
+        found = self._addrs[i - 1]
+        return self._labels[bisect.bisect_left(self._addrs, found)], addr - found
+
+    def address_of(self, label: str) -> Optional[int]:
+        """The address of a label, if defined."""
+        try:
+            return self._addrs[self._labels.index(label)] + self.delta
+        except ValueError:
+            return None
+
+
+def parse_listing(path: str | Path, name: Optional[str] = None) -> Module:
+    """Read the labels of a ca65 listing (ca65 -l).
+
+    Only lines at absolute addresses (after .org) are used.
+    """
+    path = Path(path)
+    module = Module(name or path.stem)
+    scopes: list[str] = []
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            try:
+                pc = int(line[_LST_PC], 16)
+            except ValueError:
+                continue  # Header lines
+            if len(line) <= _LST_RELOC or line[_LST_RELOC] == "r":
+                continue
+            size = len(line[_LST_BYTES].split())
+            if size:
+                module.cover(pc, pc + size)
+
+            source = line[_LST_SOURCE:].split(";", 1)[0]
+            match = _SCOPE.match(source)
+            if match:
+                scopes.append(match[1])
+                module.add(pc, "::".join(scopes))
+                continue
+            if _ENDSCOPE.match(source):
+                if scopes:
+                    scopes.pop()
+                continue
+            match = _LABEL.match(source)
+            if match:
+                module.add(pc, "::".join(scopes + [match[1]]))
+    return module
+
+
+def parse_label_file(path: str | Path, name: Optional[str] = None) -> Module:
+    """Read an ld65 label file (ld65 -Ln, VICE format)."""
+    path = Path(path)
+    module = Module(name or path.stem)
+    with open(path, errors="replace") as f:
+        for line in f:
+            match = _VICE_LABEL.match(line)
+            if match:
+                module.add(int(match[1], 16), match[2])
+    if len(module):
+        module.cover(module.start, module.end - 1 + LABEL_FILE_SPAN)
+    return module
+
+
+class SymbolTable:
+    """Maps addresses to labels across several modules.
+
+    Modules may overlap, since Runix loads several programs at the same
+    address; the most recently added module covering an address wins.
+    """
+
+    def __init__(self):
+        self.modules: list[Module] = []
+
+    def add_module(self, module: Module) -> Module:
+        """Add a module, replacing any earlier one with the same name."""
+        self.modules = [m for m in self.modules if m.name != module.name]
+        self.modules.append(module)
+        return module
+
+    def load(self, path: str | Path) -> int:
+        """Load a .lst listing, a label file, or every .lst under a directory.
+
+        Returns the number of modules loaded.
+        """
+        path = Path(path)
+        if path.is_dir():
+            listings = sorted(path.rglob("*.lst"))
+            for listing in listings:
+                self.add_module(parse_listing(listing))
+            return len(listings)
+        if path.suffix == ".lst":
+            self.add_module(parse_listing(path))
+        else:
+            self.add_module(parse_label_file(path))
+        return 1
+
+    def module(self, name: str) -> Optional[Module]:
+        """The module with the given name, if loaded."""
+        for module in self.modules:
+            if module.name == name:
+                return module
+        return None
+
+    def lookup(self, addr: int) -> Optional[tuple[str, str, int]]:
+        """Attribute addr as (module, label, offset), if any module covers it."""
+        for module in reversed(self.modules):
+            if addr in module:
+                found = module.lookup(addr)
+                if found:
+                    return module.name, found[0], found[1]
+        return None
+
+    def symbolize(self, addr: int) -> Optional[str]:
+        """Attribute addr as `module:label+0xNN`, or None if unknown."""
+        found = self.lookup(addr)
+        if found is None:
+            return None
+        name, label, offset = found
+        if offset:
+            return f"{name}:{label}+0x{offset:X}"
+        return f"{name}:{label}"
+
+
+# Runes are assembled at $2000 and named for their number, e.g. 03-bcd
+RUNE_ORG = 0x2000
+_RUNE_MODULE = re.compile(r"^[0-9A-Fa-f]{2}-")
+
+
+class RuneTracker:
+    """Rebases rune symbols as the kernel loads runes.
+
+    The kernel's shockload reads a rune to a page picked by runealloc and
+    relocates it there. When it reaches its final `jgo` jump, the page is
+    still in the operand of `ldtpg` and the rune's two-digit name prefix in
+    `runefn`, so a PC watch there learns where each rune went.
+    """
+
+    EXIT = "shockload::jgo"       # Loader's final jump into the rune
+    PAGE = "shockload::ldtpg"     # LDX #page of the relocation target
+    NAME = "runefn"               # Length byte + two-digit rune prefix
+
+    def __init__(self, symbols: SymbolTable, cpu, kernel: Module):
+        self.symbols = symbols
+        self.memory = cpu.memory
+        self.loaded: dict[str, int] = {}  # Module name -> load address
+        self._page_addr = kernel.address_of(self.PAGE) + 1
+        self._name_addr = kernel.address_of(self.NAME) + 1
+        self.unplace_runes()
+        cpu.add_pc_watch(kernel.address_of(self.EXIT), self._loaded)
+
+    def unplace_runes(self) -> None:
+        """Ignore rune modules not seen loaded yet, e.g. newly added ones."""
+        for module in self.symbols.modules:
+            if _RUNE_MODULE.match(module.name) and module.name not in self.loaded:
+                module.placed = False
+
+    @classmethod
+    def attach(cls, symbols: SymbolTable, cpu) -> Optional["RuneTracker"]:
+        """Watch rune loads, if the kernel's symbols are loaded."""
+        kernel = symbols.module("kernel")
+        if kernel is None or any(kernel.address_of(label) is None
+                                 for label in (cls.EXIT, cls.PAGE, cls.NAME)):
+            return None
+        return cls(symbols, cpu, kernel)
+
+    def _loaded(self) -> None:
+        """Rebase the rune shockload has just relocated."""
+        base = self.memory.read(self._page_addr) << 8
+        prefix = "".join(chr(self.memory.read(self._name_addr + i)) for i in range(2))
+        for module in self.symbols.modules:
+            if module.name.lower().startswith(prefix.lower() + "-"):
+                module.relocate(base - RUNE_ORG)
+                self.loaded[module.name] = base
@@ -0,0 +1,140 @@
+"""Live terminal front end for pim65 (pim65 --interactive).
+
+The simulator runs through Simulator.run_async() while keystrokes from the
+controlling terminal are fed to the emulated keyboard. The 40x24 text
+screen is drawn with ANSI escapes at a capped frame rate, and each frame
+only redraws the rows whose screen memory changed since the last one,
+looking only at pages Memory reports written, so rendering costs almost
+nothing while the emulated program is busy.
+"""
+
+import asyncio
+import os
+import sys
+import termios
+import tty
+from typing import Optional, TextIO
+
+from .apple2 import TextScreen
+from .simulator import Simulator
+
+# Bytes typed at the terminal that differ on an Apple II keyboard
+KEY_MAP = {
+    0x0A: 0x0D,  # Return
+    0x7F: 0x08,  # Delete -> left arrow (backspace)
+}
+
+# Pages holding the text screen ($0400-$07FF)
+SCREEN_PAGES = range(TextScreen.SCREEN_BASE >> 8,
+                     (TextScreen.SCREEN_BASE + TextScreen.SCREEN_SIZE) >> 8)
+
+_CLEAR = "\x1b[2J"
+_HIDE_CURSOR = "\x1b[?25l"
+_SHOW_CURSOR = "\x1b[?25h"
+_INVERSE = "\x1b[7m"
+_NORMAL = "\x1b[0m"
+
+
+def cell(byte: int) -> tuple[str, bool]:
+    """The character shown for a screen byte, and whether it's inverse.
+
+    $00-$3F are inverse and $40-$7F flashing (shown as inverse); both use
+    the uppercase set. $80-$FF are normal characters.
+    """
+    if byte >= 0x80:
+        char = byte & 0x7F
+        if char < 0x20:
+            char |= 0x40
+        return (chr(char) if char != 0x7F else " "), False
+    char = byte & 0x3F
+    return chr(char | 0x40 if char < 0x20 else char), True
+
+
+def render_row(data: bytes) -> str:
+    """ANSI text for one screen row."""
+    parts = []
+    inverse = False
+    for byte in data:
+        char, inv = cell(byte)
+        if inv != inverse:
+            parts.append(_INVERSE if inv else _NORMAL)
+            inverse = inv
+        parts.append(char)
+    if inverse:
+        parts.append(_NORMAL)
+    return "".join(parts)
+
+
+def escape_keys(data: bytes) -> str:
+    """Translate typed bytes to a Keyboard input string."""
+    return "".join(f"\\x{KEY_MAP.get(byte, byte) & 0x7F:02x}" for byte in data)
+
+
+class Terminal:
+    """Runs a simulator against the controlling terminal."""
+
+    FPS = 30
+
+    def __init__(self, sim: Simulator, fps: int = FPS,
+                 out: Optional[TextIO] = None):
+        self.sim = sim
+        self.interval = 1 / fps
+        self.out = out or sys.stdout
+        self._rows: list[Optional[bytes]] = [None] * TextScreen.ROWS
+        self._dirty = sim.memory.track_dirty()
+
+    def render(self) -> str:
+        """ANSI output redrawing the rows changed since the last render."""
+        memory = self.sim.memory
+        dirty = self._dirty
+        parts = []
+        for row in range(TextScreen.ROWS):
+            addr = TextScreen.line_address(row)
+            if (addr >> 8) not in dirty:
+                continue
+            data = memory.dump(addr, TextScreen.COLS)
+            if data != self._rows[row]:
+                self._rows[row] = data
+                parts.append(f"\x1b[{row + 1};1H{render_row(data)}")
+        dirty.clear(SCREEN_PAGES)
+        return "".join(parts)
+
+    def draw(self) -> None:
+        """Write any changed rows to the terminal."""
+        output = self.render()
+        if output:
+            self.out.write(output)
+            self.out.flush()
+
+    async def run(self, max_instructions: Optional[int] = None) -> bool:
+        """Run interactively until the program halts; returns its success.
+
+        Keys are read from stdin, which must be a terminal. Interrupt with
+        Ctrl-C.
+        """
+        fd = sys.stdin.fileno()
+        saved = termios.tcgetattr(fd)
+        loop = asyncio.get_running_loop()
+        self._rows = [None] * TextScreen.ROWS
+        self._dirty.mark_all()
+        self.out.write(_CLEAR + _HIDE_CURSOR)
+        try:
+            tty.setcbreak(fd)
+            loop.add_reader(fd, self._read_keys, fd)
+            run = asyncio.ensure_future(self.sim.run_async(
+                max_instructions=max_instructions))
+            while not run.done():
+                self.draw()
+                await asyncio.wait([run], timeout=self.interval)
+            self.draw()
+            return run.result()
+        finally:
+            loop.remove_reader(fd)
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+            self.out.write(f"\x1b[{TextScreen.ROWS + 1};1H{_SHOW_CURSOR}\n")
+            self.out.flush()
+
+    def _read_keys(self, fd: int) -> None:
+        data = os.read(fd, 1024)
+        if data:
+            self.sim.send_keys([escape_keys(data)])
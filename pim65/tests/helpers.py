@@ -0,0 +1,66 @@
+"""Builders for the small test programs shared by the test modules."""
+
+from typing import Optional, Sequence, Union
+
+from pim65.config import SimulatorConfig
+from pim65.cpu import CPU
+from pim65.memory import Memory
+from pim65.simulator import Simulator
+
+# Code at the start address, or code by load address
+Code = Union[bytes, dict[int, Sequence[int]]]
+
+
+def load_code(memory: Memory, code: Code, start: int) -> None:
+    """Load code and point the reset vector at start."""
+    if isinstance(code, bytes):
+        code = {start: code}
+    for addr, data in code.items():
+        memory.load_binary(bytes(data), addr)
+    memory.set_reset_vector(start)
+
+
+def load_cpu(code: Code, engine: str = "flat", start: int = 0x1000,
+             trace: bool = False, trace_capacity: Optional[int] = None) -> CPU:
+    """Load code into fresh memory and reset a CPU to run it from start."""
+    mem = Memory()
+    load_code(mem, code, start)
+    cpu = CPU(mem, engine=engine)
+    cpu.reset()
+    if trace:
+        cpu.trace_enabled = True
+        if trace_capacity is not None:
+            cpu.trace_capacity = trace_capacity
+    return cpu
+
+
+def load_sim(code: Code, engine: str = "flat", start: int = 0x1000,
+             profile: bool = False, call_graph: bool = False) -> Simulator:
+    """Load code into a fresh Simulator reset to run it from start."""
+    sim = Simulator(SimulatorConfig(binaries=[], start_addr=start), engine=engine)
+    load_code(sim.memory, code, start)
+    sim.cpu.reset()
+    if profile:
+        sim.enable_profile()
+    if call_graph:
+        sim.enable_call_graph()
+    return sim
+
+
+def run_program(code: Code, engine: str, max_inst: int = 100000,
+                start: int = 0x1000) -> CPU:
+    """Load and run a program, returning the CPU."""
+    cpu = load_cpu(code, engine, start)
+    cpu.run(max_inst)
+    return cpu
+
+
+def assert_same_as_flat(code: Code, engine: str, **kwargs) -> CPU:
+    """Run a program on engine and the flat engine and compare results."""
+    cpu = run_program(code, engine, **kwargs)
+    flat = run_program(code, "flat", **kwargs)
+    assert (cpu.a, cpu.x, cpu.y, cpu.sp, cpu.pc, cpu.status) == \
+        (flat.a, flat.x, flat.y, flat.sp, flat.pc, flat.status)
+    assert cpu.instruction_count == flat.instruction_count
+    assert cpu.memory.dump(0, 0x10000) == flat.memory.dump(0, 0x10000)
+    return cpu
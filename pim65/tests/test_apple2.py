@@ -4,7 +4,7 @@ import tempfile
 from pathlib import Path
 
 import pytest
-from pim65.apple2 import HardDrive, Keyboard, TextScreen
+from pim65.apple2 import HardDrive, HiresScreen, Keyboard, TextScreen
 from pim65.config import SimulatorConfig
 from pim65.cpu import BrkAbortError
 from pim65.memory import Memory
@@ -117,6 +117,91 @@ class TestTextScreen:
         assert screen == "X"
 
 
+# Two glyphs in base_font.txt format; 'H' has an eighth column, as some
+# glyphs in that file do, which a 7-pixel cell can't show
+FONT = """\
+A 7x8 font.
+
+0x20 ' '
+-------
+-------
+-------
+-------
+-------
+-------
+-------
+-------
+
+0x48 'H'
+-------
+-X---X--
+-X---X-
+-XXXXX-
+-X---X-
+-X---X-
+-X---X-
+-------
+
+0x49 'I'
+-------
+-XXXXX-
+---X---
+---X---
+---X---
+---X---
+-XXXXX-
+-------
+"""
+
+
+class TestHiresScreen:
+    """Tests for hi-res graphics decoding."""
+
+    def blank(self) -> Memory:
+        mem = Memory()
+        mem.write_bytes(HiresScreen.PAGE1, bytes(0x2000))
+        return mem
+
+    def test_row_address(self):
+        assert HiresScreen.row_address(0) == 0x2000
+        assert HiresScreen.row_address(1) == 0x2400
+        assert HiresScreen.row_address(8) == 0x2080
+        assert HiresScreen.row_address(64) == 0x2028
+        assert HiresScreen.row_address(191) == 0x3FD0
+        assert HiresScreen.row_address(0, HiresScreen.PAGE2) == 0x4000
+
+    def test_bitmap(self):
+        mem = self.blank()
+        mem.write(HiresScreen.row_address(2) + 1, 0x81)  # Bit 7 isn't a pixel
+        mem.write(HiresScreen.row_address(2) + 39, 0x40)
+        bitmap = HiresScreen.bitmap(mem)
+        assert len(bitmap) == HiresScreen.HEIGHT
+        assert all(len(row) == HiresScreen.WIDTH for row in bitmap)
+        assert [x for x, pixel in enumerate(bitmap[2]) if pixel] == [7, 279]
+        assert not any(bitmap[0])
+        assert HiresScreen.dump(mem).splitlines()[2][:9] == "-------X-"
+
+    def test_load_font(self, tmp_path):
+        path = tmp_path / "font.txt"
+        path.write_text(FONT)
+        font = HiresScreen.load_font(path)
+        assert font[bytes(8)] == " "
+        assert font[bytes([0, 0x22, 0x22, 0x3E, 0x22, 0x22, 0x22, 0])] == "H"
+        assert len(font) == 3
+
+    def test_read_text(self, tmp_path):
+        path = tmp_path / "font.txt"
+        path.write_text(FONT)
+        font = HiresScreen.load_font(path)
+        glyphs = {char: glyph for glyph, char in font.items()}
+        mem = self.blank()
+        for col, char in enumerate("HI H"):
+            for line, byte in enumerate(glyphs[char]):
+                mem.write(HiresScreen.row_address(16 + line) + 3 + col, byte | 0x80)
+        mem.write(HiresScreen.row_address(40) + 10, 0x7F)
+        assert HiresScreen.read_text(mem, font) == "   HI H\n\n\n          ?"
+
+
 class TestKeyboard:
     """Tests for keyboard input simulation."""
 
@@ -174,6 +259,16 @@ class TestKeyboard:
         kbd.clear_strobe()
         assert not kbd.has_input
 
+    def test_feed(self):
+        """Test queueing more input after the buffer runs out."""
+        kbd = Keyboard(["A"])
+        kbd.clear_strobe()
+        assert kbd.read_kbd() == 0x00
+        kbd.feed(["B\\n"])
+        assert kbd.consumed == 1
+        assert kbd.clear_strobe() == ord('B') | 0x80
+        assert kbd.read_kbd() == 0x0D | 0x80
+
 
 class TestKeyboardIntegration:
     """Integration tests for keyboard with simulator."""
@@ -324,6 +419,68 @@ class TestHardDrive:
             finally:
                 hd.close()
 
+    def test_flush_policy(self):
+        """Writes flush per the configured policy and always on close."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            disk_path = self.create_test_disk(Path(tmpdir))
+
+            for policy, flushes_on_write in (("write", 1), ("close", 0)):
+                hd = HardDrive(disk_path, flush=policy)
+                flushes = []
+                hd.flush = lambda: flushes.append(True) or HardDrive.flush(hd)
+                hd.write_block(3, bytes([0xAB] * 512))
+                assert len(flushes) == flushes_on_write
+                hd.close()
+                assert len(flushes) == flushes_on_write + 1
+
+            with open(disk_path, 'rb') as f:
+                f.seek(64 + 3 * 512)
+                assert f.read(512) == bytes([0xAB] * 512)
+
+    def test_overlay(self):
+        """Overlay writes are readable but never reach the image."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            disk_path = self.create_test_disk(Path(tmpdir))
+
+            hd = HardDrive(disk_path)
+            try:
+                hd.enable_overlay()
+                hd.write_block(3, bytes([0xAB] * 512))
+                assert hd.read_block(3) == bytes([0xAB] * 512)
+                saved = hd.snapshot()
+
+                hd.write_block(3, bytes([0xCD] * 512))
+                hd.restore(saved)
+                assert hd.read_block(3) == bytes([0xAB] * 512)
+                hd.restore({})
+                assert hd.read_block(3) == bytes([0x03] * 512)
+            finally:
+                hd.close()
+
+            with open(disk_path, 'rb') as f:
+                f.seek(64 + 3 * 512)
+                assert f.read(512) == bytes([0x03] * 512)
+
+    def test_overlay_mode_leaves_image(self):
+        """An overlay-mode drive opens the image read-only."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            disk_path = self.create_test_disk(Path(tmpdir))
+            before = disk_path.read_bytes()
+
+            hd = HardDrive(disk_path, flush="write", overlay=True)
+            try:
+                hd.write_block(3, bytes([0xAB] * 512))
+                assert hd.read_block(3) == bytes([0xAB] * 512)
+            finally:
+                hd.close()
+            assert disk_path.read_bytes() == before
+
+    def test_invalid_flush_policy(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            disk_path = self.create_test_disk(Path(tmpdir))
+            with pytest.raises(ValueError):
+                HardDrive(disk_path, flush="never")
+
     def test_rom_signature(self):
         """Test that ROM has correct ProDOS signature."""
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -0,0 +1,96 @@
+"""Tests for the cooperative asyncio API."""
+
+import asyncio
+
+import pytest
+from pim65.simulator import Simulator
+
+from .helpers import load_sim
+
+# Echo three keys to the top-left of the screen, then exit:
+# poll: LDA $C000; BPL poll; STA $C010; STA $0400,X; INX; CPX #3;
+#       BNE poll; JMP $FFF9
+CODE = bytes([
+    0xAD, 0x00, 0xC0, 0x10, 0xFB, 0x8D, 0x10, 0xC0,
+    0x9D, 0x00, 0x04, 0xE8, 0xE0, 0x03, 0xD0, 0xF0,
+    0x4C, 0xF9, 0xFF,
+])
+
+TIMEOUT = 5
+
+
+def echo_sim() -> Simulator:
+    # Blank the screen with spaces
+    return load_sim({0x1000: CODE, 0x0400: bytes([0xA0] * 0x400)})
+
+
+class TestRunAsync:
+    """Tests for run_async() and its events."""
+
+    def test_interactive_session(self):
+        async def session():
+            sim = echo_sim()
+            run = asyncio.create_task(sim.run_async(slice=100))
+            while not sim.waiting_for_input:
+                await asyncio.sleep(0)
+
+            changed = asyncio.create_task(sim.wait_screen_change())
+            consumed = asyncio.create_task(sim.wait_key_consumed())
+            await asyncio.sleep(0)
+            sim.send_keys(["A"])
+            assert await asyncio.wait_for(changed, TIMEOUT) == "A"
+            await asyncio.wait_for(consumed, TIMEOUT)
+            assert not run.done()
+
+            sim.send_keys(["BC"])
+            await asyncio.wait_for(sim.wait_stopped(), TIMEOUT)
+            assert await run
+            assert sim.dump_screen() == "ABC"
+
+        asyncio.run(session())
+
+    def test_many_machines(self):
+        async def drive(sim: Simulator, keys: str) -> bool:
+            sim.send_keys([keys])
+            return await sim.run_async(slice=10)
+
+        async def main():
+            sims = [echo_sim() for _ in range(3)]
+            results = await asyncio.wait_for(asyncio.gather(
+                *(drive(sim, f"{i}{i}{i}") for i, sim in enumerate(sims))), TIMEOUT)
+            assert results == [True, True, True]
+            assert [sim.dump_screen() for sim in sims] == ["000", "111", "222"]
+
+        asyncio.run(main())
+
+    def test_stop_on_input_wait(self):
+        sim = echo_sim()
+        sim.send_keys(["A"])
+        assert not asyncio.run(sim.run_async(stop_on_input_wait=True))
+        assert sim.waiting_for_input
+        assert sim.dump_screen() == "A"
+
+    def test_instruction_limit(self):
+        sim = echo_sim()
+        sim.memory.load_binary(bytes([0x4C, 0x00, 0x10]), 0x1000)  # JMP $1000
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            asyncio.run(sim.run_async(slice=7, max_instructions=50))
+        assert sim.instruction_count == 50
+
+    def test_idle_detection_waits_for_keys(self):
+        """Polling an empty keyboard repeats one state, but isn't idle here."""
+        async def session():
+            sim = echo_sim()
+            sim.configure_run(idle_iterations=3)
+            run = asyncio.create_task(sim.run_async())
+            while not (sim.waiting_for_input or run.done()):
+                await asyncio.sleep(0)
+            assert not run.done()
+            sim.send_keys(["XYZ"])
+            assert await asyncio.wait_for(run, TIMEOUT)
+            assert sim.dump_screen() == "XYZ"
+
+        asyncio.run(session())
+
+    def test_wait_stopped_when_idle(self):
+        asyncio.run(asyncio.wait_for(echo_sim().wait_stopped(), TIMEOUT))
@@ -0,0 +1,111 @@
+"""Tests for the batch runner."""
+
+import json
+from pathlib import Path
+
+import pytest
+from pim65 import batch
+from pim65.main import main
+
+EXAMPLE = Path(__file__).parent.parent / "examples" / "test.json"
+
+
+def write_manifest(tmp_path: Path, data) -> Path:
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(data))
+    return path
+
+
+def loop_config(tmp_path: Path) -> Path:
+    """Config for a program that never reaches $FFF9."""
+    (tmp_path / "loop.bin").write_bytes(bytes([0x4C, 0x00, 0x10]))  # JMP $1000
+    path = tmp_path / "loop.json"
+    path.write_text(json.dumps({"binaries": [{"file": "loop.bin", "load_addr": "$1000"}],
+                                "start_addr": "$1000"}))
+    return path
+
+
+class TestManifest:
+    """Tests for manifest parsing."""
+
+    def test_defaults_and_paths(self, tmp_path):
+        path = write_manifest(tmp_path, {
+            "defaults": {"config": "a.json", "max_instructions": 500},
+            "jobs": [{"name": "one", "keys": "ls\\n"}, {"config": "/abs/b.json"}],
+        })
+        one, two = batch.load_manifest(path)
+        assert one["name"] == "one"
+        assert one["config"] == str(tmp_path / "a.json")
+        assert one["keys"] == ["ls\\n"]
+        assert one["max_instructions"] == 500
+        assert one["disk"] is None
+        assert two["name"] == "1"
+        assert two["config"] == "/abs/b.json"
+
+    def test_bare_list(self, tmp_path):
+        path = write_manifest(tmp_path, [{"config": "a.json"}])
+        assert len(batch.load_manifest(path)) == 1
+
+    @pytest.mark.parametrize("data", [
+        {"jobs": {}},
+        [{"name": "x"}],
+        [{"config": "a.json", "max_instruction": 5}],
+    ])
+    def test_invalid(self, tmp_path, data):
+        with pytest.raises(ValueError):
+            batch.load_manifest(write_manifest(tmp_path, data))
+
+
+class TestRunJob:
+    """Tests for running single jobs."""
+
+    def job(self, **settings):
+        return {"name": "job", **batch.JOB_DEFAULTS, **settings}
+
+    def test_success(self):
+        result = batch.run_job(self.job(config=str(EXAMPLE), cycles=True))
+        assert result["success"]
+        assert result["error"] is None
+        assert result["instructions"] == 3
+        assert result["cycles"] > 0
+        assert "screen" in result
+
+    def test_limit(self, tmp_path):
+        result = batch.run_job(self.job(config=str(loop_config(tmp_path)),
+                                        max_instructions=50, screen=False))
+        assert not result["success"]
+        assert "Instruction limit" in result["error"]
+        assert result["instructions"] == 50
+        assert "screen" not in result
+
+    def test_missing_config(self, tmp_path):
+        result = batch.run_job(self.job(config=str(tmp_path / "none.json")))
+        assert not result["success"]
+        assert result["error"]
+
+
+class TestBatch:
+    """Tests for parallel runs and the CLI."""
+
+    def test_run_batch(self, tmp_path):
+        loop = str(loop_config(tmp_path))
+        jobs = [{"name": str(i), **batch.JOB_DEFAULTS,
+                 "config": str(EXAMPLE) if i % 2 else loop}
+                for i in range(4)]
+        results = {r["name"]: r for r in batch.run_batch(jobs, workers=2)}
+        assert sorted(results) == ["0", "1", "2", "3"]
+        assert [results[str(i)]["success"] for i in range(4)] == [False, True, False, True]
+
+    def test_cli(self, tmp_path):
+        path = write_manifest(tmp_path, [{"name": "ok", "config": str(EXAMPLE)}])
+        output = tmp_path / "results.jsonl"
+        assert main(["batch", str(path), "-j", "1", "-o", str(output)]) == 0
+        (result,) = [json.loads(line) for line in output.read_text().splitlines()]
+        assert result["name"] == "ok" and result["success"]
+
+    def test_cli_failure(self, tmp_path, capsys):
+        path = write_manifest(tmp_path, [{"config": str(loop_config(tmp_path))}])
+        assert main(["batch", str(path), "-j", "1"]) == 1
+        out, err = capsys.readouterr()
+        assert json.loads(out)["success"] is False
+        assert "1 of 1 jobs failed" in err
@@ -0,0 +1,33 @@
+"""Tests for the decimal-mode ADC/SBC tables."""
+
+from pim65 import bcd
+from pim65.cpu import CPU
+
+
+def lookup(table, a: int, value: int, carry: int) -> tuple[int, int]:
+    """The result and the C and V flags of a table entry."""
+    entry = table[(carry << bcd.CARRY_SHIFT) | (a << 8) | value]
+    return entry & 0xFF, (entry >> 8) & (CPU.FLAG_C | CPU.FLAG_V)
+
+
+class TestTables:
+    """Tests for table layout and contents."""
+
+    def test_size(self):
+        assert len(bcd.adc_table()) == len(bcd.sbc_table()) == 2 * 256 * 256
+
+    def test_built_once(self):
+        assert bcd.adc_table() is bcd.adc_table()
+
+    def test_adc(self):
+        adc = bcd.adc_table()
+        assert lookup(adc, 0x58, 0x46, 1) == (0x05, CPU.FLAG_C | CPU.FLAG_V)
+        assert lookup(adc, 0x79, 0x00, 1) == (0x80, 0)
+        assert lookup(adc, 0x99, 0x00, 1) == (0x00, CPU.FLAG_C)
+
+    def test_sbc(self):
+        sbc = bcd.sbc_table()
+        assert lookup(sbc, 0x46, 0x12, 1) == (0x34, CPU.FLAG_C)
+        assert lookup(sbc, 0x40, 0x13, 1) == (0x27, CPU.FLAG_C)
+        assert lookup(sbc, 0x00, 0x01, 1) == (0x99, 0)
+        assert lookup(sbc, 0x80, 0x01, 1) == (0x79, CPU.FLAG_C | CPU.FLAG_V)
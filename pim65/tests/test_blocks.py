@@ -0,0 +1,124 @@
+"""Tests for the basic-block translation engine."""
+
+import pytest
+from pim65.cpu import BrkAbortError
+
+from .helpers import assert_same_as_flat, load_cpu, run_program
+
+
+class TestBlockEngine:
+    """Block translation must match single-step execution."""
+
+    def test_nested_loop(self):
+        code = bytes([
+            0xA0, 0x04,        # 1000: LDY #$04
+            0xA2, 0x00,        # 1002: LDX #$00
+            0xBD, 0x00, 0x20,  # 1004: LDA $2000,X
+            0x18,              # 1007: CLC
+            0x69, 0x03,        # 1008: ADC #$03
+            0x9D, 0x00, 0x20,  # 100A: STA $2000,X
+            0xE8,              # 100D: INX
+            0xD0, 0xF4,        # 100E: BNE $1004
+            0x88,              # 1010: DEY
+            0xD0, 0xEF,        # 1011: BNE $1002
+            0x4C, 0xF9, 0xFF,  # 1013: JMP $FFF9
+        ])
+        cpu = assert_same_as_flat(code, "block")
+        assert cpu.success
+        assert cpu.memory.read(0x2000) == 0x0B
+
+    def test_patch_own_immediate(self):
+        """A store into the running block's own operand takes effect."""
+        code = bytes([
+            0xA9, 0x42,        # 1000: LDA #$42
+            0x8D, 0x06, 0x10,  # 1002: STA $1006  (operand of LDX below)
+            0xA2, 0x00,        # 1005: LDX #$00   (patched to #$42)
+            0x86, 0x10,        # 1007: STX $10
+            0x4C, 0xF9, 0xFF,  # 1009: JMP $FFF9
+        ])
+        cpu = assert_same_as_flat(code, "block")
+        assert cpu.memory.read(0x10) == 0x42
+
+    def test_patch_own_operand_indexed(self):
+        """An indexed store into the running block ends it early."""
+        code = bytes([
+            0xA2, 0x08,        # 1000: LDX #$08
+            0xA9, 0x77,        # 1002: LDA #$77
+            0x9D, 0x00, 0x10,  # 1004: STA $1000,X (operand of LDY below)
+            0xA0, 0x00,        # 1007: LDY #$00    (patched to #$77)
+            0x84, 0x10,        # 1009: STY $10
+            0x4C, 0xF9, 0xFF,  # 100B: JMP $FFF9
+        ])
+        cpu = assert_same_as_flat(code, "block")
+        assert cpu.memory.read(0x10) == 0x77
+
+    def test_patch_cached_block(self):
+        """Writes to a previously translated block invalidate it."""
+        code = bytes([
+            0x20, 0x10, 0x10,  # 1000: JSR $1010
+            0xA9, 0x05,        # 1003: LDA #$05
+            0x8D, 0x11, 0x10,  # 1005: STA $1011 (patch subroutine)
+            0x20, 0x10, 0x10,  # 1008: JSR $1010
+            0x4C, 0xF9, 0xFF,  # 100B: JMP $FFF9
+            0x00, 0x00,        # 100E: padding
+            0xA9, 0x01,        # 1010: LDA #$01
+            0x85, 0x10,        # 1012: STA $10
+            0x60,              # 1014: RTS
+        ])
+        cpu = assert_same_as_flat(code, "block")
+        assert cpu.memory.read(0x10) == 0x05
+
+    def test_instruction_limit_is_exact(self):
+        code = bytes([
+            0xE8,              # 1000: INX
+            0xC8,              # 1001: INY
+            0xEA,              # 1002: NOP
+            0x4C, 0x00, 0x10,  # 1003: JMP $1000
+        ])
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            run_program(code, "block", max_inst=10)
+        cpu = load_cpu(code, "block")
+        with pytest.raises(RuntimeError):
+            cpu.run(10)
+        assert cpu.instruction_count == 10
+        assert (cpu.x, cpu.y) == (3, 3)
+
+    def test_brk_abort_count(self):
+        code = bytes([
+            0xA9, 0x01,        # 1000: LDA #$01
+            0xA2, 0x02,        # 1002: LDX #$02
+            0x00, 0x00,        # 1004: BRK 00
+        ])
+        cpu = load_cpu(code, "block")
+        cpu.brk_abort = True
+        with pytest.raises(BrkAbortError, match="BRK 00 at \\$1004"):
+            cpu.run(100)
+        assert cpu.instruction_count == 2
+
+    def test_interrupted_block_count(self):
+        """An exception other than BRK's leaves the count at the block start."""
+        code = bytes([
+            0xE8,              # 1000: INX
+            0xAD, 0x00, 0x30,  # 1001: LDA $3000
+            0xC8,              # 1004: INY
+            0x4C, 0xF9, 0xFF,  # 1005: JMP $FFF9
+        ])
+        cpu = load_cpu(code, "block")
+
+        def interrupt():
+            raise KeyboardInterrupt
+        cpu.memory.add_read_hook(0x3000, interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            cpu.run(100)
+        assert (cpu.pc, cpu.instruction_count) == (0x1000, 0)
+
+    def test_invalidate_unwatches(self):
+        code = bytes([
+            0xE8,              # 1000: INX
+            0x4C, 0xF9, 0xFF,  # 1001: JMP $FFF9
+        ])
+        cpu = run_program(code, "block")
+        assert len(cpu.blocks) == 1
+        cpu.memory.write(0x1002, 0x00)
+        assert len(cpu.blocks) == 0
+        assert not cpu.memory._watched[0x1002]
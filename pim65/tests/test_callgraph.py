@@ -0,0 +1,114 @@
+"""Tests for the call-graph profiler."""
+
+import pytest
+from pim65.config import SimulatorConfig
+from pim65.simulator import Simulator
+from pim65.symbols import Module
+
+from .helpers import load_sim
+
+# $1000: JSR sub; JSR vec; JMP $FFF9
+# $1010 sub: JSR leaf; RTS
+# $1018 leaf: NOP; RTS
+# $1020 vec: JMP sub
+CODE = {
+    0x1000: [0x20, 0x10, 0x10, 0x20, 0x20, 0x10, 0x4C, 0xF9, 0xFF],
+    0x1010: [0x20, 0x18, 0x10, 0x60],
+    0x1018: [0xEA, 0x60],
+    0x1020: [0x4C, 0x10, 0x10],
+}
+
+
+def graph_sim(code: dict[int, list[int]] = CODE, labels: bool = True) -> Simulator:
+    sim = load_sim(code, call_graph=True)
+    if labels:
+        module = sim.symbols.add_module(Module("test"))
+        module.add(0x1010, "sub")
+        module.add(0x1018, "leaf")
+        module.cover(0x1000, 0x1030)
+    return sim
+
+
+class TestCallGraph:
+    """Tests for the shadow call stack and its counts."""
+
+    @pytest.mark.parametrize("trace", [False, True])
+    def test_stacks(self, trace):
+        sim = graph_sim()
+        assert sim.run(max_instructions=100, trace=trace)
+        graph = sim.cpu.call_graph
+        root = graph.ROOT
+        assert graph.stacks == {
+            (root,): 3,
+            (root, "test:sub"): 2,
+            (root, "test:sub", "test:leaf"): 2,
+            (root, "test:sub[$1020]"): 3,
+            (root, "test:sub[$1020]", "test:leaf"): 2,
+        }
+        assert graph.total == sim.instruction_count == 12
+        assert graph.depth == 0
+        assert graph.calls == {"test:sub": 1, "test:sub[$1020]": 1, "test:leaf": 2}
+
+    def test_totals(self):
+        sim = graph_sim()
+        sim.run(max_instructions=100)
+        totals = sim.cpu.call_graph.totals()
+        assert totals["[root]"] == (12, 3)
+        assert totals["test:sub"] == (4, 2)
+        assert totals["test:sub[$1020]"] == (5, 3)
+        assert totals["test:leaf"] == (4, 4)
+
+    def test_unlabelled(self):
+        sim = graph_sim(labels=False)
+        sim.run(max_instructions=100)
+        assert sim.cpu.call_graph.calls == {"$1010": 1, "$1010[$1020]": 1,
+                                            "$1018": 2}
+
+    def test_brk_rti(self):
+        # BRK; pad; JMP $FFF9 with an IRQ handler of NOP; RTI
+        sim = graph_sim({0x1000: [0x00, 0x00, 0x4C, 0xF9, 0xFF],
+                         0x1050: [0xEA, 0x40],
+                         0xFFFE: [0x50, 0x10]}, labels=False)
+        assert sim.run(max_instructions=100)
+        graph = sim.cpu.call_graph
+        assert graph.stacks == {("[root]",): 2, ("[root]", "$1050"): 2}
+        assert graph.depth == 0
+
+    def test_discarded_return(self):
+        # JSR skip; JMP $FFF9 / skip: PLA; PLA; JSR leaf; JMP $1003
+        # The RTS from leaf also unwinds skip, whose return was pulled
+        sim = graph_sim({0x1000: [0x20, 0x30, 0x10, 0x4C, 0xF9, 0xFF],
+                         0x1018: [0xEA, 0x60],
+                         0x1030: [0x68, 0x68, 0x20, 0x18, 0x10, 0x4C, 0x03, 0x10]},
+                        labels=False)
+        assert sim.run(max_instructions=100)
+        graph = sim.cpu.call_graph
+        assert graph.stacks[("[root]", "$1030")] == 3
+        assert graph.stacks[("[root]", "$1030", "$1018")] == 2
+        assert graph.stacks[("[root]",)] == 3
+        assert graph.depth == 0
+
+    def test_collapsed(self, tmp_path):
+        sim = graph_sim()
+        sim.run(max_instructions=100)
+        lines = sim.cpu.call_graph.collapsed()
+        assert "[root] 3" in lines
+        assert "[root];test:sub[$1020];test:leaf 2" in lines
+        path = tmp_path / "stacks.txt"
+        sim.cpu.call_graph.write_collapsed(path)
+        assert path.read_text().splitlines() == lines
+
+    def test_report(self):
+        sim = graph_sim()
+        sim.run(max_instructions=100)
+        report = sim.call_graph_report(top=2)
+        assert "Call graph: 12 instructions" in report
+        lines = report.splitlines()
+        assert lines[4].endswith("[root]")
+        assert lines[5].endswith("test:sub[$1020]")
+        assert len(lines) == 6
+
+    def test_disabled(self):
+        sim = Simulator(SimulatorConfig(binaries=[], start_addr=0x1000))
+        assert sim.cpu.call_graph is None
+        assert sim.call_graph_report() == "Call graph: not enabled"
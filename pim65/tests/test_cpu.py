@@ -4,6 +4,8 @@ import pytest
 from pim65.cpu import CPU, InvalidOpcodeError
 from pim65.memory import Memory
 
+from .helpers import load_cpu
+
 
 class TestCPUBasics:
     """Basic CPU tests."""
@@ -476,6 +478,16 @@ class TestDecimalMode:
         assert self.cpu.a == 0x79
         assert self.cpu.get_flag(CPU.FLAG_V)
 
+    def test_adc_decimal_invalid_digits(self):
+        """ADC decimal with non-BCD digits follows the NMOS adjustment: 0F + 01 = 16."""
+        self.cpu.a = 0x0F
+        self.cpu.set_flag(CPU.FLAG_C, False)
+        self.mem.write(0x1000, 0x69)
+        self.mem.write(0x1001, 0x01)
+        self.cpu.step()
+        assert self.cpu.a == 0x16
+        assert not self.cpu.get_flag(CPU.FLAG_C)
+
 
 class TestLogical:
     """Tests for logical operations."""
@@ -1137,3 +1149,21 @@ class TestSuccessTermination:
         assert result is True
         assert self.cpu.success is True
         assert self.cpu.halted is True
+
+
+class TestPCWatch:
+    """A PC watch runs its callback, then the instruction at its address."""
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_fires_once_per_visit(self, engine):
+        cpu = load_cpu(bytes([
+            0xA2, 0x03,        # 1000: LDX #$03
+            0xCA,              # 1002: DEX
+            0xD0, 0xFD,        # 1003: BNE $1002
+            0x4C, 0xF9, 0xFF,  # 1005: JMP $FFF9
+        ]), engine)
+        seen = []
+        cpu.add_pc_watch(0x1002, lambda: seen.append(cpu.x))
+        assert cpu.run(100)
+        assert seen == [3, 2, 1]
+        assert cpu.instruction_count == 8
@@ -0,0 +1,127 @@
+"""Tests for the predecoded instruction cache engine."""
+
+import pytest
+from pim65.cpu import CPU, InvalidOpcodeError
+from pim65.decode import table_source
+from pim65.memory import Memory
+
+from .helpers import assert_same_as_flat, load_cpu, run_program
+from .test_dispatch import SEEDS, make_cpu, state
+
+
+class TestDecodedHandlers:
+    """The predecoded handlers must match the reference engine exactly."""
+
+    @pytest.mark.parametrize("opcode", sorted(CPU.OPCODE_NAMES))
+    def test_matches_reference(self, opcode):
+        for seed in SEEDS:
+            decoded = make_cpu("decoded", seed, opcode)
+            ref = make_cpu("reference", seed, opcode)
+            decoded.run_until(1)
+            ref.step()
+            assert state(decoded) == state(ref), \
+                f"{CPU.OPCODE_NAMES[opcode]} differs (seed {seed})"
+
+    def test_source_compiles(self):
+        compile(table_source(CPU.OPCODE_NAMES), "<test>", "exec")
+
+
+class TestDecodedEngine:
+    """Cached instructions must follow writes to their code."""
+
+    def test_loop(self):
+        code = bytes([
+            0xA2, 0x00,        # 1000: LDX #$00
+            0xBD, 0x00, 0x20,  # 1002: LDA $2000,X
+            0x69, 0x03,        # 1005: ADC #$03
+            0x9D, 0x00, 0x20,  # 1007: STA $2000,X
+            0xE8,              # 100A: INX
+            0xD0, 0xF5,        # 100B: BNE $1002
+            0x4C, 0xF9, 0xFF,  # 100D: JMP $FFF9
+        ])
+        cpu = assert_same_as_flat(code, "decoded")
+        assert cpu.success
+        assert len(cpu.decoded) == 7
+
+    def test_patch_next_operand(self):
+        """A store to the next instruction's operand, as in `sta ld1+1`."""
+        code = bytes([
+            0xA0, 0x03,        # 1000: LDY #$03
+            0x98,              # 1002: TYA
+            0x8D, 0x07, 0x10,  # 1003: STA $1007  (operand of LDX below)
+            0xA2, 0x00,        # 1006: LDX #$00   (patched each time round)
+            0x96, 0x10,        # 1008: STX $10,Y
+            0x88,              # 100A: DEY
+            0xD0, 0xF5,        # 100B: BNE $1002
+            0x4C, 0xF9, 0xFF,  # 100D: JMP $FFF9
+        ])
+        cpu = assert_same_as_flat(code, "decoded")
+        assert cpu.memory.dump(0x11, 3) == bytes([1, 2, 3])
+
+    def test_patch_jump_target(self):
+        """An indexed store to a JMP's high byte, as in `stx pjmp+2`."""
+        code = bytes([
+            0xA2, 0x02,        # 1000: LDX #$02
+            0xA9, 0x20,        # 1002: LDA #$20
+            0x9D, 0x07, 0x10,  # 1004: STA $1007,X (high byte of JMP below)
+            0x4C, 0x10, 0x10,  # 1007: JMP $1010   (patched to JMP $2010)
+            0x4C, 0xF9, 0xFF,  # 100A: JMP $FFF9
+        ])
+        cpu = load_cpu({
+            0x1000: code,
+            0x2010: bytes([0xE8, 0x4C, 0xF9, 0xFF]),  # INX; JMP $FFF9
+        }, "decoded")
+        cpu.decoded.decode(0x1007)  # Cached before it is patched
+        assert cpu.run(100)
+        assert cpu.x == 3
+
+    def test_relocated_code(self):
+        """Rewritten operands of code that already ran are decoded afresh."""
+        code = bytes([
+            0xAD, 0x00, 0x30,  # 1000: LDA $3000
+            0x85, 0x10,        # 1003: STA $10
+            0x4C, 0xF9, 0xFF,  # 1005: JMP $FFF9
+        ])
+        cpu = load_cpu({0x1000: code, 0x3000: bytes([0x11]), 0x4000: bytes([0x22])},
+                       "decoded")
+        assert cpu.run(100)
+        mem = cpu.memory
+        mem.load_binary(bytes([0x00, 0x40]), 0x1001)  # Relocate to $4000
+        cpu.halted = False
+        cpu.pc = 0x1000
+        assert cpu.run(100)
+        assert mem.read(0x10) == 0x22
+
+    def test_invalidate_unwatches(self):
+        code = bytes([
+            0xE8,              # 1000: INX
+            0x4C, 0xF9, 0xFF,  # 1001: JMP $FFF9
+        ])
+        cpu = run_program(code, "decoded")
+        assert len(cpu.decoded) == 2
+        cpu.memory.write(0x1003, 0x00)
+        assert len(cpu.decoded) == 1
+        assert cpu.decoded.entries[0x1001] is None
+        assert not any(cpu.memory._watched[0x1001:0x1004])
+        assert cpu.memory._watched[0x1000]
+
+    def test_set_state_clears(self):
+        cpu = run_program(bytes([0xE8, 0x4C, 0xF9, 0xFF]), "decoded")
+        cpu.set_state(cpu.get_state())
+        assert len(cpu.decoded) == 0
+        assert not any(cpu.memory._watched)
+
+    def test_hooked_operand_not_cached(self):
+        cpu = load_cpu(bytes([0xA9, 0x00, 0x4C, 0xF9, 0xFF]), "decoded")
+        cpu.memory.add_read_hook(0x1001, lambda: 0x42)
+        assert cpu.run(100)
+        assert cpu.a == 0x42
+        assert cpu.decoded.entries[0x1000] is None
+
+    def test_invalid_opcode(self):
+        with pytest.raises(InvalidOpcodeError):
+            run_program(bytes([0xEA, 0x02]), "decoded")
+
+    def test_cycles_need_flat(self):
+        with pytest.raises(ValueError):
+            CPU(Memory(), engine="decoded", cycles=True)
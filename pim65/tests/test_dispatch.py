@@ -0,0 +1,159 @@
+"""Tests for the generated flat opcode handlers."""
+
+import random
+
+import pytest
+from pim65.cpu import CPU
+from pim65.dispatch import base_cycles, table_source
+from pim65.memory import Memory
+
+
+SEEDS = range(10)
+IMAGES = [random.Random(seed).randbytes(Memory.SIZE) for seed in SEEDS]
+
+
+def make_cpu(engine: str, seed: int, opcode: int, cycles: bool = False) -> CPU:
+    """Build a CPU with pseudo-random memory and registers for one opcode."""
+    rng = random.Random(seed)
+    mem = Memory()
+    mem._mem[:] = IMAGES[seed]
+    mem.write_word(CPU.IRQ_VECTOR, 0x3000)
+    cpu = CPU(mem, engine=engine, cycles=cycles)
+    cpu.pc = 0x1000
+    mem.write(0x1000, opcode)
+    cpu.a = rng.randrange(256)
+    cpu.x = rng.randrange(256)
+    cpu.y = rng.randrange(256)
+    cpu.sp = rng.randrange(256)
+    cpu.status = rng.randrange(256) | CPU.FLAG_U
+    return cpu
+
+
+def state(cpu: CPU) -> tuple:
+    return (cpu.a, cpu.x, cpu.y, cpu.sp, cpu.pc, cpu.status,
+            bytes(cpu.memory._mem))
+
+
+class TestFlatHandlers:
+    """The flat engine must match the reference op_* engine exactly."""
+
+    @pytest.mark.parametrize("opcode", sorted(CPU.OPCODE_NAMES))
+    def test_matches_reference(self, opcode):
+        for seed in SEEDS:
+            flat = make_cpu("flat", seed, opcode)
+            ref = make_cpu("reference", seed, opcode)
+            flat.step()
+            ref.step()
+            assert state(flat) == state(ref), \
+                f"{CPU.OPCODE_NAMES[opcode]} differs (seed {seed})"
+
+    def test_invalid_opcodes_have_no_handler(self):
+        cpu = CPU(Memory())
+        for opcode in range(256):
+            assert (cpu.opcodes[opcode] is None) == (opcode not in CPU.OPCODE_NAMES)
+
+    def test_status_round_trip(self):
+        cpu = CPU(Memory())
+        for value in range(256):
+            cpu.status = value
+            assert cpu.status == value
+
+    @pytest.mark.parametrize("engine", ["reference", "flat"])
+    @pytest.mark.parametrize("a,operand,flags", [
+        (0x00, 0xC0, CPU.FLAG_N | CPU.FLAG_V | CPU.FLAG_Z),
+        (0x80, 0x80, CPU.FLAG_N),
+        (0x01, 0x01, 0),
+        (0x01, 0x40, CPU.FLAG_V | CPU.FLAG_Z),
+    ])
+    def test_bit_flags(self, engine, a, operand, flags):
+        # BIT sets N from the operand even when the result is zero
+        mem = Memory()
+        mem.load_binary(bytes([0x24, 0x10]), 0x1000)
+        mem.write(0x10, operand)
+        cpu = CPU(mem, engine=engine)
+        cpu.pc = 0x1000
+        cpu.a = a
+        cpu.status = 0xFF
+        cpu.step()
+        mask = CPU.FLAG_N | CPU.FLAG_V | CPU.FLAG_Z
+        assert cpu.status & mask == flags
+        assert cpu.status & ~mask == 0xFF & ~mask
+
+    def test_source_compiles(self):
+        compile(table_source(CPU.OPCODE_NAMES), "<test>", "exec")
+
+    @pytest.mark.parametrize("engine", ["reference", "flat"])
+    def test_tables_shared(self, engine):
+        first = CPU(Memory(), engine=engine)
+        second = CPU(Memory(), engine=engine)
+        assert first.opcodes is second.opcodes
+        # Each runs the shared handlers on its own registers and memory
+        second.memory.load_binary(bytes([0xA9, 0x42, 0x8D, 0x00, 0x20]), 0x1000)
+        second.pc = 0x1000
+        second.step()
+        second.step()
+        assert (first.a, second.a) == (0, 0x42)
+        assert first.memory.read(0x2000) == 0xFF
+        assert second.memory.read(0x2000) == 0x42
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            CPU(Memory(), engine="jit")
+
+
+def cycles_for(code: bytes, x: int = 0, y: int = 0, steps: int = 1) -> int:
+    """Cycles taken by the first `steps` instructions of code at $1000."""
+    mem = Memory()
+    mem.load_binary(code, 0x1000)
+    cpu = CPU(mem, cycles=True)
+    cpu.pc = 0x1000
+    cpu.x = x
+    cpu.y = y
+    for _ in range(steps):
+        cpu.step()
+    return cpu.cycles
+
+
+class TestCycles:
+    """Cycle counting in the flat handlers."""
+
+    def test_base_cycles(self):
+        expected = {
+            0xEA: 2, 0xA9: 2, 0xA5: 3, 0xAD: 4, 0xBD: 4, 0xB1: 5, 0xA1: 6,
+            0x9D: 5, 0x91: 6, 0x06: 5, 0x1E: 7, 0x4C: 3, 0x6C: 5, 0x20: 6,
+            0x60: 6, 0x40: 6, 0x00: 7, 0x48: 3, 0x68: 4, 0xF0: 2,
+        }
+        for opcode, cycles in expected.items():
+            assert base_cycles(*CPU.OPCODE_NAMES[opcode]) == cycles, \
+                CPU.OPCODE_NAMES[opcode]
+
+    def test_page_cross_penalty(self):
+        lda = bytes([0xBD, 0xF0, 0x20])  # LDA $20F0,X
+        assert cycles_for(lda, x=0x0F) == 4
+        assert cycles_for(lda, x=0x10) == 5
+        sta = bytes([0x9D, 0xF0, 0x20])  # STA $20F0,X
+        assert cycles_for(sta, x=0x10) == 5
+        inc = bytes([0xFE, 0xF0, 0x20])  # INC $20F0,X
+        assert cycles_for(inc, x=0x10) == 7
+
+    def test_branch_penalty(self):
+        not_taken = bytes([0x38, 0x90, 0x10])  # SEC; BCC +$10
+        assert cycles_for(not_taken, steps=2) == 4
+        taken = bytes([0x18, 0x90, 0x10])      # CLC; BCC +$10
+        assert cycles_for(taken, steps=2) == 5
+        crossing = bytes([0x18, 0x90, 0x80])   # CLC; BCC -$80 (to $0F83)
+        assert cycles_for(crossing, steps=2) == 6
+
+    @pytest.mark.parametrize("opcode", sorted(CPU.OPCODE_NAMES))
+    def test_counting_matches_reference(self, opcode):
+        """Counting cycles does not change results."""
+        for seed in SEEDS[:3]:
+            ref = make_cpu("reference", seed, opcode)
+            counted = make_cpu("flat", seed, opcode, cycles=True)
+            ref.step()
+            counted.step()
+            assert state(counted) == state(ref)
+
+    def test_requires_flat_engine(self):
+        with pytest.raises(ValueError):
+            CPU(Memory(), engine="block", cycles=True)
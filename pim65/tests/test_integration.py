@@ -6,9 +6,11 @@ from pathlib import Path
 
 import pytest
 from pim65.config import SimulatorConfig
-from pim65.cpu import InvalidOpcodeError
+from pim65.cpu import CPU, IdleLoopError, InvalidOpcodeError
 from pim65.simulator import Simulator
 
+from .helpers import load_sim
+
 
 class TestSimplePrograms:
     """Test small complete programs."""
@@ -300,6 +302,40 @@ class TestInstructionLimit:
             sim.run(max_instructions=10)
 
 
+class TestIdleLoop:
+    """Test idle loop detection."""
+
+    def make_sim(self, code: bytes, engine: str = "flat") -> Simulator:
+        return load_sim(code, engine)
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_keyboard_poll(self, engine):
+        # LDA #$00; poll: LDA $C000; BPL poll
+        sim = self.make_sim(bytes([0xA9, 0x00, 0xAD, 0x00, 0xC0, 0x10, 0xFB]), engine)
+        sim.setup_keyboard([])
+        with pytest.raises(IdleLoopError) as info:
+            sim.run(max_instructions=1000000, idle_iterations=3)
+        assert (info.value.start, info.value.end) == (0x1002, 0x1005)
+        assert sim.instruction_count < 2 * sim.cpu.IDLE_CHECK_INTERVAL
+
+    def test_memory_changes_are_progress(self):
+        # INC $10; JMP $1000
+        sim = self.make_sim(bytes([0xE6, 0x10, 0x4C, 0x00, 0x10]))
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            sim.run(max_instructions=20000, idle_iterations=3)
+
+    def test_register_changes_are_progress(self):
+        # INY; JMP $1000
+        sim = self.make_sim(bytes([0xC8, 0x4C, 0x00, 0x10]))
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            sim.run(max_instructions=20000, idle_iterations=3)
+
+    def test_disabled_by_default(self):
+        sim = self.make_sim(bytes([0x4C, 0x00, 0x10]))  # JMP $1000
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            sim.run(max_instructions=20000)
+
+
 class TestInvalidOpcodes:
     """Test invalid opcode handling."""
 
@@ -318,3 +354,158 @@ class TestInvalidOpcodes:
 
         with pytest.raises(InvalidOpcodeError):
             sim.run(max_instructions=100)
+
+
+class TestSnapshot:
+    """Test machine snapshot and restore."""
+
+    def make_sim(self) -> Simulator:
+        code = bytes([
+            0xE8,              # INX
+            0x86, 0x10,        # STX $10
+            0x4C, 0x00, 0x10   # JMP $1000
+        ])
+        return load_sim(code)
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_restore_replays(self, engine):
+        """Running on from a restored snapshot repeats the same execution."""
+        sim = self.make_sim()
+        sim.cpu.step()
+        snapshot = sim.snapshot()
+
+        with pytest.raises(RuntimeError):
+            sim.run(max_instructions=30)
+        first = (sim.cpu.get_state(), sim.memory.snapshot())
+
+        fork = Simulator(SimulatorConfig(binaries=[], start_addr=0x1000),
+                         engine=engine)
+        fork.restore(snapshot)
+        assert fork.cpu.x == 1 and fork.instruction_count == 1
+        with pytest.raises(RuntimeError):
+            fork.run(max_instructions=30)
+        assert (fork.cpu.get_state(), fork.memory.snapshot()) == first
+
+    def test_snapshot_is_a_copy(self):
+        sim = self.make_sim()
+        snapshot = sim.snapshot()
+        sim.memory.write(0x1000, 0xEA)
+        sim.cpu.a = 0x42
+        sim.restore(snapshot)
+        assert sim.memory.read(0x1000) == 0xE8
+        assert sim.cpu.a == 0
+
+
+class TestInputWait:
+    """Test stopping when the program waits for keyboard input."""
+
+    # Echo keys to $0300+: poll: LDA $C000; BPL poll; STA $C010;
+    # STA $0300,X; INX; JMP poll
+    CODE = bytes([
+        0xAD, 0x00, 0xC0, 0x10, 0xFB, 0x8D, 0x10, 0xC0,
+        0x9D, 0x00, 0x03, 0xE8, 0x4C, 0x00, 0x10,
+    ])
+
+    def make_sim(self, engine: str = "flat") -> Simulator:
+        return load_sim(self.CODE, engine)
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_stops_when_input_runs_out(self, engine):
+        sim = self.make_sim(engine)
+        sim.setup_keyboard(["AB"])
+        assert not sim.run(max_instructions=1000000, stop_on_input_wait=True)
+        assert sim.waiting_for_input
+        assert sim.memory.dump(0x0300, 2) == bytes([0xC1, 0xC2])
+        assert sim.instruction_count <= 2 * Simulator.INPUT_WAIT_SLICE
+
+    def test_without_keyboard(self):
+        sim = self.make_sim()
+        assert not sim.run(max_instructions=1000000, stop_on_input_wait=True)
+        assert sim.waiting_for_input
+
+    def test_limit_still_applies(self):
+        sim = self.make_sim()
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            sim.run(max_instructions=1000)
+        assert not sim.waiting_for_input
+
+    def test_busy_loop_is_not_a_wait(self):
+        # Polls the keyboard once per ~50 instructions of other work
+        code = bytes([
+            0xA2, 0x10,        # LDX #$10
+            0xCA,              # DEX
+            0xD0, 0xFD,        # BNE *-1
+            0xAD, 0x00, 0xC0,  # LDA $C000
+            0x4C, 0x00, 0x10,  # JMP $1000
+        ])
+        sim = self.make_sim()
+        sim.memory.load_binary(code, 0x1000)
+        with pytest.raises(RuntimeError, match="Instruction limit"):
+            sim.run(max_instructions=50000, stop_on_input_wait=True)
+        assert not sim.waiting_for_input
+
+
+class TestCommandLine:
+    """Tests for CLI options choosing how programs run."""
+
+    EXAMPLE = Path(__file__).parent.parent / "examples" / "test.json"
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_engine(self, engine, monkeypatch):
+        from pim65 import main as cli
+        engines = []
+
+        class Recording(Simulator):
+            def __init__(self, config, engine="flat", cycles=False):
+                engines.append(engine)
+                super().__init__(config, engine=engine, cycles=cycles)
+
+        monkeypatch.setattr(cli, "Simulator", Recording)
+        assert cli.main(["--engine", engine, str(self.EXAMPLE)]) == 0
+        assert engines == [engine]
+
+    def test_cycles_need_flat(self, capsys):
+        from pim65.main import main
+        with pytest.raises(SystemExit):
+            main(["--engine", "block", "--cycles", str(self.EXAMPLE)])
+        assert "--cycles requires --engine flat" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("argv", [
+        ["--profile", "--profile-top", "3", str(EXAMPLE)],
+        [str(EXAMPLE), "--profile", "--profile-top", "3"],
+    ])
+    def test_profile(self, argv, capsys):
+        from pim65.main import main
+        assert main(argv) == 0
+        assert "Top 3 addresses:" in capsys.readouterr().out
+
+    @pytest.mark.parametrize("argv, iterations", [
+        (["--idle-loop", str(EXAMPLE)], 3),
+        ([str(EXAMPLE), "--idle-loop", "--idle-iterations", "5"], 5),
+        (["--idle-iterations", "5", str(EXAMPLE)], 0),
+    ])
+    def test_idle_loop(self, argv, iterations, monkeypatch):
+        from pim65 import main as cli
+        runs = []
+        run = Simulator.run
+
+        def recording(sim, **kwargs):
+            runs.append(kwargs["idle_iterations"])
+            return run(sim, **kwargs)
+
+        monkeypatch.setattr(Simulator, "run", recording)
+        assert cli.main(argv) == 0
+        assert runs == [iterations]
+
+    def test_error_at_zero_labelled(self, tmp_path, capsys):
+        """A fault at $0000 is labelled there, not at the PC after it."""
+        from pim65.main import main
+        (tmp_path / "prog.bin").write_bytes(bytes([0x4C, 0x00, 0x00]))  # JMP $0000
+        (tmp_path / "prog.json").write_text(json.dumps({
+            "binaries": [{"file": "prog.bin", "load_addr": "0x1000"}],
+            "start_addr": "0x1000",
+        }))
+        (tmp_path / "zp.lbl").write_text("al 000000 .zero\n")
+        assert main([str(tmp_path / "prog.json"),
+                     "--symbols", str(tmp_path / "zp.lbl")]) == 1
+        assert "  in zp:zero\n" in capsys.readouterr().err
@@ -84,3 +84,194 @@ class TestMemory:
         mem.write(0x1002, 0x03)
         data = mem.dump(0x1000, 3)
         assert data == bytes([0x01, 0x02, 0x03])
+
+
+class TestPageTable:
+    """Tests for the page-table fast and slow paths."""
+
+    def test_plain_pages_are_fast(self):
+        mem = Memory()
+        assert not any(mem._read_slow)
+        assert not any(mem._write_slow)
+
+    def test_hooks_mark_only_their_page(self):
+        mem = Memory()
+        mem.add_read_hook(0xC000, lambda: 0x41)
+        mem.add_write_hook(0xC010, lambda value: None)
+        assert mem._read_slow[0xC0] and mem._write_slow[0xC0]
+        assert sum(mem._read_slow) == 1
+        assert sum(mem._write_slow) == 1
+
+    def test_hooked_page_still_reads_ram(self):
+        """Unhooked addresses on a hooked page behave like RAM."""
+        mem = Memory()
+        mem.add_read_hook(0xC000, lambda: 0x41)
+        mem.write(0xC001, 0x42)
+        assert mem.read(0xC000) == 0x41
+        assert mem.read(0xC001) == 0x42
+
+    def test_write_hook_replaces_store(self):
+        mem = Memory()
+        written = []
+        mem.add_write_hook(0xC010, written.append)
+        mem.write(0xC010, 0x1AB)
+        assert written == [0xAB]
+        assert mem.dump(0xC010, 1) == bytes([0xFF])
+
+    def test_read_word_across_hooked_page(self):
+        mem = Memory()
+        mem.add_read_hook(0xC000, lambda: 0x12)
+        mem.write(0xBFFF, 0x34)
+        assert mem.read_word(0xBFFF) == 0x1234
+
+    def test_watched_write(self):
+        mem = Memory()
+        seen = []
+        mem.watch_callback = seen.append
+        mem.set_watched(0x1234, True)
+        assert mem._write_slow[0x12]
+        mem.write(0x1234, 0x01)
+        mem.write(0x1235, 0x02)
+        assert seen == [0x1234]
+        mem.set_watched(0x1234, False)
+        assert not mem._write_slow[0x12]
+
+    def test_stack_access(self):
+        mem = Memory()
+        mem.write_stack(0x1FF, 0x42)  # SP wraps within page one
+        assert mem.read(0x01FF) == 0x42
+        assert mem.read_stack(0xFF) == 0x42
+
+
+class TestDirtyPages:
+    """Tests for per-page dirty tracking."""
+
+    def test_starts_dirty_and_fast(self):
+        mem = Memory()
+        dirty = mem.track_dirty()
+        assert dirty.pages() == list(range(Memory.PAGES))
+        assert not any(mem._write_slow)
+
+    def test_first_write_marks_page(self):
+        mem = Memory()
+        dirty = mem.track_dirty()
+        dirty.clear()
+        assert all(mem._write_slow)
+        mem.write(0x0401, 0xC1)
+        assert dirty.pages() == [0x04]
+        assert not mem._write_slow[0x04]
+        mem.write(0x0402, 0xC2)
+        assert dirty.pages() == [0x04]
+        assert mem.dump(0x0401, 2) == bytes([0xC1, 0xC2])
+
+    def test_clear_some_pages(self):
+        mem = Memory()
+        dirty = mem.track_dirty()
+        dirty.clear(range(4, 8))
+        assert 0x04 not in dirty and 0x08 in dirty
+        assert sum(mem._write_slow) == 4
+
+    def test_bulk_and_stack_writes(self):
+        mem = Memory()
+        dirty = mem.track_dirty()
+        dirty.clear()
+        mem.write_bytes(0x20F0, bytes(0x20))
+        mem.write_stack(0x10, 0x42)
+        assert dirty.pages() == [0x01, 0x20, 0x21]
+
+    def test_hooked_writes_are_not_dirty(self):
+        mem = Memory()
+        mem.add_write_hook(0xC010, lambda value: None)
+        dirty = mem.track_dirty()
+        dirty.clear()
+        mem.write(0xC010, 0x00)
+        assert 0xC0 not in dirty
+        assert mem._write_slow[0xC0]
+
+    def test_consumers_are_independent(self):
+        mem = Memory()
+        first = mem.track_dirty()
+        second = mem.track_dirty()
+        first.clear()
+        second.clear()
+        mem.write(0x1000, 0x01)
+        first.clear()
+        assert 0x10 not in first and 0x10 in second
+        assert mem._write_slow[0x10]
+        mem.write(0x1000, 0x02)
+        assert 0x10 in first
+
+    def test_restore_marks_all(self):
+        mem = Memory()
+        snapshot = mem.snapshot()
+        dirty = mem.track_dirty()
+        dirty.clear()
+        mem.restore(snapshot)
+        assert len(dirty.pages()) == Memory.PAGES
+        assert not any(mem._write_slow)
+
+    def test_close(self):
+        mem = Memory()
+        dirty = mem.track_dirty()
+        dirty.clear()
+        dirty.close()
+        assert not any(mem._write_slow)
+
+
+class TestBulkAccess:
+    """Tests for read_bytes/write_bytes."""
+
+    def test_write_bytes(self):
+        mem = Memory()
+        mem.write_bytes(0x2000, bytes([1, 2, 3]))
+        assert mem.dump(0x2000, 3) == bytes([1, 2, 3])
+
+    def test_write_bytes_wraps(self):
+        mem = Memory()
+        mem.write_bytes(0xFFFE, bytes([1, 2, 3, 4]))
+        assert mem.read(0xFFFF) == 2
+        assert mem.read(0x0000) == 3
+        assert mem.read(0x0001) == 4
+
+    def test_write_bytes_through_hooks(self):
+        mem = Memory()
+        written = []
+        mem.add_write_hook(0xC010, written.append)
+        mem.write_bytes(0xC00F, bytes([1, 2, 3]))
+        assert written == [2]
+        assert mem.read(0xC00F) == 1
+        assert mem.read(0xC011) == 3
+
+    def test_read_bytes(self):
+        mem = Memory()
+        mem.write_bytes(0xFFFF, bytes([7, 8]))
+        assert mem.read_bytes(0xFFFF, 2) == bytes([7, 8])
+
+    def test_read_bytes_through_hooks(self):
+        mem = Memory()
+        mem.add_read_hook(0xC000, lambda: 0x41)
+        assert mem.read_bytes(0xBFFF, 2) == bytes([0xFF, 0x41])
+
+    def test_load_binary_wraps(self):
+        mem = Memory()
+        mem.load_binary(bytes([1, 2, 3]), 0xFFFF)
+        assert mem.read(0xFFFF) == 1
+        assert mem.read(0x0000) == 2
+        assert mem.read(0x0001) == 3
+
+    def test_load_binary_over_watched_page(self):
+        """Watched bytes still report writes made by bulk loads."""
+        mem = Memory()
+        seen = []
+        mem.watch_callback = seen.append
+        mem.set_watched(0x2105, True)
+        mem.load_binary(bytes(range(256)) * 3, 0x2000)
+        assert seen == [0x2105]
+        assert mem.dump(0x2000, 0x300) == bytes(range(256)) * 3
+
+    def test_dump_view(self):
+        mem = Memory()
+        view = mem.dump_view(0x1000, 2)
+        mem.write(0x1001, 0x42)
+        assert view[1] == 0x42
+        assert view.readonly
@@ -0,0 +1,42 @@
+"""Tests for the instruction profiler."""
+
+import pytest
+from pim65.config import SimulatorConfig
+from pim65.simulator import Simulator
+from pim65.symbols import Module
+
+from .helpers import load_sim
+
+# LDX #$03; loop: DEX; BNE loop; JMP $FFF9
+CODE = bytes([0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0x4C, 0xF9, 0xFF])
+
+
+class TestProfiler:
+    """Tests for per-PC and per-opcode counts."""
+
+    @pytest.mark.parametrize("trace", [False, True])
+    def test_counts(self, trace):
+        sim = load_sim(CODE, profile=True)
+        assert sim.run(max_instructions=100, trace=trace)
+        profile = sim.cpu.profile
+        assert profile.total == sim.instruction_count == 8
+        assert profile.hot_addresses(2) == [(0x1002, 3), (0x1003, 3)]
+        assert profile.opcode_counts[0xCA] == 3
+        assert profile.opcode_counts[0x4C] == 1
+
+    def test_report(self):
+        sim = load_sim(CODE, profile=True)
+        sim.run(max_instructions=100)
+        module = sim.symbols.add_module(Module("test"))
+        module.add(0x1002, "loop")
+        module.cover(0x1000, 0x1008)
+        report = sim.profile_report(top=2)
+        assert "Profile: 8 instructions" in report
+        lines = report.splitlines()
+        assert "$1002" in lines[4] and "test:loop" in lines[4] and "DEX" in lines[4]
+        assert "BNE $1002" in lines[5]
+
+    def test_disabled(self):
+        sim = Simulator(SimulatorConfig(binaries=[], start_addr=0x1000))
+        assert sim.cpu.profile is None
+        assert sim.profile_report() == "Profile: not enabled"
@@ -0,0 +1,137 @@
+"""Tests for symbol tables from ca65 listings and ld65 label files."""
+
+import tempfile
+from pathlib import Path
+
+from pim65.config import SimulatorConfig
+from pim65.simulator import Simulator
+from pim65.symbols import Module, SymbolTable, parse_label_file, parse_listing
+
+# Excerpt of a ca65 listing (ca65 -l --list-bytes 100)
+LISTING = """\
+ca65 V2.19 - Git 2.19
+Main file   : src/runes/03-bcd.s
+Current file: src/runes/03-bcd.s
+
+000000r 1               ; Rune 3 - BCD (Binary Coded Decimal)
+000000r 1                       .org $2000
+002000  1               .include "base.i"
+002000  2               bcd_ptr1 = $F0
+002000  1  4C 04 20     \tjmp _bcd_inc
+002003  1  EA           \t.align 4,$EA
+002004  1               .proc _bcd_inc
+002004  1               pnum\t= bcd_ptr1
+002004  1  A0 00        go:\tldy #0\t\t; Y - digit
+002006  1  B1 F0        lup:\tlda (pnum),y
+002008  1  C8           \tiny
+002009  1  D0 FB        \tbne lup
+00200B  1  60           \trts
+00200C  1               .endproc
+00200C  1               ;*******************************
+00200C  1               _bcd_dec:
+00200C  1  A9 01 8D 00  \tlda #1
+002010  1  20           \tsta $2000
+002011  1  60           \trts
+"""
+
+
+def write(tmpdir: str, name: str, text: str) -> Path:
+    path = Path(tmpdir) / name
+    path.write_text(text)
+    return path
+
+
+class TestListing:
+    """Tests for ca65 listing parsing."""
+
+    def test_labels_and_scopes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module = parse_listing(write(tmpdir, "03-bcd.lst", LISTING))
+        assert module.name == "03-bcd"
+        assert module.address_of("_bcd_inc") == 0x2004
+        assert module.address_of("_bcd_inc::lup") == 0x2006
+        assert module.address_of("_bcd_dec") == 0x200C
+        assert module.lookup(0x2009) == ("_bcd_inc::lup", 3)
+        assert (module.start, module.end) == (0x2000, 0x2012)
+
+    def test_symbolize(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write(tmpdir, "03-bcd.lst", LISTING)
+            symbols = SymbolTable()
+            assert symbols.load(tmpdir) == 1
+        assert symbols.symbolize(0x2004) == "03-bcd:_bcd_inc"
+        assert symbols.symbolize(0x200B) == "03-bcd:_bcd_inc::lup+0x5"
+        assert symbols.symbolize(0x2011) == "03-bcd:_bcd_dec+0x5"
+        assert symbols.symbolize(0x2012) is None
+        assert symbols.symbolize(0x1FFF) is None
+
+
+class TestSymbolTable:
+    """Tests for lookups across modules."""
+
+    def test_label_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write(tmpdir, "shell.lbl",
+                         "al 001000 .start\nal 001040 .parse\n")
+            module = parse_label_file(path)
+        assert module.lookup(0x1045) == ("parse", 5)
+        assert 0x1100 in module
+        assert 0x1140 not in module
+
+    def test_latest_module_wins(self):
+        symbols = SymbolTable()
+        for name in ("shell", "ls"):
+            module = Module(name)
+            module.add(0x1000, "start")
+            module.cover(0x1000, 0x1100)
+            symbols.add_module(module)
+        assert symbols.symbolize(0x1010) == "ls:start+0x10"
+
+
+def lst_line(pc: int, code: bytes, source: str) -> str:
+    """One ca65 listing line."""
+    data = " ".join(f"{b:02X}" for b in code)
+    return f"{pc:06X}  1  {data:<13}{source}\n"
+
+
+# Kernel shockload exit: ldtpg holds the target page, runefn the rune prefix
+KERNEL = [
+    (0x0E00, b"", ".proc shockload"),
+    (0x0E00, bytes([0xA2, 0x40]), "ldtpg:\tldx #$40"),
+    (0x0E02, bytes([0x4C, 0x00, 0x40]), "jgo:\tjmp $4000"),
+    (0x0E05, b"", ".endproc"),
+    (0x0E05, bytes([0x02, 0x30, 0x33]), 'runefn:\t.byte 2, "03"'),
+]
+RUNE = [
+    (0x2000, b"", ".proc _bcd_inc"),
+    (0x2000, bytes([0xE8]), "\tinx"),
+    (0x2001, bytes([0x4C, 0xF9, 0xFF]), "\tjmp $FFF9"),
+    (0x2004, b"", ".endproc"),
+]
+
+
+class TestRuneTracker:
+    """Rune symbols follow the kernel's relocation."""
+
+    def test_rebase_on_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            build = Path(tmpdir)
+            (build / "runes").mkdir()
+            write(tmpdir, "kernel.lst", "".join(lst_line(*line) for line in KERNEL))
+            write(tmpdir, "runes/03-bcd.lst", "".join(lst_line(*line) for line in RUNE))
+
+            sim = Simulator(SimulatorConfig(binaries=[], start_addr=0x0E00))
+            assert sim.load_symbols(build) == 2
+        for pc, code, _ in KERNEL + [(pc + 0x2000, code, s) for pc, code, s in RUNE]:
+            sim.memory.load_binary(code, pc)
+        sim.memory.set_reset_vector(0x0E00)
+        sim.cpu.reset()
+
+        assert sim.runes is not None
+        assert sim.symbolize(0x2001) is None
+        assert sim.run(max_instructions=10)
+        assert sim.cpu.x == 0x41
+        assert sim.runes.loaded == {"03-bcd": 0x4000}
+        assert sim.symbolize(0x4001) == "03-bcd:_bcd_inc+0x1"
+        assert sim.symbolize(0x2001) is None
+        assert sim.symbolize(0x0E02) == "kernel:shockload::jgo"
@@ -0,0 +1,89 @@
+"""Tests for the interactive terminal front end."""
+
+import io
+
+import pytest
+
+pytest.importorskip("termios")
+
+from pim65.apple2 import Keyboard, TextScreen
+from pim65.cpu import CPU
+from pim65.simulator import Simulator
+from pim65.terminal import Terminal, cell, escape_keys, render_row
+
+from .helpers import load_sim
+
+
+def blank_sim() -> Simulator:
+    return load_sim({TextScreen.SCREEN_BASE: bytes([0xA0] * TextScreen.SCREEN_SIZE)})
+
+
+class TestRendering:
+    """Tests for screen cell decoding and row redraws."""
+
+    @pytest.mark.parametrize("byte,expected", [
+        (0xC1, ("A", False)),
+        (0xE1, ("a", False)),
+        (0x81, ("A", False)),
+        (0x01, ("A", True)),
+        (0x20, (" ", True)),
+        (0x41, ("A", True)),
+        (0x60, (" ", True)),
+    ])
+    def test_cell(self, byte, expected):
+        assert cell(byte) == expected
+
+    def test_render_row(self):
+        assert render_row(bytes([0xC8, 0xC9, 0x20, 0xA0])) == "HI\x1b[7m \x1b[0m "
+
+    def test_redraws_changed_rows_only(self):
+        sim = blank_sim()
+        terminal = Terminal(sim, out=io.StringIO())
+        first = terminal.render()
+        assert first.count("\x1b[") == TextScreen.ROWS
+        assert terminal.render() == ""
+
+        sim.memory.write(TextScreen.line_address(5) + 3, 0xC1)
+        output = terminal.render()
+        assert output == "\x1b[6;1H" + "   A".ljust(TextScreen.COLS)
+        assert terminal.render() == ""
+
+    @pytest.mark.parametrize("engine", CPU.ENGINES)
+    def test_sees_cpu_writes(self, engine):
+        # LDA #$C8; STA $0400; LDA #$C9; STA $0401; JMP $FFF9
+        sim = load_sim(bytes([0xA9, 0xC8, 0x8D, 0x00, 0x04, 0xA9, 0xC9,
+                              0x8D, 0x01, 0x04, 0x4C, 0xF9, 0xFF]), engine)
+        terminal = Terminal(sim, out=io.StringIO())
+        terminal.render()
+        assert sim.run(max_instructions=100)
+        assert terminal.render().startswith("\x1b[1;1HHI")
+
+    def test_draw(self):
+        sim = blank_sim()
+        out = io.StringIO()
+        terminal = Terminal(sim, out=out)
+        terminal.draw()
+        drawn = out.getvalue()
+        terminal.draw()
+        assert out.getvalue() == drawn
+
+
+class TestKeys:
+    """Tests for translating typed keys."""
+
+    def test_escape_keys(self):
+        keyboard = Keyboard([escape_keys(b"a\\\n\x7f\x03")])
+        typed = []
+        while keyboard.has_input:
+            typed.append(keyboard.clear_strobe())
+        assert typed == [0xE1, 0xDC, 0x8D, 0x88, 0x83]
+
+
+class TestCommandLine:
+    """Tests for the --interactive option."""
+
+    def test_needs_terminal(self, capsys, monkeypatch):
+        from pim65.main import main
+        monkeypatch.setattr("sys.stdin", io.StringIO())
+        assert main(["--interactive", "config.json"]) == 1
+        assert "needs a terminal" in capsys.readouterr().err
@@ -0,0 +1,87 @@
+"""Tests for the instruction trace buffer."""
+
+import pytest
+from pim65.trace import TraceBuffer
+
+from .helpers import load_cpu
+
+
+class TestTraceBuffer:
+    """Tests for the ring buffer itself."""
+
+    def test_wraps(self):
+        trace = TraceBuffer(3)
+        for pc in range(5):
+            trace.record(pc, 0xEA, 0, 0, 0, 0, 0xFD, 0x24)
+        assert len(trace) == 3
+        assert trace.dropped == 2
+        assert [entry[0] for entry in trace.entries()] == [2, 3, 4]
+        assert [entry[0] for entry in trace.entries(2)] == [3, 4]
+
+    def test_clear(self):
+        trace = TraceBuffer(3)
+        trace.record(0x1000, 0xEA, 0, 0, 0, 0, 0xFD, 0x24)
+        trace.clear()
+        assert len(trace) == 0
+        assert list(trace.entries()) == []
+
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            TraceBuffer(0)
+
+
+class TestCPUTrace:
+    """Tests for tracing through the CPU."""
+
+    def test_trace_lines(self):
+        cpu = load_cpu(bytes([
+            0xA9, 0x42,        # LDA #$42
+            0x8D, 0x00, 0x20,  # STA $2000
+            0xD0, 0xFE,        # BNE $1005
+        ]), trace=True)
+        for _ in range(3):
+            cpu.step()
+        assert cpu.trace_log == [
+            "$1000: LDA #$42              A=$00 X=$00 Y=$00 SP=$FD [nv-bdIzc]",
+            "$1002: STA $2000             A=$42 X=$00 Y=$00 SP=$FD [nv-bdIzc]",
+            "$1005: BNE $1005             A=$42 X=$00 Y=$00 SP=$FD [nv-bdIzc]",
+        ]
+
+    def test_records_bytes_as_executed(self):
+        """Entries show the code as it was, even if patched later."""
+        cpu = load_cpu(bytes([0xA9, 0x42]), trace=True)
+        cpu.step()
+        cpu.memory.write(0x1001, 0x99)
+        assert "LDA #$42" in cpu.trace_lines()[0]
+
+    def test_records_watched_instruction(self):
+        """A PC watch doesn't keep its instruction out of the trace."""
+        cpu = load_cpu(bytes([
+            0xA9, 0x42,        # LDA #$42
+            0x8D, 0x00, 0x20,  # STA $2000
+            0x4C, 0xF9, 0xFF,  # JMP $FFF9
+        ]), trace=True)
+        seen = []
+        cpu.add_pc_watch(0x1002, lambda: seen.append(cpu.a))
+        assert cpu.run(100)
+        assert seen == [0x42]
+        assert cpu.memory.read(0x2000) == 0x42
+        assert [line[:16] for line in cpu.trace_lines()] == [
+            "$1000: LDA #$42 ", "$1002: STA $2000", "$1005: JMP $FFF9"]
+
+    def test_keeps_last_entries(self):
+        cpu = load_cpu(bytes([0xE8, 0x4C, 0x00, 0x10]),  # INX; JMP $1000
+                       trace=True, trace_capacity=4)
+        with pytest.raises(RuntimeError):
+            cpu.run(101)
+        lines = cpu.trace_lines()
+        assert len(lines) == 4
+        assert cpu.trace_buffer.dropped == 97
+        assert lines[-1].startswith("$1000: INX")
+        assert len(cpu.trace_lines(2)) == 2
+
+    def test_reset_clears(self):
+        cpu = load_cpu(bytes([0xEA]), trace=True)
+        cpu.step()
+        cpu.reset()
+        assert cpu.trace_log == []
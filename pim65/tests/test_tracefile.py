@@ -0,0 +1,53 @@
+"""Tests for binary trace files."""
+
+import tempfile
+from pathlib import Path
+
+import pytest
+from pim65.simulator import Simulator
+from pim65.tracefile import decode, read_trace
+
+from .helpers import load_sim
+
+
+def run_traced(trace_path: Path) -> Simulator:
+    code = bytes([
+        0xA2, 0x03,        # 1000: LDX #$03
+        0xCA,              # 1002: DEX
+        0xD0, 0xFD,        # 1003: BNE $1002
+        0x4C, 0xF9, 0xFF,  # 1005: JMP $FFF9
+    ])
+    sim = load_sim(code)
+    sim.open_trace_file(trace_path)
+    assert sim.run(max_instructions=100)
+    sim.cleanup()
+    return sim
+
+
+class TestTraceFile:
+    """Tests for writing and decoding trace files."""
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "run.trace"
+            sim = run_traced(path)
+            records = list(read_trace(path))
+            assert len(records) == sim.instruction_count == 8
+            assert records[0] == (0x1000, 0xA2, 0xCA03, 0, 0, 0, 0xFD, 0x24)
+            lines = [line for _, line in decode(path)]
+            assert lines == sim.get_trace()
+
+    def test_filters(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "run.trace"
+            run_traced(path)
+            assert [i for i, _ in decode(path, start=0x1002, end=0x1002)] == [1, 3, 5]
+            matches = list(decode(path, pattern=r"X=\$01"))
+            assert [i for i, _ in matches] == [4, 5]
+
+    def test_not_a_trace(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "run.trace"
+            path.write_bytes(b"hello")
+            with pytest.raises(ValueError):
+                list(read_trace(path))
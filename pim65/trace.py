@@ -0,0 +1,70 @@
+"""Instruction trace storage for pim65."""
+
+from array import array
+from typing import Iterator, Optional
+
+
+class TraceBuffer:
+    """Ring buffer of the most recently traced instructions.
+
+    Entries are stored raw in preallocated arrays as (pc, opcode, operand,
+    a, x, y, sp, p), where operand is the two bytes after the opcode as a
+    little-endian word. Nothing is formatted until the trace is read, and
+    only the last `capacity` entries are kept.
+    """
+
+    DEFAULT_CAPACITY = 100000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Trace capacity must be at least 1")
+        self.capacity = capacity
+        self._pc = array('H', bytes(2 * capacity))
+        self._operand = array('H', bytes(2 * capacity))
+        self._opcode = bytearray(capacity)
+        self._a = bytearray(capacity)
+        self._x = bytearray(capacity)
+        self._y = bytearray(capacity)
+        self._sp = bytearray(capacity)
+        self._p = bytearray(capacity)
+        self._next = 0    # Slot for the next entry
+        self.total = 0    # Entries recorded since the last clear
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        """Number of entries overwritten by newer ones."""
+        return self.total - len(self)
+
+    def clear(self) -> None:
+        """Discard all entries."""
+        self._next = 0
+        self.total = 0
+
+    def record(self, pc: int, opcode: int, operand: int,
+               a: int, x: int, y: int, sp: int, p: int) -> None:
+        """Record one instruction, overwriting the oldest if full."""
+        i = self._next
+        self._pc[i] = pc
+        self._opcode[i] = opcode
+        self._operand[i] = operand
+        self._a[i] = a
+        self._x[i] = x
+        self._y[i] = y
+        self._sp[i] = sp
+        self._p[i] = p
+        i += 1
+        self._next = 0 if i == self.capacity else i
+        self.total += 1
+
+    def entries(self, last: Optional[int] = None) -> Iterator[tuple[int, ...]]:
+        """Yield raw entries, oldest first; only the last `last` if given."""
+        count = len(self) if last is None else min(last, len(self))
+        capacity = self.capacity
+        start = (self._next - count) % capacity
+        for n in range(count):
+            i = (start + n) % capacity
+            yield (self._pc[i], self._opcode[i], self._operand[i],
+                   self._a[i], self._x[i], self._y[i], self._sp[i], self._p[i])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Binary instruction trace files.
+
+A trace file is a short header followed by one fixed-width record per
+executed instruction, in the same (pc, opcode, operand, a, x, y, sp, p)
+layout as TraceBuffer entries. Run as a script to decode one:
+
+    python -m pim65.tracefile run.trace --start '$2000' --end '$20FF'
+"""
+
+import argparse
+import re
+import struct
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from .config import SimulatorConfig
+from .cpu import CPU
+from .symbols import SymbolTable, Symbolizer
+
+MAGIC = b"P65T"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+RECORD = struct.Struct("<HBHBBBBB")
+
+# Bytes buffered before a write to disk
+BUFFER_SIZE = 1 << 20
+
+
+class TraceWriter:
+    """Streams trace records to a file through a large write buffer."""
+
+    def __init__(self, path: str | Path):
+        self._file: Optional[BinaryIO] = open(path, "wb", buffering=BUFFER_SIZE)
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._pack = RECORD.pack
+        self._write = self._file.write
+
+    def record(self, pc: int, opcode: int, operand: int,
+               a: int, x: int, y: int, sp: int, p: int) -> None:
+        """Append one instruction record."""
+        self._write(self._pack(pc, opcode, operand, a, x, y, sp, p))
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path: str | Path) -> Iterator[tuple[int, ...]]:
+    """Yield raw (pc, opcode, operand, a, x, y, sp, p) records from a file."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION):
+            raise ValueError(f"Not a pim65 trace file: {path}")
+        while True:
+            chunk = f.read(RECORD.size * 4096)
+            if not chunk:
+                return
+            # A run that died mid-write can leave a partial last record
+            usable = len(chunk) - len(chunk) % RECORD.size
+            yield from RECORD.iter_unpack(chunk[:usable])
+
+
+def decode(path: str | Path, start: int = 0, end: int = 0xFFFF,
+           pattern: Optional[str] = None,
+           symbolize: Optional[Symbolizer] = None) -> Iterator[tuple[int, str]]:
+    """Yield (index, line) for records with start <= PC <= end.
+
+    index is the record's position in the trace, i.e. the instruction
+    count when it executed. With pattern set, only lines matching that
+    regular expression are yielded; labels from symbolize are matched too.
+    """
+    regex = re.compile(pattern) if pattern else None
+    for index, entry in enumerate(read_trace(path)):
+        if not start <= entry[0] <= end:
+            continue
+        line = CPU.format_trace_entry(entry, symbolize)
+        if regex is None or regex.search(line):
+            yield index, line
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="pim65.tracefile",
+        description="Decode a pim65 binary trace file"
+    )
+    parser.add_argument("trace", help="Trace file written with --trace-file")
+    parser.add_argument("--start", type=SimulatorConfig._parse_addr, default=0,
+                        metavar="ADDR", help="Lowest PC to show (default: $0000)")
+    parser.add_argument("--end", type=SimulatorConfig._parse_addr, default=0xFFFF,
+                        metavar="ADDR", help="Highest PC to show (default: $FFFF)")
+    parser.add_argument("--grep", metavar="REGEX",
+                        help="Only show lines matching this regular expression")
+    parser.add_argument("--symbols", action="append", metavar="PATH",
+                        help="ca65 listing, ld65 label file or directory of "
+                             "listings to label addresses with")
+    args = parser.parse_args(argv)
+
+    try:
+        symbols = SymbolTable()
+        for path in args.symbols or []:
+            symbols.load(path)
+        symbolize = symbols.symbolize if symbols.modules else None
+        for index, line in decode(args.trace, args.start, args.end, args.grep,
+                                  symbolize):
+            print(f"{index:10d}  {line}")
+    except BrokenPipeError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
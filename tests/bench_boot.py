@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Microbenchmark: pim65 instructions per second on the Runix boot path.
+
+Boots bootstub.bin from the built disk image with each CPU engine and
+reports instructions per second, so the reference op_* engine ("before")
+can be compared with the faster engines ("after").
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+TEST_DIR = Path(__file__).parent
+REPO_ROOT = TEST_DIR.parent
+DISK_IMAGE = REPO_ROOT / "build" / "runix.2mg"
+
+sys.path.insert(0, str(REPO_ROOT))
+
+from pim65.config import BinaryConfig, SimulatorConfig
+from pim65.cpu import CPU
+from pim65.simulator import Simulator
+
+
+def boot(engine: str, disk_image: str, max_instructions: int) -> tuple[int, float]:
+    """Boot once; returns (instructions executed, seconds)."""
+    config = SimulatorConfig(
+        binaries=[BinaryConfig(file=str(TEST_DIR / "bootstub.bin"), load_addr=0x1000)],
+        start_addr=0x1000
+    )
+    sim = Simulator(config, engine=engine)
+    sim.setup_hard_drive(disk_image)
+    sim.load()
+
+    start = time.perf_counter()
+    try:
+        sim.run(max_instructions=max_instructions)
+    except RuntimeError:
+        # Expected: the shell sits waiting for input at the prompt
+        pass
+    elapsed = time.perf_counter() - start
+
+    count = sim.instruction_count
+    sim.cleanup()
+    return count, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--max-instructions", type=int, default=100000,
+                        help="Instruction budget per boot (default: 100000)")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Boots per engine; the best is reported (default: 5)")
+    parser.add_argument("--disk", default=str(DISK_IMAGE),
+                        help="Disk image to boot (default: build/runix.2mg)")
+    args = parser.parse_args()
+
+    if not Path(args.disk).exists():
+        print(f"Error: Disk image not found: {args.disk}. Run 'make' first.",
+              file=sys.stderr)
+        return 1
+
+    results = {}
+    for engine in CPU.ENGINES:
+        best = None
+        for _ in range(args.repeat):
+            count, elapsed = boot(engine, args.disk, args.max_instructions)
+            ips = count / elapsed
+            if best is None or ips > best:
+                best = ips
+        results[engine] = best
+        speedup = best / results[CPU.ENGINES[0]]
+        print(f"{engine:10s} {count:8d} instructions  {best:12,.0f} inst/s"
+              f"  {speedup:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,7 +19,25 @@ sys.path.insert(0, str(REPO_ROOT))
 
 from pim65.config import SimulatorConfig, BinaryConfig
 from pim65.simulator import Simulator
-from pim65.cpu import BrkAbortError, InvalidOpcodeError
+from pim65.cpu import CPU, BrkAbortError, InvalidOpcodeError
+from pim65.apple2 import Keyboard
+
+# Instruction budget for booting to the first keyboard poll
+BOOT_LIMIT = 100000
+
+# CPU engine for test runs, e.g. PIM65_ENGINE=block for long CI runs.
+# Runs that count cycles always use "flat", the only engine that can.
+ENGINE = os.environ.get("PIM65_ENGINE", "flat")
+
+
+def pytest_configure(config):
+    """Build bootstub.bin up front.
+
+    Under pytest-xdist (pytest -n auto) this runs in the controller before
+    any worker starts, so workers never race to build it.
+    """
+    if not hasattr(config, "workerinput") and not (TEST_DIR / "bootstub.bin").exists():
+        subprocess.run(["python3", "mkbootstub.py"], cwd=TEST_DIR, check=True)
 
 
 @pytest.fixture(scope="session")
@@ -44,15 +62,67 @@ def bootstub():
     return str(bootstub_path)
 
 
+def boot_config():
+    """Simulator config that boots the disk image through bootstub."""
+    return SimulatorConfig(
+        binaries=[BinaryConfig(file=str(TEST_DIR / "bootstub.bin"), load_addr=0x1000)],
+        start_addr=0x1000
+    )
+
+
+@pytest.fixture(scope="session")
+def boot_snapshot(disk_image, bootstub):
+    """Boot once and snapshot the machine at the shell's first keyboard poll.
+
+    Everything up to that point is independent of keyboard input, so each
+    boot test can fork from here instead of booting from scratch. Returns
+    None if the poll is never reached; tests then boot normally.
+    """
+    # Count cycles so forked runs that count them include the boot
+    sim = Simulator(boot_config(), cycles=True)
+    sim.setup_hard_drive(disk_image, overlay=True)
+    sim.load()
+
+    # Step up to (not into) the first LDA $C000
+    cpu = sim.cpu
+    snapshot = None
+    try:
+        while cpu.instruction_count < BOOT_LIMIT and not cpu.halted:
+            if (sim.memory.read(cpu.pc) == 0xAD and
+                    sim.memory.read_word(cpu.pc + 1) == Keyboard.KBD_DATA):
+                snapshot = sim.snapshot()
+                break
+            cpu.step()
+    except (BrkAbortError, InvalidOpcodeError):
+        pass
+    finally:
+        sim.cleanup()
+    return snapshot
+
+
 class Pim65Runner:
-    """Helper class to run pim65 tests directly (no subprocess)."""
+    """Helper class to run pim65 tests directly (no subprocess).
+
+    Every run opens the disk image with a copy-on-write overlay, so tests
+    never modify build/runix.2mg and can run in parallel processes.
+    """
 
-    def __init__(self, disk_image, bootstub):
+    def __init__(self, disk_image, bootstub, boot_snapshot=None, engine=ENGINE):
+        if engine not in CPU.ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
         self.disk_image = disk_image
         self.bootstub = bootstub
+        self.boot_snapshot = boot_snapshot
+        self.engine = engine
         self.test_dir = TEST_DIR
 
-    def run_boot_test(self, command_line=None, max_instructions=100000, timeout=2):
+    def make_simulator(self, config, cycles=False):
+        """Simulator on this runner's engine (flat when counting cycles)."""
+        return Simulator(config, engine="flat" if cycles else self.engine,
+                         cycles=cycles)
+
+    def run_boot_test(self, command_line=None, max_instructions=100000, timeout=2,
+                      cycles=False, stop_on_input_wait=False):
         """
         Run a boot test using the bootstub.
 
@@ -60,34 +130,39 @@ class Pim65Runner:
             command_line: Optional command line to inject at shell prompt
             max_instructions: Max instructions to execute
             timeout: Timeout in seconds (ignored in direct mode)
+            cycles: Count 6502 cycles
+            stop_on_input_wait: Stop cleanly once the command line is used
+                up and the shell waits for more input
 
         Returns:
-            dict with keys: returncode, stdout, stderr, screen_output
+            dict with keys: returncode, stdout, stderr, screen_output,
+            instructions, cycles (None unless counted), waiting_for_input
         """
-        # Create config directly
-        config = SimulatorConfig(
-            binaries=[BinaryConfig(file=str(self.test_dir / "bootstub.bin"), load_addr=0x1000)],
-            start_addr=0x1000
-        )
-
         # Create simulator
-        sim = Simulator(config)
+        sim = self.make_simulator(boot_config(), cycles=cycles)
 
         # Set up hardware
         if command_line:
             sim.setup_keyboard([command_line])
-        sim.setup_hard_drive(self.disk_image)
-
-        # Load binaries
-        try:
-            sim.load()
-        except FileNotFoundError as e:
-            return {
-                "returncode": 1,
-                "stdout": "",
-                "stderr": f"Error: Binary file not found: {e}",
-                "screen_output": f"Error: Binary file not found: {e}"
-            }
+        sim.setup_hard_drive(self.disk_image, overlay=True)
+
+        # Fork from the booted machine when the snapshot is within budget;
+        # its disk overlay keeps this test's writes out of the image
+        snapshot = self.boot_snapshot
+        if (snapshot is not None and
+                snapshot.cpu["instruction_count"] <= max_instructions):
+            sim.restore(snapshot)
+        else:
+            # Load binaries
+            try:
+                sim.load()
+            except FileNotFoundError as e:
+                return {
+                    "returncode": 1,
+                    "stdout": "",
+                    "stderr": f"Error: Binary file not found: {e}",
+                    "screen_output": f"Error: Binary file not found: {e}"
+                }
 
         # Capture stderr for trace output
         old_stderr = sys.stderr
@@ -100,9 +175,10 @@ class Pim65Runner:
             success = sim.run(
                 max_instructions=max_instructions,
                 trace=False,  # Don't trace by default to speed up tests
-                brk_abort=False
+                brk_abort=False,
+                stop_on_input_wait=stop_on_input_wait
             )
-            if not success:
+            if not success and not sim.waiting_for_input:
                 returncode = 1
         except (BrkAbortError, InvalidOpcodeError, RuntimeError) as e:
             returncode = 1
@@ -123,11 +199,15 @@ class Pim65Runner:
             "returncode": returncode,
             "stdout": "",
             "stderr": stderr_text,
-            "screen_output": screen_output
+            "screen_output": screen_output,
+            "instructions": sim.instruction_count,
+            "cycles": sim.cycles,
+            "waiting_for_input": sim.waiting_for_input
         }
 
     def run_custom_test(self, binary_path, load_addr="0x2000",
-                       start_addr=None, max_instructions=100000, timeout=2):
+                       start_addr=None, max_instructions=100000, timeout=2,
+                       cycles=False):
         """
         Run a custom test binary.
 
@@ -137,9 +217,11 @@ class Pim65Runner:
             start_addr: Starting PC (default same as load_addr)
             max_instructions: Max instructions to execute
             timeout: Timeout in seconds (ignored in direct mode)
+            cycles: Count 6502 cycles
 
         Returns:
-            dict with keys: returncode, stdout, stderr, screen_output
+            dict with keys: returncode, stdout, stderr, screen_output,
+            instructions, cycles (None unless counted)
         """
         if start_addr is None:
             start_addr = load_addr
@@ -156,8 +238,8 @@ class Pim65Runner:
         )
 
         # Create simulator
-        sim = Simulator(config)
-        sim.setup_hard_drive(self.disk_image)
+        sim = self.make_simulator(config, cycles=cycles)
+        sim.setup_hard_drive(self.disk_image, overlay=True)
 
         # Load binaries
         try:
@@ -203,11 +285,13 @@ class Pim65Runner:
             "returncode": returncode,
             "stdout": "",
             "stderr": stderr_text,
-            "screen_output": screen_output
+            "screen_output": screen_output,
+            "instructions": sim.instruction_count,
+            "cycles": sim.cycles
         }
 
 
 @pytest.fixture
-def pim65(disk_image, bootstub):
+def pim65(disk_image, bootstub, boot_snapshot):
     """Provide a Pim65Runner instance for tests."""
-    return Pim65Runner(disk_image, bootstub)
+    return Pim65Runner(disk_image, bootstub, boot_snapshot)
@@ -14,6 +14,16 @@ def test_runix_boots(pim65):
     assert "Instruction limit" in result["stderr"], "Should timeout at instruction limit"
 
 
+def test_boot_waits_for_input(pim65):
+    """Test that a run stops cleanly once the shell waits for a command."""
+    result = pim65.run_boot_test(max_instructions=1000000, stop_on_input_wait=True)
+
+    assert result["waiting_for_input"], "Should stop at the shell prompt"
+    assert result["returncode"] == 0, "Waiting for input is a clean stop"
+    assert result["instructions"] < 1000000, "Should not use the whole budget"
+    assert "#" in result["screen_output"], "Should display shell prompt (#)"
+
+
 def test_welcome_message(pim65):
     """Test that Runix displays the welcome message."""
     result = pim65.run_boot_test(max_instructions=10000)